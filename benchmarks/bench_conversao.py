@@ -0,0 +1,244 @@
+"""
+Mede a conversão de ponta a ponta com dados sintéticos e compara com uma execução anterior.
+
+Uso:
+    python benchmarks/bench_conversao.py [--modelos 1000 10000] [--linhas 10 1000 10000]
+        [--linha-cabecalho 5] [--nao-mapeados 0.1] [--repeticoes 3]
+        [--saida relatorio.json] [--comparar base.json] [--limite 0.2]
+
+Para cada tamanho de catálogo, gera os arquivos de referência (gerador_dados.py)
+e mede a leitura deles a frio, do xlsx e do snapshot. Para cada orçamento
+(linhas x posição do cabeçalho x proporção de não mapeados), mede cada etapa de
+converter_orcamento_com_relatorio e a escrita do xlsx (mediana de N execuções),
+o pico de memória alocada (tracemalloc, em execução separada) e o tempo de
+POST /processar pelo cliente de testes do Flask.
+
+O relatório JSON pode ser guardado e usado em --comparar numa execução futura:
+métricas que pioraram mais que --limite (fração) e mais que --minimo-ms são
+listadas e o script sai com código 1.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+VERSAO_RELATORIO = 1
+
+
+def _mediana(valores):
+    return round(statistics.median(valores), 2)
+
+
+def medir_referencias(pasta, repeticoes):
+    """Leitura a frio dos arquivos de referência: do xlsx (sem snapshot) e do snapshot."""
+    from cache_referencias import cache_referencias
+    from conversor_olist import ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA, carregar_referencias
+    from snapshot_referencias import caminho_snapshot
+
+    caminhos = [os.path.join(pasta, nome) for nome in (ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA)]
+    resultado = {}
+    for origem in ('xlsx', 'snapshot'):
+        tempos = defaultdict(list)
+        for _ in range(repeticoes):
+            cache_referencias.limpar()
+            if origem == 'xlsx':
+                for caminho in caminhos:
+                    if os.path.exists(caminho_snapshot(caminho)):
+                        os.remove(caminho_snapshot(caminho))
+            medidos = {}
+            carregar_referencias(caminhos[0], caminhos[1], caminhos[2], tempos=medidos)
+            for etapa, duracao in medidos.items():
+                tempos[etapa].append(duracao)
+        resultado[origem] = {etapa: _mediana(valores) for etapa, valores in tempos.items()}
+    return resultado
+
+
+def medir_orcamento(pasta, dados_orcamento, id_cliente, repeticoes, modo_escrita, cliente_http):
+    from conversor_olist import ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA, converter_orcamento_com_relatorio
+    from saida_xlsx import escrever_orcamento_convertido
+
+    caminhos = [os.path.join(pasta, nome) for nome in (ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA)]
+
+    def converter():
+        resultado = converter_orcamento_com_relatorio(
+            io.BytesIO(dados_orcamento), caminhos[0], caminhos[1], id_cliente, caminhos[2]
+        )
+        if resultado.erro:
+            raise RuntimeError(resultado.erro)
+        inicio = time.perf_counter()
+        saida = io.BytesIO()
+        escrever_orcamento_convertido(resultado.df, saida, modo=modo_escrita)
+        resultado.tempos['escrita_xlsx'] = round((time.perf_counter() - inicio) * 1000, 2)
+        return resultado, saida.tell()
+
+    converter()  # aquece o cache de referências
+    tempos = defaultdict(list)
+    for _ in range(repeticoes):
+        resultado, bytes_saida = converter()
+        for etapa, duracao in resultado.tempos.items():
+            tempos[etapa].append(duracao)
+
+    tracemalloc.start()
+    converter()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tempos_http = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente_http.post('/processar', data={
+            'cliente_id': str(id_cliente),
+            'arquivo_excel': (io.BytesIO(dados_orcamento), 'orcamento.xlsx'),
+        }, content_type='multipart/form-data')
+        tempos_http.append((time.perf_counter() - inicio) * 1000)
+        if resposta.status_code != 200:
+            raise RuntimeError(f'/processar respondeu {resposta.status_code}: {resposta.get_data(as_text=True)[:200]}')
+
+    return {
+        'linhas_saida': len(resultado.df),
+        'nao_mapeados': len(resultado.nao_mapeados),
+        'bytes_entrada': len(dados_orcamento),
+        'bytes_saida': bytes_saida,
+        'tempos_ms': {etapa: _mediana(valores) for etapa, valores in tempos.items()},
+        'http_ms': _mediana(tempos_http),
+        'pico_memoria_kb': pico // 1024,
+    }
+
+
+def comparar(atual, base, limite, minimo_ms):
+    """Métricas de tempo que pioraram mais que limite (fração) e mais que minimo_ms."""
+    def metricas(relatorio):
+        valores = {}
+        for nome, referencias in relatorio.get('referencias', {}).items():
+            for origem, tempos in referencias.items():
+                for etapa, duracao in tempos.items():
+                    valores[(nome, f'referencias_{origem}.{etapa}')] = duracao
+        for cenario in relatorio.get('cenarios', []):
+            for etapa, duracao in cenario['tempos_ms'].items():
+                valores[(cenario['nome'], etapa)] = duracao
+            valores[(cenario['nome'], 'http')] = cenario['http_ms']
+        return valores
+
+    valores_base = metricas(base)
+    regressoes = []
+    for chave, valor in metricas(atual).items():
+        anterior = valores_base.get(chave)
+        if anterior is None:
+            continue
+        if valor > anterior * (1 + limite) and valor - anterior > minimo_ms:
+            regressoes.append({
+                'cenario': chave[0], 'metrica': chave[1], 'base_ms': anterior, 'atual_ms': valor,
+                'variacao': round(valor / anterior - 1, 3) if anterior else None,
+            })
+    return regressoes
+
+
+def executar(args, pasta):
+    # main.py lê a configuração ao ser importado: dados sintéticos, sem cache de resultados e logs só de avisos
+    os.environ['CONVERSOR_DATA_DIR'] = pasta
+    os.environ['CONVERSOR_CACHE_RESULTADOS_MB'] = '0'
+    os.environ['CONVERSOR_CACHE_RESULTADOS_DISCO_MB'] = '0'
+    os.environ.setdefault('CONVERSOR_LOG_LEVEL', 'WARNING')
+
+    from gerador_dados import gerar_orcamento, gerar_referencias
+    from cache_referencias import cache_referencias
+    import main as app_main
+
+    cliente_http = app_main.app.test_client()
+    modo_escrita = app_main.app.config['XLSX_WRITER_MODE']
+    relatorio = {
+        'versao': VERSAO_RELATORIO,
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'modo_escrita': modo_escrita,
+        'repeticoes': args.repeticoes,
+        'referencias': {},
+        'cenarios': [],
+    }
+
+    for quantidade_modelos in args.modelos:
+        inicio = time.perf_counter()
+        modelos, ids_clientes = gerar_referencias(pasta, quantidade_modelos, args.clientes)
+        print(f'catálogo com {quantidade_modelos} modelos gerado em {time.perf_counter() - inicio:.1f} s', file=sys.stderr)
+        nome_referencias = f'modelos={quantidade_modelos}'
+        relatorio['referencias'][nome_referencias] = medir_referencias(pasta, args.repeticoes)
+        print(f'{nome_referencias}: {json.dumps(relatorio["referencias"][nome_referencias])}')
+
+        for linhas in args.linhas:
+            for linha_cabecalho in args.linha_cabecalho:
+                for nao_mapeados in args.nao_mapeados:
+                    caminho_orcamento = os.path.join(pasta, 'orcamento.xlsx')
+                    gerar_orcamento(caminho_orcamento, modelos, linhas, linha_cabecalho, nao_mapeados)
+                    with open(caminho_orcamento, 'rb') as f:
+                        dados_orcamento = f.read()
+                    nome = f'modelos={quantidade_modelos} linhas={linhas} cabecalho={linha_cabecalho} nao_mapeados={nao_mapeados}'
+                    cenario = medir_orcamento(
+                        pasta, dados_orcamento, ids_clientes[0], args.repeticoes, modo_escrita, cliente_http
+                    )
+                    cenario.update({
+                        'nome': nome,
+                        'parametros': {
+                            'modelos': quantidade_modelos, 'linhas': linhas,
+                            'linha_cabecalho': linha_cabecalho, 'nao_mapeados': nao_mapeados,
+                        },
+                    })
+                    relatorio['cenarios'].append(cenario)
+                    print(f"{nome}: http {cenario['http_ms']} ms, pico {cenario['pico_memoria_kb']} KB, "
+                          f"etapas {json.dumps(cenario['tempos_ms'])}")
+        cache_referencias.limpar()
+
+    relatorio['pico_rss_kb'] = app_main.pico_memoria_kb()
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        print(f'Relatório gravado em {args.saida}')
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regressoes = comparar(relatorio, base, args.limite, args.minimo_ms)
+        if regressoes:
+            print(f'{len(regressoes)} regressões acima de {args.limite:.0%}:')
+            for regressao in regressoes:
+                print(f"  {regressao['cenario']} / {regressao['metrica']}: "
+                      f"{regressao['base_ms']} -> {regressao['atual_ms']} ms")
+            sys.exit(1)
+        print(f'Sem regressões acima de {args.limite:.0%} em relação a {args.comparar}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modelos', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--linha-cabecalho', type=int, nargs='+', default=[5])
+    parser.add_argument('--nao-mapeados', type=float, nargs='+', default=[0.1])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', help='Grava o relatório JSON neste arquivo')
+    parser.add_argument('--comparar', help='Relatório JSON de uma execução anterior')
+    parser.add_argument('--limite', type=float, default=0.2, help='Piora relativa tolerada (padrão 0.2 = 20%%)')
+    parser.add_argument('--minimo-ms', type=float, default=2.0, help='Piora absoluta ignorada, em ms (padrão 2)')
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='bench_conversao_')
+    try:
+        executar(args, pasta)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Mede a montagem do índice de trigramas e o tempo por busca da correspondência aproximada.
+
+Uso:
+    python benchmarks/bench_correspondencia_aproximada.py [--modelos 100000] [--buscas 2000]
+
+O catálogo sintético imita os modelos reais (marca, código, variações como
+'PLUS' e 'COM ARO'); as buscas são modelos do catálogo com erros de digitação.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from correspondencia_aproximada import IndiceAproximado  # noqa: E402
+from normalizacao import normalizar_texto  # noqa: E402
+
+MARCAS = ['IP', 'SM', 'MT', 'LG', 'MI', 'MI-REDMI NOTE', 'INFINIX', 'ASUS', 'NOKIA', 'REALME']
+VARIACOES = ['', ' PLUS', ' PRO', ' PRO MAX', ' COM ARO', ' CURVED', ' LITE', ' 5G']
+
+
+def gerar_modelos(quantidade, seed=0):
+    rng = random.Random(seed)
+    modelos = set()
+    while len(modelos) < quantidade:
+        codigo = f'{rng.choice("AJMSGKXZ")}{rng.randint(1, 9999)}'
+        modelos.add(f'{rng.choice(MARCAS)}-{codigo}{rng.choice(VARIACOES)}')
+    return sorted(modelos)
+
+
+def com_erro(texto, rng):
+    posicao = rng.randrange(len(texto))
+    operacao = rng.choice(('trocar', 'remover', 'sufixo'))
+    if operacao == 'trocar':
+        return texto[:posicao] + rng.choice('ABCDEFGHIJ0123456789') + texto[posicao + 1:]
+    if operacao == 'remover':
+        return texto[:posicao] + texto[posicao + 1:]
+    return texto + ' X'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modelos', type=int, default=100_000)
+    parser.add_argument('--buscas', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    modelos = gerar_modelos(args.modelos)
+    chaves = [normalizar_texto(modelo, dobrar=True) for modelo in modelos]
+
+    inicio = time.perf_counter()
+    indice = IndiceAproximado(chaves)
+    print(f'{args.modelos} modelos: índice montado em {time.perf_counter() - inicio:.2f} s')
+
+    alvos = [rng.randrange(len(modelos)) for _ in range(args.buscas)]
+    consultas = [normalizar_texto(com_erro(modelos[alvo], rng), dobrar=True) for alvo in alvos]
+    inicio = time.perf_counter()
+    resultados = [indice.buscar(consulta, 3) for consulta in consultas]
+    duracao = time.perf_counter() - inicio
+
+    acertos = sum(
+        1 for alvo, candidatos in zip(alvos, resultados)
+        if any(candidato.posicao == alvo for candidato in candidatos)
+    )
+    print(f'{args.buscas} buscas: {duracao / args.buscas * 1000:.3f} ms por busca, '
+          f'modelo certo entre os 3 primeiros em {acertos / args.buscas:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Compara os modos de escrita do xlsx de saída (openpyxl x write_only).
+
+Uso:
+    python benchmarks/bench_escrita_xlsx.py [--linhas 1000 10000 100000] [--json]
+
+Para cada tamanho, gera um DataFrame com as colunas do modelo Olist e mede o
+tempo de escrita (melhor de N execuções) e o pico de memória alocada
+(tracemalloc, medido em uma execução separada para não distorcer o tempo).
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from conversor_olist import carregar_colunas_modelo_saida  # noqa: E402
+from saida_xlsx import MODOS_ESCRITA, escrever_xlsx  # noqa: E402
+
+MODELO_SAIDA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'data', 'formato Olist(SAIDA).xlsx'
+)
+
+
+def gerar_saida_sintetica(colunas, linhas, seed=0):
+    """DataFrame com o mesmo formato do retornado por converter_orcamento_para_olist."""
+    rng = np.random.default_rng(seed)
+    dados = {coluna: [pd.NA] * linhas for coluna in colunas}
+    dados['Número da proposta'] = [1234] * linhas
+    dados['Data'] = [datetime.date(2024, 3, 15)] * linhas
+    dados['ID contato'] = [753317976] * linhas
+    dados['Nome do contato'] = ['CLIENTE TESTE'] * linhas
+    ids = rng.integers(900000000, 999999999, linhas).astype(float)
+    mapeados = rng.random(linhas) > 0.1
+    dados['ID produto'] = [i if m else pd.NA for i, m in zip(ids, mapeados)]
+    dados['Descrição'] = [f'MODELO {i % 5000} | PRETO' if m else pd.NA for i, m in zip(range(linhas), mapeados)]
+    dados['Quantidade'] = rng.integers(1, 50, linhas)
+    dados['Valor unitário'] = np.round(rng.random(linhas) * 100, 2)
+    return pd.DataFrame({coluna: dados[coluna] for coluna in colunas}).infer_objects()
+
+
+def medir(df, modo, repeticoes):
+    tempos = []
+    tamanho = 0
+    for _ in range(repeticoes):
+        saida = io.BytesIO()
+        inicio = time.perf_counter()
+        escrever_xlsx(df, saida, modo=modo)
+        tempos.append(time.perf_counter() - inicio)
+        tamanho = saida.tell()
+
+    tracemalloc.start()
+    escrever_xlsx(df, io.BytesIO(), modo=modo)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'tempo_s': min(tempos), 'pico_memoria_mb': pico / 1024 / 1024, 'bytes_saida': tamanho}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    colunas = carregar_colunas_modelo_saida(MODELO_SAIDA_PATH)
+    resultados = []
+    for linhas in args.linhas:
+        df = gerar_saida_sintetica(colunas, linhas)
+        for modo in MODOS_ESCRITA:
+            resultado = medir(df, modo, args.repeticoes if linhas < 100000 else 1)
+            resultado.update({'linhas': linhas, 'modo': modo})
+            resultados.append(resultado)
+            if not args.json:
+                print(f"{linhas:>7} linhas  {modo:<10}  {resultado['tempo_s']:8.3f} s  "
+                      f"{resultado['pico_memoria_mb']:8.1f} MB  {resultado['bytes_saida']:>10} bytes")
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compara a normalização de textos antiga (re.sub sem pré-compilar, a cada chamada)
+com normalizacao.normalizar_texto (memo + caminho rápido) e normalizar_serie.
+
+Uso:
+    python benchmarks/bench_normalizacao.py [--quantidade 1000000] [--distintos 5000]
+
+Os textos simulam produtos de orçamentos: poucos modelos distintos, repetidos
+muitas vezes, com variações de caixa e espaços.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from normalizacao import normalizar_serie, normalizar_texto  # noqa: E402
+
+
+def normalizar_texto_original(texto):
+    """Implementação anterior de conversor_olist.normalizar_texto, para comparação."""
+    if pd.isna(texto):
+        return ""
+    texto_str = str(texto).lower().strip()
+    texto_str = re.sub(r'\s+', ' ', texto_str)
+    return texto_str
+
+
+def gerar_textos(quantidade, distintos, seed=0):
+    rng = random.Random(seed)
+    modelos = [f'Tela  IPHONE {i % 40} Pro  Max {i}' for i in range(distintos)]
+    textos = []
+    for _ in range(quantidade):
+        texto = rng.choice(modelos)
+        if rng.random() < 0.3:
+            texto = f'  {texto.upper()} '
+        textos.append(texto)
+    return textos
+
+
+def cronometrar(descricao, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    duracao = time.perf_counter() - inicio
+    print(f'{descricao:<40} {duracao:8.3f} s')
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quantidade', type=int, default=1_000_000)
+    parser.add_argument('--distintos', type=int, default=5000)
+    args = parser.parse_args()
+
+    textos = gerar_textos(args.quantidade, args.distintos)
+    serie = pd.Series(textos, dtype=object)
+    print(f'{args.quantidade} textos, {args.distintos} distintos')
+
+    esperado = cronometrar('original (re.sub por chamada)', lambda: [normalizar_texto_original(t) for t in textos])
+    obtido = cronometrar('normalizar_texto (memo)', lambda: [normalizar_texto(t) for t in textos])
+    vetorizado = cronometrar('normalizar_serie', lambda: normalizar_serie(serie).tolist())
+    cronometrar('normalizar_texto (memo, dobrar=True)', lambda: [normalizar_texto(t, dobrar=True) for t in textos])
+    cronometrar('normalizar_serie (dobrar=True)', lambda: normalizar_serie(serie, dobrar=True))
+
+    if not (esperado == obtido == vetorizado):
+        print('ERRO: resultados diferentes da implementação original')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
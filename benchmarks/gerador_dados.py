@@ -0,0 +1,164 @@
+"""
+Gera arquivos sintéticos no formato que o conversor espera: catálogo de produtos,
+clientes, modelo de saída Olist e orçamentos.
+
+Uso:
+    python benchmarks/gerador_dados.py PASTA [--modelos 10000] [--clientes 1000]
+        [--linhas 1000] [--linha-cabecalho 5] [--nao-mapeados 0.1]
+
+Grava em PASTA os três arquivos de referência com os nomes padrão (como em
+src/data) e um orcamento.xlsx. Os modelos seguem o padrão dos reais (marca,
+código e variações como 'PLUS' e 'COM ARO'); no orçamento, parte dos produtos
+vem com caixa e espaços diferentes do catálogo e a proporção pedida não existe
+no catálogo.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+from typing import List
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from conversor_olist import ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA  # noqa: E402
+
+MARCAS = ['IP', 'SM', 'MT', 'LG', 'MI', 'MI-REDMI NOTE', 'INFINIX', 'ASUS', 'NOKIA', 'REALME']
+VARIACOES = ['', ' PLUS', ' PRO', ' PRO MAX', ' COM ARO', ' CURVED', ' LITE', ' 5G']
+CORES = ['PRETO', 'BRANCO', 'DOURADO', 'AZUL']
+QUALIDADES = ['-', 'ORI', 'INCELL', 'OLED']
+
+COLUNAS_CATALOGO = ['SKU', 'MODELO OLIST', 'MODELO', 'COR', 'QUALIDADE', 'VALOR', 'ID']
+COLUNAS_CLIENTES = ['Código', 'ID', 'Nome', 'Tipo pessoa', 'Situação', 'Lista de Preço']
+CABECALHO_ITENS = ['Produto', 'Cor', 'Qualidade', 'Valor Unitário', 'Quantidade', 'Subtotal']
+# Colunas do modelo de saída Olist (primeira aba de 'formato Olist(SAIDA).xlsx')
+COLUNAS_MODELO_SAIDA = [
+    'ID', 'Número da proposta', 'Data', 'Data próximo contato', 'ID contato', 'Nome do contato',
+    'Aos cuidados de', 'Lista de Preço', 'Tipo de Pessoa', 'CPF/CNPJ', 'RG/IE', 'CEP', 'Município', 'UF',
+    'Endereço', 'Endereço Nro', 'Complemento', 'Bairro', 'Fone', 'Celular', 'E-mail', 'Desconto', 'Frete',
+    'Observações', 'Validade', 'Prazo de Entrega', 'Situação', 'Introdução', 'ID produto', 'Descrição',
+    'Quantidade', 'Valor unitário', 'Descrição complementar', 'Vendedor', 'Destinatário', 'CPF/CNPJ entrega',
+    'CEP entrega', 'Município entrega', 'UF entrega', 'Endereço entrega', 'Endereço Nro entrega',
+    'Complemento entrega', 'Bairro entrega', 'Fone entrega', 'Inscrição Estadual entrega',
+]
+
+
+def gerar_modelos(quantidade: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    modelos = set()
+    while len(modelos) < quantidade:
+        codigo = f'{rng.choice("AJMSGKXZ")}{rng.randint(1, 99999)}'
+        modelos.add(f'{rng.choice(MARCAS)}-{codigo}{rng.choice(VARIACOES)}')
+    return sorted(modelos)
+
+
+def gerar_catalogo(caminho: str, quantidade_modelos: int, seed: int = 0) -> List[str]:
+    """Grava a aba CATÁLOGO com uma linha por modelo e devolve os modelos."""
+    rng = random.Random(seed)
+    modelos = gerar_modelos(quantidade_modelos, seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('CATÁLOGO')
+    ws.append(COLUNAS_CATALOGO)
+    for i, modelo in enumerate(modelos):
+        cor = rng.choice(CORES)
+        ws.append([
+            f'{i:05d}-1', f'{modelo} | {cor}', modelo, cor, rng.choice(QUALIDADES),
+            round(rng.uniform(10, 500), 2), float(918000000 + i),
+        ])
+    wb.save(caminho)
+    return modelos
+
+
+def gerar_clientes(caminho: str, quantidade: int) -> List[int]:
+    """Grava a aba CLIENTES e devolve os IDs."""
+    ids = [753300000 + i for i in range(quantidade)]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('CLIENTES')
+    ws.append(COLUNAS_CLIENTES)
+    for i, id_cliente in enumerate(ids):
+        ws.append([f'CL{i:04d}', id_cliente, f'CL{i:04d} - Cliente {i}', 'Pessoa Física', 'Ativo', 'R$ 3,00'])
+    wb.save(caminho)
+    return ids
+
+
+def gerar_modelo_saida(caminho: str) -> None:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(COLUNAS_MODELO_SAIDA)
+    wb.save(caminho)
+
+
+def gerar_orcamento(
+    caminho: str,
+    modelos: List[str],
+    linhas: int,
+    linha_cabecalho: int = 5,
+    proporcao_nao_mapeados: float = 0.1,
+    seed: int = 0
+) -> None:
+    """
+    Grava um orçamento na aba 'Orçamento'.
+
+    Args:
+        linha_cabecalho: linha (a partir de 1) do cabeçalho dos itens; com 3 ou mais,
+            as linhas 1 e 2 trazem 'Orçamento #' e 'Data'
+        proporcao_nao_mapeados: fração dos itens com produtos fora do catálogo
+    """
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Orçamento')
+    linha_atual = 1
+    if linha_cabecalho >= 3:
+        ws.append(['Orçamento #', 1234])
+        ws.append(['Data', datetime.datetime(2024, 3, 15)])
+        linha_atual = 3
+    while linha_atual < linha_cabecalho:
+        ws.append([])
+        linha_atual += 1
+    ws.append(CABECALHO_ITENS)
+    for i in range(linhas):
+        if rng.random() < proporcao_nao_mapeados:
+            produto = f'SEM CADASTRO {i}'
+        else:
+            produto = rng.choice(modelos)
+            if i % 5 == 0:
+                # Mesma chave depois da normalização (caixa e espaços)
+                produto = f'  {produto.lower()} '
+        valor = round(rng.uniform(10, 500), 2)
+        quantidade = rng.randint(1, 20)
+        ws.append([produto, rng.choice(CORES), rng.choice(QUALIDADES), valor, quantidade, round(valor * quantidade, 2)])
+    wb.save(caminho)
+
+
+def gerar_referencias(pasta: str, quantidade_modelos: int, quantidade_clientes: int, seed: int = 0):
+    """Grava os três arquivos de referência em pasta; devolve (modelos, ids_clientes)."""
+    os.makedirs(pasta, exist_ok=True)
+    modelos = gerar_catalogo(os.path.join(pasta, ARQUIVO_CATALOGO), quantidade_modelos, seed)
+    ids_clientes = gerar_clientes(os.path.join(pasta, ARQUIVO_CLIENTES), quantidade_clientes)
+    gerar_modelo_saida(os.path.join(pasta, ARQUIVO_MODELO_SAIDA))
+    return modelos, ids_clientes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('pasta')
+    parser.add_argument('--modelos', type=int, default=10000)
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--linhas', type=int, default=1000)
+    parser.add_argument('--linha-cabecalho', type=int, default=5)
+    parser.add_argument('--nao-mapeados', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    modelos, ids_clientes = gerar_referencias(args.pasta, args.modelos, args.clientes, args.seed)
+    gerar_orcamento(
+        os.path.join(args.pasta, 'orcamento.xlsx'), modelos, args.linhas,
+        args.linha_cabecalho, args.nao_mapeados, args.seed
+    )
+    print(f'Arquivos gravados em {args.pasta}; use o cliente {ids_clientes[0]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Implementação do banco de referências com o SQLAlchemy (ver banco_referencias).
+
+Fica num módulo à parte para que o SQLAlchemy e os modelos só sejam importados
+quando CONVERSOR_DATABASE_URL está definida.
+"""
+import datetime
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, delete, event, func, insert, or_, select
+
+from correspondencia_aproximada import IndiceAproximado
+from models.referencias import Cliente, ImportacaoReferencia, ProdutoCatalogo
+from models.user import db
+from normalizacao import normalizar_serie, normalizar_texto
+from snapshot_referencias import hash_arquivo
+
+logger = logging.getLogger(__name__)
+
+# Chaves por consulta IN (o SQLite antigo aceita até 999 parâmetros) e linhas por INSERT na importação
+TAMANHO_LOTE_CONSULTA = 500
+TAMANHO_LOTE_IMPORTACAO = 1000
+
+_catalogo = ProdutoCatalogo.__table__
+_clientes = Cliente.__table__
+_importacoes = ImportacaoReferencia.__table__
+
+
+def _texto_id(valor, tipo_id: str) -> Optional[str]:
+    """ID como texto na forma guardada no banco (números sem '.0')."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if tipo_id in ('i', 'f'):
+        numero = float(valor)
+        return str(int(numero)) if numero.is_integer() else repr(numero)
+    return str(valor)
+
+
+def _valor_id(texto: Optional[str], tipo_id: str):
+    """Volta o ID do banco ao tipo que o pandas daria lendo a planilha."""
+    if texto is None:
+        return np.nan
+    if tipo_id == 'i':
+        return np.int64(texto)
+    if tipo_id == 'f':
+        return np.float64(texto)
+    return texto
+
+
+def _valor_texto(texto: Optional[str]):
+    return np.nan if texto is None else texto
+
+
+def _tipo_id(coluna: pd.Series) -> str:
+    return coluna.dtype.kind if coluna.dtype.kind in ('i', 'f') else 'O'
+
+
+def _lotes(valores: list, tamanho: int) -> Iterable[list]:
+    for inicio in range(0, len(valores), tamanho):
+        yield valores[inicio:inicio + tamanho]
+
+
+class BancoReferencias:
+    """Acesso às tabelas de catálogo e clientes por um engine do SQLAlchemy (uso fora do contexto do Flask)."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(url, pool_pre_ping=True, future=True)
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, 'connect', _configurar_sqlite)
+        self._lock = threading.Lock()
+        # (versão do catálogo, índice aproximado, ids, descrições), montado na primeira busca aproximada
+        self._aproximado = None
+        # (geração, momento da consulta, importacoes()) guardado por importacoes_em_cache()
+        self._lock_importacoes = threading.Lock()
+        self._importacoes = None
+        self._geracao: Optional[Callable[[], Optional[int]]] = None
+        self._intervalo_revalidacao = 0.0
+
+    def usar_geracao(self, geracao: Optional[Callable[[], Optional[int]]], intervalo_revalidacao: float = 60.0) -> None:
+        """
+        Como CacheReferencias.usar_geracao: importacoes_em_cache() só volta ao banco quando
+        a geração muda ou depois de intervalo_revalidacao segundos.
+        """
+        with self._lock_importacoes:
+            self._geracao = geracao
+            self._intervalo_revalidacao = intervalo_revalidacao
+            self._importacoes = None
+
+    def criar_tabelas(self) -> None:
+        db.Model.metadata.create_all(self.engine, tables=[_catalogo, _clientes, _importacoes])
+
+    def dispensar_conexoes(self) -> None:
+        """Descarta as conexões herdadas num fork (cada processo abre as suas)."""
+        self.engine.dispose(close=False)
+
+    # Importação
+
+    def importar(self, tipo: str, caminho_xlsx: str) -> dict:
+        """Importa o xlsx do tipo ('catalogo' ou 'clientes') numa única transação e devolve o registro da importação."""
+        from conversor_olist import LEITORES_REFERENCIA
+
+        leitor = LEITORES_REFERENCIA[tipo][1]
+        if tipo == 'catalogo':
+            df = leitor(caminho_xlsx).df
+            if 'MODELO' not in df.columns:
+                raise ValueError(f"Coluna 'MODELO' não encontrada em {caminho_xlsx}")
+            tabela, tipo_id, linhas = _catalogo, *self._linhas_catalogo(df)
+        elif tipo == 'clientes':
+            df = leitor(caminho_xlsx)
+            if 'ID' not in df.columns or 'Nome' not in df.columns:
+                raise ValueError('Invalid client file structure')
+            tabela, tipo_id, linhas = _clientes, *self._linhas_clientes(df)
+        else:
+            raise ValueError(f'Tipo de referência sem tabela: {tipo}')
+
+        sha256 = hash_arquivo(caminho_xlsx)
+        with self.engine.begin() as conexao:
+            versao_atual = conexao.execute(
+                select(_importacoes.c.versao).where(_importacoes.c.tipo == tipo)
+            ).scalar()
+            conexao.execute(delete(tabela))
+            for lote in _lotes(linhas, TAMANHO_LOTE_IMPORTACAO):
+                conexao.execute(insert(tabela), lote)
+            registro = {
+                'tipo': tipo,
+                'versao': (versao_atual or 0) + 1,
+                'importado_em': datetime.datetime.utcnow().replace(microsecond=0),
+                'linhas': len(linhas),
+                'tipo_id': tipo_id,
+                'origem_sha256': sha256,
+            }
+            if versao_atual is None:
+                conexao.execute(insert(_importacoes), registro)
+            else:
+                conexao.execute(_importacoes.update().where(_importacoes.c.tipo == tipo).values(**registro))
+        with self._lock_importacoes:
+            self._importacoes = None
+        logger.info('Referência importada no banco', extra={'tipo': tipo, 'versao': registro['versao'], 'linhas': len(linhas)})
+        return registro
+
+    @staticmethod
+    def _linhas_catalogo(df: pd.DataFrame) -> Tuple[str, List[dict]]:
+        quantidade = len(df)
+        ids = df['ID'] if 'ID' in df.columns else pd.Series([np.nan] * quantidade, index=df.index)
+        descricoes = df['MODELO OLIST'].tolist() if 'MODELO OLIST' in df.columns else [None] * quantidade
+        tipo_id = _tipo_id(ids)
+        chaves = df['MODELO_NORMALIZADO_BUSCA'].tolist()
+        chaves_dobradas = normalizar_serie(df['MODELO'], dobrar=True).tolist()
+        linhas = [
+            {
+                'posicao': posicao,
+                'modelo': None if pd.isna(modelo) else str(modelo),
+                'chave': chave,
+                'chave_dobrada': chave_dobrada,
+                'id_produto': _texto_id(id_produto, tipo_id),
+                'descricao': None if pd.isna(descricao) else str(descricao),
+            }
+            for posicao, (modelo, chave, chave_dobrada, id_produto, descricao)
+            in enumerate(zip(df['MODELO'].tolist(), chaves, chaves_dobradas, ids.tolist(), descricoes))
+        ]
+        return tipo_id, linhas
+
+    @staticmethod
+    def _linhas_clientes(df: pd.DataFrame) -> Tuple[str, List[dict]]:
+        tipo_id = _tipo_id(df['ID'])
+        linhas = [
+            {
+                'posicao': posicao,
+                'id_cliente': _texto_id(id_cliente, tipo_id),
+                'nome': None if pd.isna(nome) else str(nome),
+                'nome_busca': normalizar_texto(nome, dobrar=True),
+            }
+            for posicao, (id_cliente, nome) in enumerate(zip(df['ID'].tolist(), df['Nome'].tolist()))
+            if not pd.isna(id_cliente)
+        ]
+        return tipo_id, linhas
+
+    # Consultas
+
+    def importacao(self, tipo: str) -> Optional[dict]:
+        """Registro da última importação do tipo, ou None se ele nunca foi importado."""
+        with self.engine.connect() as conexao:
+            linha = conexao.execute(select(_importacoes).where(_importacoes.c.tipo == tipo)).mappings().first()
+        return dict(linha) if linha is not None else None
+
+    def importacoes(self) -> Dict[str, dict]:
+        """Registro da última importação de cada tipo, consultado no banco."""
+        with self.engine.connect() as conexao:
+            return {linha['tipo']: dict(linha) for linha in conexao.execute(select(_importacoes)).mappings()}
+
+    def importacoes_em_cache(self) -> Dict[str, dict]:
+        """
+        Como importacoes(), guardado no processo (não deve ser alterado).
+
+        Com usar_geracao(), o banco só é consultado de novo quando a geração muda
+        (upload ou reversão) ou depois de intervalo_revalidacao segundos, o que
+        cobre importações feitas pela linha de comando; sem ela, consulta sempre.
+        """
+        geracao = self._geracao() if self._geracao is not None else None
+        agora = time.monotonic()
+        with self._lock_importacoes:
+            guardado = self._importacoes
+            if (
+                geracao is not None and guardado is not None and guardado[0] == geracao
+                and agora - guardado[1] < self._intervalo_revalidacao
+            ):
+                return guardado[2]
+        importacoes = self.importacoes()
+        with self._lock_importacoes:
+            self._importacoes = (geracao, agora, importacoes)
+        return importacoes
+
+    def _tipo_id_importado(self, tipo: str) -> Optional[str]:
+        """Tipo da coluna ID na última importação do tipo (do cache do processo), ou None se não importado."""
+        importacao = self.importacoes_em_cache().get(tipo)
+        return importacao['tipo_id'] if importacao is not None else None
+
+    def buscar_produtos(self, chaves: Iterable[str], dobrado: bool = False) -> Dict[str, tuple]:
+        """
+        Produtos do catálogo pelas chaves normalizadas.
+
+        Returns:
+            dict chave -> (ID, MODELO OLIST) da primeira linha do catálogo com a
+            chave, como CatalogoProdutos.buscar; chaves ausentes ficam de fora
+        """
+        coluna_chave = _catalogo.c.chave_dobrada if dobrado else _catalogo.c.chave
+        distintas = list(dict.fromkeys(chaves))
+        encontrados = {}
+        tipo_id = self._tipo_id_importado('catalogo') or 'O'
+        with self.engine.connect() as conexao:
+            for lote in _lotes(distintas, TAMANHO_LOTE_CONSULTA):
+                pedidas = set(lote)
+                consulta = (
+                    select(coluna_chave, _catalogo.c.id_produto, _catalogo.c.descricao)
+                    .where(coluna_chave.in_(lote))
+                    .order_by(_catalogo.c.posicao)
+                )
+                for chave, id_produto, descricao in conexao.execute(consulta):
+                    # Comparada de novo em Python: numa tabela com collation *_ci (criada antes
+                    # de utf8mb4_bin), o IN também traria chaves que só diferem em caixa ou acento
+                    if chave in pedidas and chave not in encontrados:
+                        encontrados[chave] = (_valor_id(id_produto, tipo_id), _valor_texto(descricao))
+        return encontrados
+
+    def indice_aproximado(self):
+        """
+        (índice de trigramas, ids, descrições) das chaves dobradas do catálogo, para a busca aproximada.
+
+        Montado na primeira busca e refeito quando a versão importada do catálogo muda.
+        """
+        importacao = self.importacoes_em_cache().get('catalogo')
+        versao = importacao['versao'] if importacao else None
+        with self._lock:
+            if self._aproximado is not None and self._aproximado[0] == versao:
+                return self._aproximado[1:]
+            primeiros = {}
+            with self.engine.connect() as conexao:
+                consulta = select(
+                    _catalogo.c.chave_dobrada, _catalogo.c.id_produto, _catalogo.c.descricao
+                ).order_by(_catalogo.c.posicao)
+                for chave, id_produto, descricao in conexao.execute(consulta):
+                    if chave not in primeiros:
+                        primeiros[chave] = (id_produto, descricao)
+            tipo_id = importacao['tipo_id'] if importacao else 'O'
+            ids = np.empty(len(primeiros), dtype=object)
+            ids[:] = [_valor_id(id_produto, tipo_id) for id_produto, _ in primeiros.values()]
+            descricoes = np.empty(len(primeiros), dtype=object)
+            descricoes[:] = [_valor_texto(descricao) for _, descricao in primeiros.values()]
+            indice = IndiceAproximado(pd.Index(list(primeiros), dtype=object))
+            self._aproximado = (versao, indice, ids, descricoes)
+            return indice, ids, descricoes
+
+    def buscar_cliente(self, id_cliente) -> Optional[tuple]:
+        """(ID, Nome) do cliente, comparando o ID como a busca no DataFrame de clientes faria."""
+        tipo_id = self._tipo_id_importado('clientes')
+        if tipo_id is None:
+            return None
+        try:
+            chave = _texto_id(str(id_cliente) if tipo_id == 'O' else float(str(id_cliente)), tipo_id)
+        except ValueError:
+            return None
+        with self.engine.connect() as conexao:
+            linhas = conexao.execute(
+                select(_clientes.c.id_cliente, _clientes.c.nome)
+                .where(_clientes.c.id_cliente == chave)
+                .order_by(_clientes.c.posicao)
+            )
+            # Igualdade exata também em Python (ver buscar_produtos)
+            linha = next((linha for linha in linhas if linha[0] == chave), None)
+        if linha is None:
+            return None
+        return _valor_id(linha[0], tipo_id), _valor_texto(linha[1])
+
+    def pagina_clientes(self, consulta: str = '', limite: Optional[int] = None, cursor: int = 0) -> Tuple[List[dict], Optional[int], int]:
+        """
+        Como IndiceClientes.pagina: clientes (ID, Nome) cujo nome, ou alguma palavra dele, começa com a consulta.
+
+        Returns:
+            Tupla (clientes da página, cursor da próxima página ou None, total encontrado)
+        """
+        filtro = _clientes.c.nome.isnot(None)
+        prefixo = normalizar_texto(consulta, dobrar=True)
+        if prefixo:
+            # O prefixo dobrado só tem letras, dígitos e espaços: nada a escapar no LIKE
+            filtro = filtro & or_(_clientes.c.nome_busca.like(f'{prefixo}%'), _clientes.c.nome_busca.like(f'% {prefixo}%'))
+        tipo_id = self._tipo_id_importado('clientes') or 'O'
+        with self.engine.connect() as conexao:
+            total = conexao.execute(select(func.count()).select_from(_clientes).where(filtro)).scalar()
+            selecao = select(_clientes.c.id_cliente, _clientes.c.nome).where(filtro).order_by(_clientes.c.posicao).offset(cursor)
+            if limite is not None:
+                selecao = selecao.limit(limite)
+            # ID em texto como em IndiceClientes (str do valor lido pelo pandas)
+            clientes = [{'ID': str(_valor_id(id_cliente, tipo_id)), 'Nome': nome} for id_cliente, nome in conexao.execute(selecao)]
+        proximo = cursor + limite if limite is not None and cursor + limite < total else None
+        return clientes, proximo, total
+
+
+def _configurar_sqlite(conexao, _registro) -> None:
+    # WAL: leituras dos workers não esperam pela transação de uma importação
+    cursor = conexao.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def assinatura_arquivo(caminho: str) -> Tuple[int, int]:
+    """Retorna (mtime_ns, tamanho) do arquivo; levanta FileNotFoundError se não existir."""
+    st = os.stat(caminho)
+    return (st.st_mtime_ns, st.st_size)
+
+
+# Sentinela de _valor_atual: o carregador pode devolver None
+_AUSENTE = object()
+
+
+class _EntradaCache:
+    __slots__ = ('assinatura', 'valor', 'geracao', 'conferida_em')
+
+    def __init__(self, assinatura, valor, geracao=None, conferida_em=0.0):
+        self.assinatura = assinatura
+        self.valor = valor
+        self.geracao = geracao
+        self.conferida_em = conferida_em
+
+
+class CacheReferencias:
+    """
+    Cache em memória (por processo) dos arquivos de referência já lidos e normalizados.
+
+    Cada entrada é identificada por (tipo, caminho) e guarda a assinatura
+    (mtime, tamanho) do arquivo no momento da leitura. Se a assinatura mudar,
+    ou se a entrada for invalidada explicitamente, o arquivo é lido novamente.
+
+    Com usar_geracao(), a assinatura só é conferida no disco quando o contador
+    de geração muda (uma nova versão foi publicada) ou quando a última
+    conferência tem mais de intervalo_revalidacao segundos; nos demais acessos
+    nenhum os.stat é feito.
+
+    O lock geral só protege o dicionário de entradas e os contadores. A leitura
+    do arquivo (xlsx ou snapshot) acontece fora dele, sob um lock da própria
+    chave: cargas de arquivos diferentes correm em paralelo, e quem pede uma
+    entrada já carregada não espera a carga de outra.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas: Dict[Tuple[str, str], _EntradaCache] = {}
+        self._locks_carga: Dict[Tuple[str, str], threading.Lock] = {}
+        self._geracao: Optional[Callable[[], Optional[int]]] = None
+        self._intervalo_revalidacao = 0.0
+        self.acertos = 0
+        self.falhas = 0
+        self.recargas = 0
+
+    def usar_geracao(self, geracao: Optional[Callable[[], Optional[int]]], intervalo_revalidacao: float = 60.0) -> None:
+        """
+        Passa a confiar no contador de geração em vez de conferir o arquivo a cada acesso.
+
+        Args:
+            geracao: função que devolve a geração atual (None desliga o recurso)
+            intervalo_revalidacao: segundos após os quais o arquivo é conferido mesmo
+                sem mudança de geração (cobre trocas feitas fora dos uploads)
+        """
+        with self._lock:
+            self._geracao = geracao
+            self._intervalo_revalidacao = intervalo_revalidacao
+
+    def obter(self, caminho: str, tipo: str, carregador: Callable[[str], Any]) -> Any:
+        """
+        Retorna o valor em cache para o arquivo, carregando-o se necessário.
+
+        Args:
+            caminho: Caminho do arquivo de referência
+            tipo: Identificador do tipo de dado (ex.: 'catalogo', 'clientes')
+            carregador: Função que recebe o caminho e devolve o valor a ser guardado
+
+        Returns:
+            O valor produzido pelo carregador (compartilhado; não deve ser alterado)
+        """
+        chave = (tipo, os.path.abspath(caminho))
+        geracao = self._geracao() if self._geracao is not None else None
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if (
+                geracao is not None and entrada is not None and entrada.assinatura is not None
+                and entrada.geracao == geracao and agora - entrada.conferida_em < self._intervalo_revalidacao
+            ):
+                self.acertos += 1
+                return entrada.valor
+
+        assinatura = assinatura_arquivo(caminho)
+        valor = self._valor_atual(chave, assinatura, geracao, agora)
+        if valor is not _AUSENTE:
+            return valor
+
+        with self._lock:
+            lock_carga = self._locks_carga.setdefault(chave, threading.Lock())
+        with lock_carga:
+            # Outra thread pode ter carregado a mesma assinatura enquanto esta esperava
+            valor = self._valor_atual(chave, assinatura, geracao, agora)
+            if valor is not _AUSENTE:
+                return valor
+            valor = carregador(caminho)
+            with self._lock:
+                if chave in self._entradas:
+                    self.recargas += 1
+                else:
+                    self.falhas += 1
+                self._entradas[chave] = _EntradaCache(assinatura, valor, geracao, agora)
+            return valor
+
+    def _valor_atual(self, chave: Tuple[str, str], assinatura: Tuple[int, int], geracao: Optional[int], agora: float) -> Any:
+        """Valor da entrada se ela foi lida com essa assinatura (e a marca como conferida), senão _AUSENTE."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada.assinatura != assinatura:
+                return _AUSENTE
+            entrada.geracao = geracao
+            entrada.conferida_em = agora
+            self.acertos += 1
+            return entrada.valor
+
+    def invalidar(self, caminho: Optional[str] = None) -> None:
+        """Força a releitura do arquivo informado (ou de todos, se caminho for None)."""
+        caminho_abs = os.path.abspath(caminho) if caminho is not None else None
+        with self._lock:
+            for (tipo, caminho_entrada), entrada in self._entradas.items():
+                if caminho_abs is None or caminho_entrada == caminho_abs:
+                    entrada.assinatura = None
+
+    def carregado(self, caminho: str, tipo: Optional[str] = None) -> bool:
+        """
+        Se o arquivo já foi lido e a entrada continua válida, sem consultar o disco.
+
+        Reflete o estado da última leitura: uma troca do arquivo só é percebida
+        na próxima chamada a obter().
+        """
+        caminho_abs = os.path.abspath(caminho)
+        with self._lock:
+            return any(
+                entrada.assinatura is not None
+                for (tipo_entrada, caminho_entrada), entrada in self._entradas.items()
+                if caminho_entrada == caminho_abs and (tipo is None or tipo_entrada == tipo)
+            )
+
+    def assinatura_carregada(self, caminho: str, tipo: str) -> Optional[Tuple[int, int]]:
+        """Assinatura (mtime_ns, tamanho) do arquivo na última leitura válida, ou None."""
+        with self._lock:
+            entrada = self._entradas.get((tipo, os.path.abspath(caminho)))
+            return entrada.assinatura if entrada is not None else None
+
+    def limpar(self) -> None:
+        """Remove todas as entradas e zera os contadores."""
+        with self._lock:
+            self._entradas.clear()
+            self.acertos = 0
+            self.falhas = 0
+            self.recargas = 0
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                'geracao': self._geracao() if self._geracao is not None else None,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'recargas': self.recargas,
+                'entradas': [
+                    {
+                        'tipo': tipo,
+                        'caminho': caminho,
+                        'valido': entrada.assinatura is not None,
+                    }
+                    for (tipo, caminho), entrada in self._entradas.items()
+                ],
+            }
+
+
+# Instância única por processo (cada worker do gunicorn tem a sua)
+cache_referencias = CacheReferencias()
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+_CHAVE_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _remover_arquivo(caminho: str) -> bool:
+    try:
+        os.remove(caminho)
+        return True
+    except OSError:
+        return False
+
+
+def chave_resultado(sha256_orcamento: str, id_cliente: str, versao_referencias, *extras) -> str:
+    """
+    Chave do resultado de uma conversão.
+
+    Combina o SHA-256 (hex) do orçamento enviado, o ID do cliente, a versão dos
+    dados de referência (qualquer valor que mude quando um deles é trocado,
+    ex.: a geração e as assinaturas conhecidas pelo cache de referências) e
+    qualquer outra opção que altere a saída (ex.: modo de escrita). Quando uma
+    referência muda, resultados antigos deixam de ser encontrados sem precisar
+    de invalidação explícita.
+    """
+    sha = hashlib.sha256()
+    sha.update(sha256_orcamento.encode('ascii'))
+    sha.update(str(id_cliente).strip().encode('utf-8'))
+    sha.update(f'|{versao_referencias!r}'.encode('utf-8'))
+    for extra in extras:
+        sha.update(f'|{extra!r}'.encode('utf-8'))
+    return sha.hexdigest()
+
+
+class CacheResultados:
+    """
+    Cache LRU dos xlsx já convertidos, limitado pelo total de bytes guardados.
+
+    A camada em memória é por processo. A camada opcional em disco (pasta_disco)
+    é compartilhada pelos workers do mesmo servidor: um resultado encontrado só
+    no disco é promovido para a memória. Com max_bytes = 0 e sem pasta_disco o
+    cache fica desligado.
+    """
+
+    def __init__(self, max_bytes: int, pasta_disco: Optional[str] = None, max_bytes_disco: int = 0):
+        self.max_bytes = max_bytes
+        self.pasta_disco = pasta_disco if max_bytes_disco > 0 else None
+        self.max_bytes_disco = max_bytes_disco
+        self._entradas: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        if self.pasta_disco:
+            os.makedirs(self.pasta_disco, exist_ok=True)
+
+    @property
+    def ativo(self) -> bool:
+        return self.max_bytes > 0 or self.pasta_disco is not None
+
+    def _caminho_disco(self, chave: str) -> str:
+        return os.path.join(self.pasta_disco, f'{chave}.xlsx')
+
+    def _guardar_memoria(self, chave: str, dados: bytes) -> None:
+        # Chamado com o lock adquirido
+        if len(dados) > self.max_bytes:
+            return
+        anterior = self._entradas.pop(chave, None)
+        if anterior is not None:
+            self._bytes -= len(anterior)
+        self._entradas[chave] = dados
+        self._bytes += len(dados)
+        while self._bytes > self.max_bytes:
+            _, removido = self._entradas.popitem(last=False)
+            self._bytes -= len(removido)
+
+    def obter(self, chave: str) -> Optional[bytes]:
+        """Bytes do xlsx guardado para a chave, ou None."""
+        with self._lock:
+            dados = self._entradas.get(chave)
+            if dados is not None:
+                self._entradas.move_to_end(chave)
+                self.acertos_memoria += 1
+                return dados
+
+        if self.pasta_disco and _CHAVE_RE.match(chave):
+            caminho = self._caminho_disco(chave)
+            try:
+                with open(caminho, 'rb') as f:
+                    dados = f.read()
+                # Atualiza o mtime, usado como ordem de uso na limpeza do disco
+                os.utime(caminho)
+            except OSError:
+                dados = None
+            if dados is not None:
+                with self._lock:
+                    self.acertos_disco += 1
+                    self._guardar_memoria(chave, dados)
+                return dados
+
+        with self._lock:
+            self.falhas += 1
+        return None
+
+    def guardar(self, chave: str, dados: bytes) -> None:
+        with self._lock:
+            self._guardar_memoria(chave, dados)
+        if self.pasta_disco and _CHAVE_RE.match(chave) and len(dados) <= self.max_bytes_disco:
+            destino = self._caminho_disco(chave)
+            temporario = f'{destino}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(temporario, 'wb') as f:
+                    f.write(dados)
+                os.replace(temporario, destino)
+            except OSError:
+                _remover_arquivo(temporario)
+                return
+            self._podar_disco()
+
+    def _podar_disco(self) -> None:
+        """Remove do disco os resultados usados há mais tempo até caber em max_bytes_disco."""
+        arquivos = []
+        try:
+            with os.scandir(self.pasta_disco) as it:
+                for entrada in it:
+                    if entrada.is_file() and entrada.name.endswith('.xlsx'):
+                        st = entrada.stat()
+                        arquivos.append((st.st_mtime_ns, st.st_size, entrada.path))
+        except OSError:
+            return
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.max_bytes_disco:
+                break
+            if _remover_arquivo(caminho):
+                total -= tamanho
+
+    def limpar(self) -> None:
+        """Descarta todos os resultados (memória e disco)."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+        if self.pasta_disco:
+            try:
+                nomes = os.listdir(self.pasta_disco)
+            except OSError:
+                return
+            for nome in nomes:
+                if nome.endswith('.xlsx'):
+                    _remover_arquivo(os.path.join(self.pasta_disco, nome))
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                'acertos_memoria': self.acertos_memoria,
+                'acertos_disco': self.acertos_disco,
+                'falhas': self.falhas,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disco': self.pasta_disco is not None,
+            }
+
@@ -1,36 +1,645 @@
+import logging
+import numpy as np
 import pandas as pd
-import sys
-import traceback
-import re # Para normalização
 import os
-import io
-from typing import Union, BinaryIO
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, BinaryIO, List, Optional, Tuple
 
-def normalizar_texto(texto):
-    if pd.isna(texto):
-        return ""
-    texto_str = str(texto).lower().strip()
-    # Remover múltiplos espaços
-    texto_str = re.sub(r'\s+', ' ', texto_str)
-    return texto_str
+from cache_referencias import cache_referencias
+from banco_referencias import banco_referencias, CatalogoBanco
+from normalizacao import normalizar_texto, normalizar_serie
+from leitura_orcamento import ler_linhas_planilha, dataframe_de_linhas
+from snapshot_referencias import carregar_com_snapshot, compilar_snapshot
+from correspondencia_aproximada import IndiceAproximado, LIMIAR_ACEITE_PADRAO, NOTA_MINIMA_SUGESTAO, QUANTIDADE_SUGESTOES
+from metricas import medir_etapa, registrar_etapa, CONVERSOES, LINHAS_CONVERTIDAS, PRODUTOS_NAO_MAPEADOS
+from opcoes_conversao import (
+    ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA, DOBRAR_ACENTOS_PADRAO, APROXIMADO_PADRAO
+)
+
+logger = logging.getLogger(__name__)
+
+# Linhas do topo do orçamento examinadas em busca dos metadados e do cabeçalho dos itens
+LINHAS_PREVIEW_METADADOS = 10
 
 def encontrar_linha_cabecalho(df_preview, palavras_chave_cabecalho):
     palavras_chave_normalizadas = [normalizar_texto(pc) for pc in palavras_chave_cabecalho]
-    for i, row in df_preview.iterrows():
-        valores_linha = [normalizar_texto(x) for x in row.tolist()]
+    for i, valores in zip(df_preview.index, df_preview.itertuples(index=False, name=None)):
+        valores_linha = {normalizar_texto(x) for x in valores}
         if all(palavra_chave in valores_linha for palavra_chave in palavras_chave_normalizadas):
             return i
     return None
 
-def converter_orcamento_para_olist(
+class CatalogoProdutos:
+    """
+    Aba CATÁLOGO do mapeamento de produtos com um índice de busca pré-montado.
+
+    O índice associa cada MODELO normalizado ao (ID, MODELO OLIST) da primeira
+    linha do catálogo em que ele aparece, o mesmo resultado do antigo filtro
+    por máscara seguido de iloc[0], mas com busca O(1) por item do orçamento.
+    Um segundo índice, com as chaves sem acentos e pontuação, e o índice de
+    trigramas da busca aproximada são montados na primeira vez que forem usados.
+    """
+
+    def __init__(self, df_mapeamento: pd.DataFrame):
+        self.df = df_mapeamento
+        self.indice = {}
+        self._arrays = None
+        self._arrays_dobrados = None
+        self._indice_aproximado = None
+        if 'MODELO' not in df_mapeamento.columns:
+            return
+
+        # Normalizar a coluna de busca no mapeamento
+        df_mapeamento['MODELO_NORMALIZADO_BUSCA'] = normalizar_serie(df_mapeamento['MODELO'])
+        self.indice = self._montar_indice(df_mapeamento['MODELO_NORMALIZADO_BUSCA'].values)
+        self._arrays = self._indice_em_arrays(self.indice)
+
+    def _montar_indice(self, chaves) -> dict:
+        quantidade = len(self.df)
+        ids = self.df['ID'].values if 'ID' in self.df.columns else [pd.NA] * quantidade
+        descricoes = self.df['MODELO OLIST'].values if 'MODELO OLIST' in self.df.columns else [pd.NA] * quantidade
+        indice = {}
+        for chave, id_produto, descricao in zip(chaves, ids, descricoes):
+            if chave not in indice:
+                indice[chave] = (id_produto, descricao)
+        return indice
+
+    @staticmethod
+    def _indice_em_arrays(indice: dict):
+        # Mesmos dados do índice em forma de arrays, para o mapeamento vetorizado
+        return (
+            pd.Index(list(indice.keys()), dtype=object),
+            _array_objetos([valor[0] for valor in indice.values()]),
+            _array_objetos([valor[1] for valor in indice.values()]),
+        )
+
+    @property
+    def tem_coluna_busca(self) -> bool:
+        return 'MODELO_NORMALIZADO_BUSCA' in self.df.columns
+
+    def buscar(self, modelo_normalizado: str):
+        """Retorna (ID, MODELO OLIST) do modelo normalizado, ou None se não estiver no catálogo."""
+        return self.indice.get(modelo_normalizado)
+
+    def _obter_arrays_dobrados(self):
+        if self._arrays_dobrados is None:
+            chaves_dobradas = normalizar_serie(self.df['MODELO'], dobrar=True).values
+            self._arrays_dobrados = self._indice_em_arrays(self._montar_indice(chaves_dobradas))
+        return self._arrays_dobrados
+
+    def preparar_indices(self, dobrado: bool = False, aproximado: bool = False) -> None:
+        """
+        Monta agora os índices que seriam montados no primeiro uso.
+
+        Inclui a tabela de hash que o pandas cria na primeira busca; com o
+        aquecimento no master do gunicorn, tudo isso fica compartilhado entre os workers.
+        """
+        if not self.tem_coluna_busca:
+            return
+        self._arrays[0].get_indexer([])
+        if dobrado or aproximado:
+            self._obter_arrays_dobrados()[0].get_indexer([])
+        if aproximado and self._indice_aproximado is None:
+            self._indice_aproximado = IndiceAproximado(self._arrays_dobrados[0])
+
+    def aproximar(self, modelo_dobrado: str, quantidade: int = QUANTIDADE_SUGESTOES, nota_minima: float = NOTA_MINIMA_SUGESTAO) -> list:
+        """
+        Modelos do catálogo mais parecidos com o modelo informado (normalizado com dobrar=True).
+
+        Returns:
+            Lista de dicts com 'modelo', 'ID produto', 'Descrição' e 'nota' (0 a 1),
+            da maior para a menor nota
+        """
+        chaves, ids_catalogo, descricoes_catalogo = self._obter_arrays_dobrados()
+        if self._indice_aproximado is None:
+            self._indice_aproximado = IndiceAproximado(chaves)
+        return [
+            {
+                'modelo': candidato.modelo,
+                'ID produto': ids_catalogo[candidato.posicao],
+                'Descrição': descricoes_catalogo[candidato.posicao],
+                'nota': candidato.nota,
+            }
+            for candidato in self._indice_aproximado.buscar(modelo_dobrado, quantidade, nota_minima)
+        ]
+
+    def mapear(self, modelos_normalizados: pd.Series, dobrado: bool = False):
+        """
+        Resolve uma coluna inteira de modelos normalizados de uma vez.
+
+        Args:
+            modelos_normalizados: Modelos já normalizados (normalizar_serie)
+            dobrado: Se True, as chaves foram normalizadas com dobrar=True e a
+                busca é feita no índice sem acentos e pontuação
+
+        Returns:
+            Tupla (ids, descricoes, encontrados): arrays de objetos com pd.NA
+            onde o modelo não está no catálogo e a máscara booleana dos encontrados
+        """
+        if dobrado:
+            chaves, ids_catalogo, descricoes_catalogo = self._obter_arrays_dobrados()
+        else:
+            chaves, ids_catalogo, descricoes_catalogo = self._arrays
+        posicoes = chaves.get_indexer(modelos_normalizados.values)
+        encontrados = posicoes >= 0
+        ids = _array_objetos([pd.NA] * len(posicoes))
+        descricoes = _array_objetos([pd.NA] * len(posicoes))
+        ids[encontrados] = ids_catalogo[posicoes[encontrados]]
+        descricoes[encontrados] = descricoes_catalogo[posicoes[encontrados]]
+        return ids, descricoes, encontrados
+
+def _array_objetos(valores) -> np.ndarray:
+    """Array 1-D de objetos que preserva os valores como estão (sem conversão de tipo)."""
+    array = np.empty(len(valores), dtype=object)
+    array[:] = valores
+    return array
+
+def _coluna_itens(df_itens: pd.DataFrame, nome: str) -> pd.Series:
+    """Coluna do orçamento como objetos Python, ou toda nula se a coluna não existir."""
+    if nome not in df_itens.columns:
+        return pd.Series([None] * len(df_itens), index=df_itens.index, dtype=object)
+    coluna = df_itens.loc[:, nome]
+    if isinstance(coluna, pd.DataFrame):  # cabeçalho duplicado: vale a primeira ocorrência
+        coluna = coluna.iloc[:, 0]
+    return coluna.astype(object)
+
+def montar_saida_olist(
+    df_orcamento_itens: pd.DataFrame,
+    catalogo: 'CatalogoProdutos',
+    valores_fixos: dict,
+    colunas_modelo_olist: list,
+    dobrar_acentos: bool = False,
+    aproximar: bool = False,
+    limiar_aproximado: float = LIMIAR_ACEITE_PADRAO,
+    linha_inicial_planilha: int = 0
+):
+    """
+    Monta o DataFrame de saída Olist a partir dos itens do orçamento, de forma vetorizada.
+
+    Args:
+        df_orcamento_itens: Itens do orçamento com colunas já normalizadas
+        catalogo: Catálogo de produtos indexado
+        valores_fixos: Valores repetidos em todas as linhas (proposta, data, contato)
+        colunas_modelo_olist: Colunas do modelo de saída, na ordem final
+        dobrar_acentos: Procura de novo, sem acentos e pontuação, os produtos sem correspondência exata
+        aproximar: Compara por semelhança os produtos ainda sem correspondência; o melhor
+            candidato é aceito se tiver nota >= limiar_aproximado e não empatar com outro produto
+        limiar_aproximado: Nota mínima (0 a 1) para aceitar um candidato automaticamente
+        linha_inicial_planilha: Número da linha da planilha do primeiro item (para o relatório)
+
+    Returns:
+        Tupla (DataFrame convertido, produtos não mapeados: dicts com 'linha',
+        'produto' e 'produto_normalizado', na ordem do orçamento). Com
+        aproximar=True, df.attrs['sugestoes_aproximadas'] lista, para cada produto
+        comparado por semelhança, a linha, o produto, o status ('aceito', 'sugerido'
+        ou 'sem_sugestao') e os candidatos
+    """
+    produtos = _coluna_itens(df_orcamento_itens, 'produto')
+    quantidades = _coluna_itens(df_orcamento_itens, 'quantidade')
+    valores_unitarios = _coluna_itens(df_orcamento_itens, 'valor unitário')
+
+    # Linhas sem produto, quantidade e valor unitário são ignoradas
+    linhas_validas = ~(produtos.isna() & quantidades.isna() & valores_unitarios.isna())
+    produtos = produtos[linhas_validas]
+    quantidades = quantidades[linhas_validas]
+    valores_unitarios = valores_unitarios[linhas_validas]
+    total_linhas = len(produtos)
+    if total_linhas == 0:
+        return pd.DataFrame(), []
+
+    produtos_normalizados = normalizar_serie(produtos)
+    ids_produto, descricoes_produto, encontrados = catalogo.mapear(produtos_normalizados)
+    if dobrar_acentos and not encontrados.all():
+        pendentes = ~encontrados
+        ids_dobrados, descricoes_dobradas, encontrados_dobrados = catalogo.mapear(
+            normalizar_serie(produtos[pendentes], dobrar=True), dobrado=True
+        )
+        ids_produto[pendentes] = ids_dobrados
+        descricoes_produto[pendentes] = descricoes_dobradas
+        encontrados = encontrados.copy()
+        encontrados[pendentes] = encontrados_dobrados
+
+    sugestoes_aproximadas = []
+    if aproximar and not encontrados.all():
+        encontrados = encontrados.copy()
+        candidatos_por_produto = {}
+        for posicao in np.flatnonzero(~encontrados & (produtos_normalizados != '').values):
+            original = produtos.values[posicao]
+            chave_dobrada = normalizar_texto(original, dobrar=True)
+            if chave_dobrada not in candidatos_por_produto:
+                candidatos_por_produto[chave_dobrada] = catalogo.aproximar(chave_dobrada)
+            candidatos = candidatos_por_produto[chave_dobrada]
+            aceito = _candidato_aceito(candidatos, limiar_aproximado)
+            if aceito is not None:
+                ids_produto[posicao] = aceito['ID produto']
+                descricoes_produto[posicao] = aceito['Descrição']
+                encontrados[posicao] = True
+            sugestoes_aproximadas.append({
+                'linha': int(produtos.index[posicao]) + linha_inicial_planilha,
+                'produto': original,
+                'status': 'aceito' if aceito is not None else ('sugerido' if candidatos else 'sem_sugestao'),
+                'candidatos': candidatos,
+            })
+
+    nao_mapeados = (produtos_normalizados != '').values & ~encontrados
+    produtos_nao_mapeados = [
+        {'linha': int(linha) + linha_inicial_planilha, 'produto': original, 'produto_normalizado': normalizado}
+        for linha, normalizado, original in zip(
+            produtos.index[nao_mapeados], produtos_normalizados.values[nao_mapeados], produtos.values[nao_mapeados]
+        )
+    ]
+
+    colunas_calculadas = dict(valores_fixos)
+    colunas_calculadas.update({
+        'ID produto': ids_produto,
+        'Descrição': descricoes_produto,
+        'Quantidade': quantidades.mask(quantidades.isna(), pd.NA).values,
+        'Valor unitário': valores_unitarios.mask(valores_unitarios.isna(), pd.NA).values,
+    })
+
+    dados_saida = {}
+    for coluna in colunas_modelo_olist:
+        valor = colunas_calculadas.get(coluna, pd.NA)
+        if not isinstance(valor, np.ndarray):
+            valor = _array_objetos([valor] * total_linhas)
+        dados_saida[coluna] = valor
+
+    df_saida = pd.DataFrame(dados_saida, columns=colunas_modelo_olist).infer_objects()
+    if aproximar:
+        df_saida.attrs['sugestoes_aproximadas'] = sugestoes_aproximadas
+    return df_saida, produtos_nao_mapeados
+
+def _candidato_aceito(candidatos: list, limiar: float) -> Optional[dict]:
+    """Melhor candidato, se a nota passar do limiar e nenhum produto diferente tiver a mesma nota."""
+    if not candidatos or candidatos[0]['nota'] < limiar:
+        return None
+    melhor = candidatos[0]
+    for candidato in candidatos[1:]:
+        if candidato['nota'] == melhor['nota'] and candidato['ID produto'] != melhor['ID produto']:
+            return None
+    return melhor
+
+def _ler_catalogo(caminho_mapeamento_produtos):
+    with pd.ExcelFile(caminho_mapeamento_produtos) as xls_map:
+        df_mapeamento = pd.read_excel(xls_map, sheet_name='CATÁLOGO')
+    return CatalogoProdutos(df_mapeamento)
+
+def _ler_clientes(caminho_clientes):
+    with pd.ExcelFile(caminho_clientes) as xls_cli:
+        return pd.read_excel(xls_cli, sheet_name='CLIENTES')
+
+def _ler_colunas_modelo_saida(caminho_modelo_saida_olist_com_dados):
+    with pd.ExcelFile(caminho_modelo_saida_olist_com_dados) as xls_modelo_novo:
+        if not xls_modelo_novo.sheet_names:
+            raise ValueError("O NOVO arquivo Excel modelo de saída não contém nenhuma aba.")
+        df_modelo_saida_temp = pd.read_excel(xls_modelo_novo, sheet_name=0)
+    return df_modelo_saida_temp.columns.tolist()
+
+# Nome padrão de cada arquivo de referência (em src/data, ver opcoes_conversao) e a função que o lê
+LEITORES_REFERENCIA = {
+    'catalogo': (ARQUIVO_CATALOGO, _ler_catalogo),
+    'clientes': (ARQUIVO_CLIENTES, _ler_clientes),
+    'modelo_saida': (ARQUIVO_MODELO_SAIDA, _ler_colunas_modelo_saida),
+}
+
+def _carregar_referencia(caminho: str, tipo: str):
+    """Lê pelo cache do processo; em caso de falta no cache, usa o snapshot pré-compilado se estiver atualizado."""
+    leitor = LEITORES_REFERENCIA[tipo][1]
+    return cache_referencias.obter(caminho, tipo, lambda c: carregar_com_snapshot(c, tipo, leitor))
+
+def carregar_catalogo(caminho_mapeamento_produtos: str) -> CatalogoProdutos:
+    """Catálogo de produtos normalizado e indexado (em cache)."""
+    return _carregar_referencia(caminho_mapeamento_produtos, 'catalogo')
+
+def carregar_clientes(caminho_clientes: str) -> pd.DataFrame:
+    """Aba CLIENTES do arquivo de clientes (em cache)."""
+    return _carregar_referencia(caminho_clientes, 'clientes')
+
+def carregar_colunas_modelo_saida(caminho_modelo_saida_olist_com_dados: str) -> list:
+    """Colunas da primeira aba do modelo de saída Olist (em cache)."""
+    return _carregar_referencia(caminho_modelo_saida_olist_com_dados, 'modelo_saida')
+
+def compilar_snapshot_referencia(caminho: str, tipo: str):
+    """Relê o arquivo de referência e grava seu snapshot (usado após um upload)."""
+    return compilar_snapshot(caminho, tipo, LEITORES_REFERENCIA[tipo][1])
+
+def _buscar_cliente_df(df_clientes: pd.DataFrame, id_cliente_selecionado) -> Optional[tuple]:
+    """(ID, Nome) da primeira linha de df_clientes com o ID, convertendo o ID para o tipo da coluna."""
+    if df_clientes.empty or 'ID' not in df_clientes.columns:
+        return None
+    info_cliente_df = pd.DataFrame()
+    try:
+        coluna_id_tipo = df_clientes['ID'].dtype
+        id_cliente_selecionado_str = str(id_cliente_selecionado)
+
+        if pd.api.types.is_numeric_dtype(coluna_id_tipo):
+            try:
+                id_cliente_convertido = int(float(id_cliente_selecionado_str))
+            except ValueError:
+                id_cliente_convertido = float(id_cliente_selecionado_str)
+        else:
+            id_cliente_convertido = id_cliente_selecionado_str
+
+        info_cliente_df = df_clientes[df_clientes['ID'] == id_cliente_convertido]
+    except Exception as e:
+        logger.warning('Erro ao buscar cliente: %s', e, extra={'id_cliente': str(id_cliente_selecionado)})
+    if info_cliente_df.empty:
+        return None
+    info_cliente = info_cliente_df.iloc[0]
+    return info_cliente['ID'], info_cliente['Nome']
+
+class ReferenciasConversao:
+    """
+    Dados de referência usados em uma conversão: catálogo, clientes e colunas do modelo de saída.
+
+    Com o banco de referências (CONVERSOR_DATABASE_URL), catalogo é um
+    CatalogoBanco, df_clientes fica None e os clientes são consultados no banco.
+    """
+
+    def __init__(self, catalogo: CatalogoProdutos, df_clientes: Optional[pd.DataFrame], colunas_modelo_olist: list, banco=None):
+        self.catalogo = catalogo
+        self.df_clientes = df_clientes
+        self.colunas_modelo_olist = colunas_modelo_olist
+        self.banco = banco
+
+    def buscar_cliente(self, id_cliente_selecionado) -> Optional[tuple]:
+        """(ID, Nome) do cliente, ou None se ele não existir."""
+        if self.banco is not None:
+            return self.banco.buscar_cliente(id_cliente_selecionado)
+        return _buscar_cliente_df(self.df_clientes, id_cliente_selecionado)
+
+def _valor_json(valor):
+    """Valor de célula em um tipo aceito pelo json (números numpy, datas e nulos)."""
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, (str, int, float, bool)):
+        return valor
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+class ResultadoConversao:
+    """
+    Resultado de uma conversão: o DataFrame de saída e o relatório dos produtos não mapeados.
+
+    Attributes:
+        df: DataFrame no formato Olist (vazio se a conversão falhou)
+        nao_mapeados: dicts com 'linha' (linha da planilha do orçamento), 'produto'
+            (como está no orçamento) e 'produto_normalizado', na ordem do orçamento
+        tempos: duração de cada etapa, em milissegundos
+        erro: mensagem de erro, ou None se a conversão terminou
+        metadados: o que foi lido do orçamento: 'aba', 'numero_proposta', 'data',
+            'linha_cabecalho' (linha da planilha, contando a partir de 1),
+            'cabecalho_detectado' e 'leitura_interrompida' (parou em limite_itens)
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        nao_mapeados: Optional[list] = None,
+        tempos: Optional[dict] = None,
+        erro: Optional[str] = None,
+        metadados: Optional[dict] = None
+    ):
+        self.df = df
+        self.nao_mapeados = nao_mapeados or []
+        self.tempos = tempos or {}
+        self.erro = erro
+        self.metadados = metadados or {}
+
+    @property
+    def sugestoes(self) -> list:
+        """Sugestões da busca aproximada (vazia se ela não foi usada)."""
+        return self.df.attrs.get('sugestoes_aproximadas', [])
+
+    def contagens(self) -> dict:
+        return {
+            'linhas': len(self.df),
+            'nao_mapeadas': len(self.nao_mapeados),
+            'produtos_nao_mapeados_distintos': len({item['produto_normalizado'] for item in self.nao_mapeados}),
+        }
+
+    def tabela_nao_mapeados(self) -> pd.DataFrame:
+        """Produtos não mapeados em forma de tabela (aba 'Não mapeados')."""
+        return pd.DataFrame(
+            [(item['linha'], item['produto'], item['produto_normalizado']) for item in self.nao_mapeados],
+            columns=['Linha', 'Produto', 'Produto normalizado']
+        )
+
+    def relatorio(self) -> dict:
+        """Relatório da conversão pronto para json.dumps."""
+        relatorio = {
+            'erro': self.erro,
+            'contagens': self.contagens(),
+            'tempos_ms': self.tempos,
+            'nao_mapeados': [
+                {chave: _valor_json(valor) for chave, valor in item.items()}
+                for item in self.nao_mapeados
+            ],
+        }
+        if self.sugestoes:
+            relatorio['sugestoes'] = [
+                dict(
+                    sugestao,
+                    produto=_valor_json(sugestao['produto']),
+                    candidatos=[
+                        {chave: _valor_json(valor) for chave, valor in candidato.items()}
+                        for candidato in sugestao['candidatos']
+                    ]
+                )
+                for sugestao in self.sugestoes
+            ]
+        return relatorio
+
+    def previa(self, limite: int, cursor: int = 0) -> dict:
+        """
+        Relatório com os metadados do orçamento e uma página das linhas convertidas, pronto para json.dumps.
+
+        As linhas vão como dicts coluna -> valor, a partir da posição cursor;
+        'proximo_cursor' é None na última página.
+        """
+        pagina = self.df.iloc[cursor:cursor + limite]
+        fim = cursor + len(pagina)
+        previa = self.relatorio()
+        previa.update({
+            'metadados': {chave: _valor_json(valor) for chave, valor in self.metadados.items()},
+            'colunas': [str(coluna) for coluna in self.df.columns],
+            'linhas': [
+                {str(coluna): _valor_json(valor) for coluna, valor in zip(pagina.columns, valores)}
+                for valores in pagina.itertuples(index=False, name=None)
+            ],
+            'total': len(self.df),
+            'proximo_cursor': str(fim) if fim < len(self.df) else None,
+        })
+        return previa
+
+def carregar_referencias(
+    caminho_mapeamento_produtos: str,
+    caminho_clientes: str,
+    caminho_modelo_saida_olist_com_dados: str,
+    tempos: Optional[dict] = None
+) -> ReferenciasConversao:
+    """
+    Carrega (do cache) catálogo, clientes e colunas do modelo de saída de uma só vez.
+
+    A duração de cada leitura vai para as métricas (etapas 'catalogo', 'clientes'
+    e 'modelo_saida') e, se informado, para o dict tempos (em ms). Com o banco de
+    referências configurado, catálogo e clientes são consultados nele a cada
+    conversão e os dois primeiros caminhos não são lidos.
+    """
+    banco = banco_referencias()
+    if banco is not None:
+        catalogo, df_clientes = CatalogoBanco(banco), None
+    else:
+        logger.debug('Lendo arquivo de mapeamento', extra={'caminho': caminho_mapeamento_produtos})
+        with medir_etapa('catalogo', tempos):
+            catalogo = carregar_catalogo(caminho_mapeamento_produtos)
+
+        logger.debug('Lendo arquivo de clientes', extra={'caminho': caminho_clientes})
+        with medir_etapa('clientes', tempos):
+            df_clientes = carregar_clientes(caminho_clientes)
+
+    logger.debug('Lendo arquivo modelo de saída', extra={'caminho': caminho_modelo_saida_olist_com_dados})
+    with medir_etapa('modelo_saida', tempos):
+        colunas_modelo_olist = carregar_colunas_modelo_saida(caminho_modelo_saida_olist_com_dados)
+    logger.debug('Colunas do modelo Olist', extra={'colunas': colunas_modelo_olist})
+    return ReferenciasConversao(catalogo, df_clientes, colunas_modelo_olist, banco=banco)
+
+def _converter_com_referencias(
+    arquivo_orcamento: Union[str, BinaryIO],
+    referencias: ReferenciasConversao,
+    id_cliente_selecionado: Union[str, int],
+    dobrar_acentos: bool = False,
+    aproximar: bool = False,
+    limite_itens: Optional[int] = None
+):
+    """
+    Converte um orçamento usando dados de referência já carregados.
+
+    Levanta exceção em caso de erro (o tratamento fica com quem chama). Com
+    limite_itens, a leitura da planilha para logo após as primeiras linhas de
+    itens e só elas são convertidas.
+
+    Returns:
+        ResultadoConversao com o DataFrame convertido, os produtos não mapeados
+        e os tempos de leitura e montagem
+    """
+    inicio = time.perf_counter()
+    logger.debug('Lendo arquivo de orçamento')
+    if not isinstance(arquivo_orcamento, (str, bytes)) and not hasattr(arquivo_orcamento, 'read'):
+        raise ValueError("Formato de arquivo de orçamento inválido")
+
+    # Uma única passada pela planilha; metadados e itens são interpretados a partir das mesmas linhas
+    # O cabeçalho dos itens fica entre as linhas de metadados; com limite_itens, lê só até o último item pedido
+    limite_linhas = LINHAS_PREVIEW_METADADOS + 1 + limite_itens if limite_itens is not None else None
+    sheet_name_orcamento, linhas_orcamento = ler_linhas_planilha(
+        arquivo_orcamento, aba_preferida='Orçamento', limite_linhas=limite_linhas
+    )
+    fim_leitura = time.perf_counter()
+
+    # Leitura dos metadados do orçamento (equivalente a read_excel(nrows=10, header=None))
+    df_orc_preview_meta = dataframe_de_linhas(linhas_orcamento[:LINHAS_PREVIEW_METADADOS + 1], header=None, nrows=LINHAS_PREVIEW_METADADOS)
+    num_proposta_orc = None
+    data_proposta_orc = None
+
+    # Extração de metadados
+    if len(df_orc_preview_meta) > 0 and len(df_orc_preview_meta.columns) > 1:
+        for i in range(len(df_orc_preview_meta)):
+            if normalizar_texto(df_orc_preview_meta.iloc[i, 0]) == "orçamento #":
+                num_proposta_orc = df_orc_preview_meta.iloc[i, 1]
+            if normalizar_texto(df_orc_preview_meta.iloc[i, 0]) == "data":
+                data_proposta_orc = df_orc_preview_meta.iloc[i, 1]
+                if isinstance(data_proposta_orc, pd.Timestamp):
+                    data_proposta_orc = data_proposta_orc.date()
+                elif isinstance(data_proposta_orc, str):
+                    try:
+                        data_proposta_orc = pd.to_datetime(data_proposta_orc, dayfirst=True).date()
+                    except ValueError:
+                        try:
+                            data_proposta_orc = pd.to_datetime(data_proposta_orc).date()
+                        except ValueError:
+                            pass
+
+    # Identificação do cabeçalho dos itens
+    palavras_chave_cabecalho_itens = ["Produto", "Cor", "Qualidade", "Valor Unitário", "Quantidade", "Subtotal"]
+    linha_cabecalho_itens_idx = encontrar_linha_cabecalho(df_orc_preview_meta, palavras_chave_cabecalho_itens)
+
+    if linha_cabecalho_itens_idx is not None:
+        df_orcamento_itens = dataframe_de_linhas(linhas_orcamento, header=linha_cabecalho_itens_idx)
+    else:
+        df_orcamento_itens = dataframe_de_linhas(linhas_orcamento, skiprows=2)
+    # Linha da planilha (contando a partir de 1) do primeiro item, logo abaixo do cabeçalho
+    linha_inicial_itens = (linha_cabecalho_itens_idx if linha_cabecalho_itens_idx is not None else 2) + 2
+    leitura_interrompida = False
+    if limite_itens is not None:
+        leitura_interrompida = len(df_orcamento_itens) > limite_itens or len(linhas_orcamento) >= limite_linhas
+        df_orcamento_itens = df_orcamento_itens.iloc[:limite_itens]
+
+    # Normalização das colunas
+    df_orcamento_itens.columns = [normalizar_texto(col) for col in df_orcamento_itens.columns]
+
+    # Busca informações do cliente
+    info_cliente = referencias.buscar_cliente(id_cliente_selecionado)
+    if info_cliente is None:
+        raise ValueError(f"Cliente com ID '{id_cliente_selecionado}' não encontrado")
+    id_contato_cliente, nome_contato_cliente = info_cliente
+
+    # Processamento dos itens
+    valores_fixos = {
+        'Número da proposta': num_proposta_orc if num_proposta_orc is not None else pd.NA,
+        'Data': data_proposta_orc if data_proposta_orc is not None else pd.NA,
+        'ID contato': id_contato_cliente,
+        'Nome do contato': nome_contato_cliente,
+    }
+    df_saida, produtos_nao_mapeados = montar_saida_olist(
+        df_orcamento_itens, referencias.catalogo, valores_fixos, referencias.colunas_modelo_olist,
+        dobrar_acentos=dobrar_acentos,
+        aproximar=aproximar,
+        linha_inicial_planilha=linha_inicial_itens
+    )
+    tempos = {}
+    registrar_etapa('leitura_orcamento', fim_leitura - inicio, tempos)
+    registrar_etapa('montagem', time.perf_counter() - fim_leitura, tempos)
+    LINHAS_CONVERTIDAS.observar(len(df_saida))
+    PRODUTOS_NAO_MAPEADOS.observar(len(produtos_nao_mapeados))
+    metadados = {
+        'aba': sheet_name_orcamento,
+        'numero_proposta': num_proposta_orc,
+        'data': data_proposta_orc,
+        'linha_cabecalho': linha_inicial_itens - 1,
+        'cabecalho_detectado': linha_cabecalho_itens_idx is not None,
+        'leitura_interrompida': leitura_interrompida,
+    }
+    return ResultadoConversao(df_saida, produtos_nao_mapeados, tempos=tempos, metadados=metadados)
+
+def _logar_nao_mapeados(produtos_nao_mapeados):
+    """Um único registro por conversão; a lista dos produtos só entra com o nível DEBUG."""
+    if not produtos_nao_mapeados or not logger.isEnabledFor(logging.INFO):
+        return
+    extra = {'quantidade': len(produtos_nao_mapeados)}
+    if logger.isEnabledFor(logging.DEBUG):
+        extra['produtos'] = [
+            {'linha': item['linha'], 'produto': str(item['produto']), 'produto_normalizado': item['produto_normalizado']}
+            for item in produtos_nao_mapeados
+        ]
+    logger.info('Produtos não mapeados', extra=extra)
+
+def converter_orcamento_com_relatorio(
     arquivo_orcamento: Union[str, BinaryIO],
     caminho_mapeamento_produtos: str,
     caminho_clientes: str,
     id_cliente_selecionado: Union[str, int],
-    caminho_modelo_saida_olist_com_dados: str
-) -> pd.DataFrame:
+    caminho_modelo_saida_olist_com_dados: str,
+    dobrar_acentos: Optional[bool] = None,
+    aproximar: Optional[bool] = None,
+    limite_itens: Optional[int] = None
+) -> ResultadoConversao:
     """
-    Converte um arquivo de orçamento para o formato Olist.
+    Converte um arquivo de orçamento para o formato Olist, com o relatório da conversão.
     
     Args:
         arquivo_orcamento: Caminho do arquivo ou objeto BytesIO contendo o orçamento
@@ -38,20 +647,29 @@ def converter_orcamento_para_olist(
         caminho_clientes: Caminho do arquivo de clientes
         id_cliente_selecionado: ID do cliente selecionado
         caminho_modelo_saida_olist_com_dados: Caminho do arquivo modelo de saída
+        dobrar_acentos: Tenta de novo, ignorando acentos e pontuação, os produtos sem
+            correspondência exata (padrão: variável CONVERSOR_DOBRAR_ACENTOS)
+        aproximar: Compara por semelhança com o catálogo os produtos ainda sem
+            correspondência (padrão: variável CONVERSOR_APROXIMADO); as sugestões
+            ficam em df.attrs['sugestoes_aproximadas']
+        limite_itens: Converte só as primeiras linhas de itens, sem ler o resto da
+            planilha (para prévias); None converte o orçamento inteiro
         
     Returns:
-        DataFrame com o orçamento convertido no formato Olist
+        ResultadoConversao; em caso de erro, com o DataFrame vazio e a mensagem em .erro
     """
-    df_modelo_saida_temp = None
+    inicio = time.perf_counter()
     colunas_modelo_olist = []
-    produtos_nao_mapeados_log = [] # Lista para logar produtos não mapeados
     
-    # Adicionar diagnóstico para verificar os arquivos
-    print(f"[DIAGNÓSTICO] Verificando existência dos arquivos:")
-    print(f"[DIAGNÓSTICO] Tipo arquivo_orcamento: {type(arquivo_orcamento)}")
-    print(f"[DIAGNÓSTICO] caminho_mapeamento_produtos: {caminho_mapeamento_produtos} (Existe: {os.path.exists(caminho_mapeamento_produtos)})")
-    print(f"[DIAGNÓSTICO] caminho_clientes: {caminho_clientes} (Existe: {os.path.exists(caminho_clientes)})")
-    print(f"[DIAGNÓSTICO] caminho_modelo_saida_olist_com_dados: {caminho_modelo_saida_olist_com_dados} (Existe: {os.path.exists(caminho_modelo_saida_olist_com_dados)})")
+    # Diagnóstico dos arquivos de entrada (só com o nível DEBUG; os.path.exists custa syscalls)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Arquivos da conversão', extra={
+            'tipo_orcamento': type(arquivo_orcamento).__name__,
+            'arquivos': {
+                caminho: os.path.exists(caminho)
+                for caminho in (caminho_mapeamento_produtos, caminho_clientes, caminho_modelo_saida_olist_com_dados)
+            },
+        })
     
     # Verificar se os arquivos existem antes de tentar abri-los
     # Não verificamos arquivo_orcamento quando é BytesIO
@@ -59,168 +677,146 @@ def converter_orcamento_para_olist(
     if isinstance(arquivo_orcamento, str):
         arquivos_para_verificar.append((arquivo_orcamento, "orçamento"))
     
-    arquivos_para_verificar.extend([
-        (caminho_mapeamento_produtos, "mapeamento de produtos"),
-        (caminho_clientes, "clientes"),
-        (caminho_modelo_saida_olist_com_dados, "modelo de saída")
-    ])
+    if banco_referencias() is None:
+        # Com o banco de referências, catálogo e clientes não são lidos dos xlsx
+        arquivos_para_verificar.extend([
+            (caminho_mapeamento_produtos, "mapeamento de produtos"),
+            (caminho_clientes, "clientes"),
+        ])
+    arquivos_para_verificar.append((caminho_modelo_saida_olist_com_dados, "modelo de saída"))
     
     for arquivo, descricao in arquivos_para_verificar:
         if not os.path.exists(arquivo):
             erro_msg = f"Arquivo de {descricao} não encontrado: {arquivo}"
-            print(f"[CONVERSOR V6] ERRO: {erro_msg}", file=sys.stderr)
+            logger.error(erro_msg)
             raise FileNotFoundError(erro_msg)
 
-    print(f"[CONVERSOR V6] Iniciando conversão. Cliente ID: {id_cliente_selecionado}", file=sys.stderr)
+    logger.debug('Iniciando conversão', extra={'id_cliente': str(id_cliente_selecionado)})
+    tempos_referencias = {}
     try:
-        print(f"[CONVERSOR V6] Lendo arquivo de mapeamento: {caminho_mapeamento_produtos}", file=sys.stderr)
-        with pd.ExcelFile(caminho_mapeamento_produtos) as xls_map:
-            df_mapeamento = pd.read_excel(xls_map, sheet_name='CATÁLOGO')
-        
-        # Normalizar a coluna de busca no mapeamento
-        if 'MODELO' in df_mapeamento.columns:
-            df_mapeamento['MODELO_NORMALIZADO_BUSCA'] = df_mapeamento['MODELO'].apply(normalizar_texto)
-            print(f"[CONVERSOR V6] Coluna 'MODELO' normalizada para busca em df_mapeamento.", file=sys.stderr)
-        else:
-            print(f"[CONVERSOR V6] ERRO: Coluna 'MODELO' não encontrada em {caminho_mapeamento_produtos}", file=sys.stderr)
-            return pd.DataFrame(columns=colunas_modelo_olist if colunas_modelo_olist else [])
+        referencias = carregar_referencias(
+            caminho_mapeamento_produtos, caminho_clientes, caminho_modelo_saida_olist_com_dados,
+            tempos=tempos_referencias
+        )
+        if not referencias.catalogo.tem_coluna_busca:
+            erro_msg = f"Coluna 'MODELO' não encontrada em {caminho_mapeamento_produtos}"
+            logger.error(erro_msg)
+            CONVERSOES.inc(status='erro')
+            return ResultadoConversao(pd.DataFrame(columns=[]), tempos=tempos_referencias, erro=erro_msg)
+        colunas_modelo_olist = referencias.colunas_modelo_olist
 
-        print(f"[CONVERSOR V6] Lendo arquivo de clientes: {caminho_clientes}", file=sys.stderr)
-        with pd.ExcelFile(caminho_clientes) as xls_cli:
-            df_clientes = pd.read_excel(xls_cli, sheet_name='CLIENTES')
-        
-        print(f"[CONVERSOR V6] Lendo NOVO arquivo modelo de saída com dados: {caminho_modelo_saida_olist_com_dados}", file=sys.stderr)
-        with pd.ExcelFile(caminho_modelo_saida_olist_com_dados) as xls_modelo_novo:
-            if xls_modelo_novo.sheet_names:
-                df_modelo_saida_temp = pd.read_excel(xls_modelo_novo, sheet_name=0)
-                print(f"[CONVERSOR V6] Lida a primeira aba do NOVO modelo de saída: {xls_modelo_novo.sheet_names[0]}", file=sys.stderr)
-            else:
-                raise ValueError("O NOVO arquivo Excel modelo de saída não contém nenhuma aba.")
-            colunas_modelo_olist = df_modelo_saida_temp.columns.tolist()
-            print(f"[CONVERSOR V6] Colunas do NOVO modelo Olist: {colunas_modelo_olist}", file=sys.stderr)
-
-        print(f"[CONVERSOR V6] Lendo arquivo de orçamento", file=sys.stderr)
-        if isinstance(arquivo_orcamento, (str, bytes, io.BytesIO)):
-            xls_orc = pd.ExcelFile(arquivo_orcamento)
-        else:
-            raise ValueError("Formato de arquivo de orçamento inválido")
-            
-        sheet_name_orcamento = 'Orçamento' if 'Orçamento' in xls_orc.sheet_names else xls_orc.sheet_names[0]
-        
-        # Leitura dos metadados do orçamento
-        df_orc_preview_meta = pd.read_excel(xls_orc, sheet_name=sheet_name_orcamento, nrows=10, header=None)
-        num_proposta_orc = None
-        data_proposta_orc = None
-        
-        # Extração de metadados
-        if len(df_orc_preview_meta) > 0 and len(df_orc_preview_meta.columns) > 1:
-            for i in range(len(df_orc_preview_meta)):
-                if normalizar_texto(df_orc_preview_meta.iloc[i, 0]) == "orçamento #":
-                    num_proposta_orc = df_orc_preview_meta.iloc[i, 1]
-                if normalizar_texto(df_orc_preview_meta.iloc[i, 0]) == "data":
-                    data_proposta_orc = df_orc_preview_meta.iloc[i, 1]
-                    if isinstance(data_proposta_orc, pd.Timestamp):
-                        data_proposta_orc = data_proposta_orc.date()
-                    elif isinstance(data_proposta_orc, str):
-                        try:
-                            data_proposta_orc = pd.to_datetime(data_proposta_orc, dayfirst=True).date()
-                        except ValueError:
-                            try:
-                                data_proposta_orc = pd.to_datetime(data_proposta_orc).date()
-                            except ValueError:
-                                pass
-        
-        # Identificação do cabeçalho dos itens
-        palavras_chave_cabecalho_itens = ["Produto", "Cor", "Qualidade", "Valor Unitário", "Quantidade", "Subtotal"]
-        linha_cabecalho_itens_idx = encontrar_linha_cabecalho(df_orc_preview_meta, palavras_chave_cabecalho_itens)
-        
-        if linha_cabecalho_itens_idx is not None:
-            df_orcamento_itens = pd.read_excel(xls_orc, sheet_name=sheet_name_orcamento, header=linha_cabecalho_itens_idx)
-        else:
-            df_orcamento_itens = pd.read_excel(xls_orc, sheet_name=sheet_name_orcamento, skiprows=2)
-        
-        # Normalização das colunas
-        df_orcamento_itens.columns = [normalizar_texto(col) for col in df_orcamento_itens.columns]
-        
-        # Busca informações do cliente
-        info_cliente_df = pd.DataFrame()
-        if not df_clientes.empty and 'ID' in df_clientes.columns:
-            try:
-                coluna_id_tipo = df_clientes['ID'].dtype
-                id_cliente_selecionado_str = str(id_cliente_selecionado)
-                
-                if pd.api.types.is_numeric_dtype(coluna_id_tipo):
-                    try:
-                        id_cliente_convertido = int(float(id_cliente_selecionado_str))
-                    except ValueError:
-                        id_cliente_convertido = float(id_cliente_selecionado_str)
-                else:
-                    id_cliente_convertido = id_cliente_selecionado_str
-                    
-                info_cliente_df = df_clientes[df_clientes['ID'] == id_cliente_convertido]
-            except Exception as e:
-                print(f"[CONVERSOR V6] Erro ao buscar cliente: {str(e)}", file=sys.stderr)
-        
-        if info_cliente_df.empty:
-            raise ValueError(f"Cliente com ID '{id_cliente_selecionado}' não encontrado")
-        
-        info_cliente = info_cliente_df.iloc[0]
-        id_contato_cliente = info_cliente['ID']
-        nome_contato_cliente = info_cliente['Nome']
-        
-        # Processamento dos itens
-        linhas_saida = []
-        for index, linha_item in df_orcamento_itens.iterrows():
-            produto_orcamento_original = linha_item.get('produto')
-            qtde = linha_item.get('quantidade')
-            valor_unit = linha_item.get('valor unitário')
-            
-            if pd.isna(produto_orcamento_original) and pd.isna(qtde) and pd.isna(valor_unit):
-                continue
-                
-            produto_orcamento_busca_normalizado = normalizar_texto(produto_orcamento_original)
-            
-            id_produto_olist = pd.NA
-            descricao_produto_olist = pd.NA
-            
-            if produto_orcamento_busca_normalizado:
-                produto_mapeado_df = df_mapeamento[
-                    df_mapeamento['MODELO_NORMALIZADO_BUSCA'] == produto_orcamento_busca_normalizado
-                ]
-                
-                if not produto_mapeado_df.empty:
-                    produto_mapeado = produto_mapeado_df.iloc[0]
-                    id_produto_olist = produto_mapeado.get('ID', pd.NA)
-                    descricao_produto_olist = produto_mapeado.get('MODELO OLIST', pd.NA)
-                else:
-                    produtos_nao_mapeados_log.append(
-                        f"'{produto_orcamento_busca_normalizado}' (Original: '{produto_orcamento_original}')"
-                    )
-            
-            linha_convertida = {
-                'Número da proposta': num_proposta_orc if num_proposta_orc is not None else pd.NA,
-                'Data': data_proposta_orc if data_proposta_orc is not None else pd.NA,
-                'ID contato': id_contato_cliente,
-                'Nome do contato': nome_contato_cliente,
-                'ID produto': id_produto_olist,
-                'Descrição': descricao_produto_olist,
-                'Quantidade': qtde if pd.notna(qtde) else pd.NA,
-                'Valor unitário': valor_unit if pd.notna(valor_unit) else pd.NA
-            }
-            
-            linhas_saida.append({col: linha_convertida.get(col, pd.NA) for col in colunas_modelo_olist})
-        
-        if produtos_nao_mapeados_log:
-            print("[CONVERSOR V6] Produtos não mapeados:", file=sys.stderr)
-            for produto in produtos_nao_mapeados_log:
-                print(f"  - {produto}", file=sys.stderr)
-        
-        return pd.DataFrame(linhas_saida)
+        resultado = _converter_com_referencias(
+            arquivo_orcamento, referencias, id_cliente_selecionado,
+            dobrar_acentos=DOBRAR_ACENTOS_PADRAO if dobrar_acentos is None else dobrar_acentos,
+            aproximar=APROXIMADO_PADRAO if aproximar is None else aproximar,
+            limite_itens=limite_itens
+        )
+        _logar_nao_mapeados(resultado.nao_mapeados)
+        resultado.tempos = dict(tempos_referencias, **resultado.tempos)
+        registrar_etapa('conversao', time.perf_counter() - inicio, resultado.tempos)
+        CONVERSOES.inc(status='ok' if not resultado.df.empty else 'vazio')
+        return resultado
         
     except Exception as e:
-        print(f"[CONVERSOR V6] Erro: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
-        return pd.DataFrame(columns=colunas_modelo_olist if colunas_modelo_olist else [])
+        logger.exception('Erro na conversão: %s', e)
+        CONVERSOES.inc(status='erro')
+        return ResultadoConversao(
+            pd.DataFrame(columns=colunas_modelo_olist if colunas_modelo_olist else []),
+            tempos=tempos_referencias,
+            erro=str(e)
+        )
+
+def converter_orcamento_para_olist(
+    arquivo_orcamento: Union[str, BinaryIO],
+    caminho_mapeamento_produtos: str,
+    caminho_clientes: str,
+    id_cliente_selecionado: Union[str, int],
+    caminho_modelo_saida_olist_com_dados: str,
+    dobrar_acentos: Optional[bool] = None,
+    aproximar: Optional[bool] = None
+) -> pd.DataFrame:
+    """
+    Converte um arquivo de orçamento para o formato Olist.
+
+    Mesmos argumentos de converter_orcamento_com_relatorio.
+
+    Returns:
+        DataFrame com o orçamento convertido no formato Olist (vazio em caso de erro)
+    """
+    return converter_orcamento_com_relatorio(
+        arquivo_orcamento,
+        caminho_mapeamento_produtos,
+        caminho_clientes,
+        id_cliente_selecionado,
+        caminho_modelo_saida_olist_com_dados,
+        dobrar_acentos=dobrar_acentos,
+        aproximar=aproximar
+    ).df
+
+def converter_lote_para_olist(
+    arquivos_orcamento: List[Tuple[str, Union[str, BinaryIO]]],
+    caminho_mapeamento_produtos: str,
+    caminho_clientes: str,
+    id_cliente_selecionado: Union[str, int],
+    caminho_modelo_saida_olist_com_dados: str,
+    max_workers: int = 1,
+    dobrar_acentos: Optional[bool] = None,
+    aproximar: Optional[bool] = None
+) -> List[dict]:
+    """
+    Converte vários orçamentos do mesmo cliente, lendo os dados de referência uma única vez.
+
+    Args:
+        arquivos_orcamento: Lista de (nome, arquivo), onde arquivo é caminho ou objeto BytesIO
+        caminho_mapeamento_produtos: Caminho do arquivo de mapeamento de produtos
+        caminho_clientes: Caminho do arquivo de clientes
+        id_cliente_selecionado: ID do cliente selecionado
+        caminho_modelo_saida_olist_com_dados: Caminho do arquivo modelo de saída
+        max_workers: Número de orçamentos convertidos em paralelo (threads)
+        dobrar_acentos: Como em converter_orcamento_para_olist
+        aproximar: Como em converter_orcamento_para_olist
+
+    Returns:
+        Lista, na mesma ordem da entrada, de dicts com as chaves 'arquivo',
+        'status' ('ok', 'vazio' ou 'erro'), 'linhas', 'nao_mapeados' (quantidade),
+        'erro', 'df' e 'resultado' (ResultadoConversao)
+    """
+    referencias = carregar_referencias(
+        caminho_mapeamento_produtos, caminho_clientes, caminho_modelo_saida_olist_com_dados
+    )
+    if not referencias.catalogo.tem_coluna_busca:
+        raise ValueError(f"Coluna 'MODELO' não encontrada em {caminho_mapeamento_produtos}")
+
+    if dobrar_acentos is None:
+        dobrar_acentos = DOBRAR_ACENTOS_PADRAO
+    if aproximar is None:
+        aproximar = APROXIMADO_PADRAO
 
-if __name__ == '__main__': 
-    pass
+    def converter_um(nome, arquivo):
+        try:
+            resultado = _converter_com_referencias(
+                arquivo, referencias, id_cliente_selecionado, dobrar_acentos=dobrar_acentos, aproximar=aproximar
+            )
+        except Exception as e:
+            logger.exception('Erro na conversão: %s', e, extra={'arquivo': nome})
+            CONVERSOES.inc(status='erro')
+            resultado = ResultadoConversao(pd.DataFrame(columns=referencias.colunas_modelo_olist), erro=str(e))
+            return {'arquivo': nome, 'status': 'erro', 'linhas': 0, 'nao_mapeados': 0, 'erro': str(e),
+                    'df': resultado.df, 'resultado': resultado}
+        _logar_nao_mapeados(resultado.nao_mapeados)
+        df_saida = resultado.df
+        CONVERSOES.inc(status='ok' if not df_saida.empty else 'vazio')
+        return {'arquivo': nome, 'status': 'ok' if not df_saida.empty else 'vazio',
+                'linhas': len(df_saida), 'nao_mapeados': len(resultado.nao_mapeados), 'erro': None,
+                'df': df_saida, 'resultado': resultado}
 
+    logger.debug('Convertendo lote', extra={'quantidade': len(arquivos_orcamento), 'id_cliente': str(id_cliente_selecionado)})
+    if max_workers <= 1 or len(arquivos_orcamento) <= 1:
+        return [converter_um(nome, arquivo) for nome, arquivo in arquivos_orcamento]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Cada tarefa roda numa cópia do contexto de quem chamou (mantém o ID da requisição nos logs)
+        futuros = [
+            executor.submit(contextvars.copy_context().run, converter_um, nome, arquivo)
+            for nome, arquivo in arquivos_orcamento
+        ]
+        return [futuro.result() for futuro in futuros]
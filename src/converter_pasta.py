@@ -0,0 +1,304 @@
+"""
+Conversão em massa de uma pasta de orçamentos pela linha de comando.
+
+Uso (a partir da raiz do projeto):
+    python src/converter_pasta.py ENTRADA SAIDA --cliente ID
+    python src/converter_pasta.py "exportados/**/*.xlsx" SAIDA --clientes clientes_orcamentos.csv
+
+ENTRADA é uma pasta (todos os .xlsx dentro dela, recursivamente) ou um glob.
+O cliente de cada orçamento vem de --clientes, um CSV com as colunas
+'arquivo' e 'cliente_id' (nome do arquivo ou caminho relativo à entrada; ',' ou
+';' como separador), ou de --cliente para os que não estiverem no CSV.
+
+Os arquivos de referência são lidos uma vez no processo principal (os
+processos do pool herdam o cache no fork, ou leem os snapshots ao iniciar) e
+os orçamentos são convertidos em paralelo, um processo por CPU. Cada
+orçamento convertido é gravado assim que fica pronto, como
+SAIDA/<caminho relativo>_olist.xlsx, e registrado em SAIDA/.progresso.jsonl.
+Se a execução for interrompida, rodar o mesmo comando continua de onde
+parou: orçamentos já registrados (e não alterados desde então) são pulados.
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from log_estruturado import configurar_logs
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_PROGRESSO = '.progresso.jsonl'
+SUFIXO_SAIDA = '_olist.xlsx'
+STATUS_CONCLUIDOS = ('ok', 'vazio')
+
+# Configuração de cada processo do pool, definida em _inicializar_processo
+_opcoes_processo: dict = {}
+
+
+def listar_orcamentos(entrada: str, ignorar: Optional[str] = None) -> Tuple[str, List[str]]:
+    """
+    Orçamentos .xlsx de uma pasta (recursivamente) ou de um glob.
+
+    Returns:
+        (pasta base, caminhos relativos a ela, em ordem), sem os arquivos
+        temporários do Excel (~$...) e sem o que estiver dentro de ignorar
+    """
+    if os.path.isdir(entrada):
+        base = os.path.abspath(entrada)
+        caminhos = glob.glob(os.path.join(glob.escape(base), '**', '*.xlsx'), recursive=True)
+    else:
+        caminhos = [os.path.abspath(c) for c in glob.glob(entrada, recursive=True) if c.lower().endswith('.xlsx')]
+        base = os.path.commonpath([os.path.dirname(c) for c in caminhos]) if caminhos else os.getcwd()
+    ignorar = os.path.abspath(ignorar) + os.sep if ignorar else None
+    relativos = sorted(
+        os.path.relpath(c, base) for c in caminhos
+        if not os.path.basename(c).startswith('~$') and not (ignorar and c.startswith(ignorar))
+    )
+    return base, relativos
+
+
+def ler_mapa_clientes(caminho: str) -> Dict[str, str]:
+    """Lê o CSV arquivo -> cliente_id (separador ',' ou ';')."""
+    with open(caminho, encoding='utf-8-sig', newline='') as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;') if amostra else csv.excel
+        leitor = csv.DictReader(f, dialect=dialeto)
+        if not leitor.fieldnames or not {'arquivo', 'cliente_id'} <= set(leitor.fieldnames):
+            raise ValueError(f"{caminho}: o CSV precisa das colunas 'arquivo' e 'cliente_id'")
+        return {
+            linha['arquivo'].strip().replace('\\', '/'): linha['cliente_id'].strip()
+            for linha in leitor if linha['arquivo'] and linha['cliente_id']
+        }
+
+
+def cliente_do_arquivo(relativo: str, mapa: Dict[str, str], padrao: Optional[str]) -> Optional[str]:
+    relativo = relativo.replace(os.sep, '/')
+    return mapa.get(relativo) or mapa.get(os.path.basename(relativo)) or padrao
+
+
+def caminho_saida(pasta_saida: str, relativo: str) -> str:
+    return os.path.join(pasta_saida, os.path.splitext(relativo)[0] + SUFIXO_SAIDA)
+
+
+def ler_progresso(caminho: str) -> Dict[str, dict]:
+    """Último registro de cada orçamento no arquivo de progresso (linhas incompletas são ignoradas)."""
+    registros = {}
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue
+                registros[registro['arquivo']] = registro
+    except FileNotFoundError:
+        pass
+    return registros
+
+
+def _assinatura(caminho: str) -> list:
+    st = os.stat(caminho)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def ja_convertido(registro: Optional[dict], assinatura: list, id_cliente: str, pasta_saida: str, refazer_erros: bool) -> bool:
+    if registro is None or registro.get('assinatura') != assinatura or registro.get('cliente_id') != id_cliente:
+        return False
+    if registro['status'] == 'ok':
+        return os.path.exists(caminho_saida(pasta_saida, registro['arquivo']))
+    if registro['status'] == 'erro':
+        return not refazer_erros
+    return registro['status'] in STATUS_CONCLUIDOS
+
+
+def _inicializar_processo(caminhos_referencia: Tuple[str, str, str], modo_escrita: str, aproximar: Optional[bool]) -> None:
+    from conversor_olist import carregar_referencias
+
+    _opcoes_processo.update(caminhos_referencia=caminhos_referencia, modo_escrita=modo_escrita, aproximar=aproximar)
+    # Com fork o cache já veio do processo principal; com spawn, lê dos snapshots uma vez por processo
+    carregar_referencias(*caminhos_referencia)
+
+
+def converter_arquivo(caminho: str, destino: str, id_cliente: str) -> dict:
+    """Converte um orçamento e grava o xlsx em destino (roda num processo do pool)."""
+    from conversor_olist import converter_orcamento_com_relatorio
+    from saida_xlsx import escrever_orcamento_convertido
+
+    inicio = time.perf_counter()
+    caminho_mapeamento, caminho_clientes, caminho_modelo = _opcoes_processo['caminhos_referencia']
+    try:
+        resultado = converter_orcamento_com_relatorio(
+            caminho, caminho_mapeamento, caminho_clientes, id_cliente, caminho_modelo,
+            aproximar=_opcoes_processo['aproximar']
+        )
+        if resultado.erro:
+            status, erro = 'erro', resultado.erro
+        elif resultado.df.empty:
+            status, erro = 'vazio', None
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporario = f'{destino}.{os.getpid()}.tmp'
+            escrever_orcamento_convertido(resultado.df, temporario, modo=_opcoes_processo['modo_escrita'])
+            os.replace(temporario, destino)
+            status, erro = 'ok', None
+    except Exception as e:
+        logger.exception('Erro ao gravar %s: %s', destino, e)
+        return {'status': 'erro', 'linhas': 0, 'nao_mapeados': 0, 'erro': str(e),
+                'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1)}
+    return {
+        'status': status,
+        'linhas': len(resultado.df),
+        'nao_mapeados': len(resultado.nao_mapeados),
+        'erro': erro,
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+class Progresso:
+    """Contagens da execução e linha de vazão (arquivos/s, linhas/s) no stderr."""
+
+    def __init__(self, total: int, intervalo: float = 1.0):
+        self.total = total
+        self.intervalo = intervalo
+        self.inicio = time.monotonic()
+        self._ultima_exibicao = 0.0
+        self.concluidos = 0
+        self.linhas = 0
+        self.contagens = {'ok': 0, 'vazio': 0, 'erro': 0}
+
+    def registrar(self, resultado: dict) -> None:
+        self.concluidos += 1
+        self.linhas += resultado['linhas']
+        self.contagens[resultado['status']] += 1
+        agora = time.monotonic()
+        if agora - self._ultima_exibicao >= self.intervalo or self.concluidos == self.total:
+            self._ultima_exibicao = agora
+            print(self.linha(), file=sys.stderr, flush=True)
+
+    def resumo(self) -> dict:
+        decorrido = max(time.monotonic() - self.inicio, 1e-9)
+        return {
+            'arquivos': self.concluidos,
+            'linhas': self.linhas,
+            'segundos': round(decorrido, 2),
+            'arquivos_por_segundo': round(self.concluidos / decorrido, 2),
+            'linhas_por_segundo': round(self.linhas / decorrido, 1),
+            **self.contagens,
+        }
+
+    def linha(self) -> str:
+        r = self.resumo()
+        restantes = self.total - self.concluidos
+        eta = f'{restantes / r["arquivos_por_segundo"]:.0f} s' if r['arquivos_por_segundo'] else '?'
+        return (f'[{self.concluidos}/{self.total}] {r["arquivos_por_segundo"]} arquivos/s, '
+                f'{r["linhas_por_segundo"]} linhas/s, {r["erro"]} erros, faltam ~{eta}')
+
+
+def main(argv=None) -> int:
+    from conversor_olist import ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA, carregar_referencias
+    from saida_xlsx import MODOS_ESCRITA
+
+    data_dir_padrao = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    parser = argparse.ArgumentParser(description='Converte uma pasta de orçamentos para o formato Olist.')
+    parser.add_argument('entrada', help='Pasta com os orçamentos .xlsx, ou um glob (ex.: "exportados/**/*.xlsx")')
+    parser.add_argument('saida', help='Pasta onde os xlsx convertidos e o progresso são gravados')
+    parser.add_argument('--cliente', help='ID do cliente dos orçamentos que não estiverem em --clientes')
+    parser.add_argument('--clientes', help="CSV com as colunas 'arquivo' e 'cliente_id'")
+    parser.add_argument('--data-dir', default=os.environ.get('CONVERSOR_DATA_DIR') or data_dir_padrao,
+                        help='Pasta com os xlsx de referência')
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1, help='Processos em paralelo (padrão: um por CPU)')
+    parser.add_argument('--modo-escrita', choices=MODOS_ESCRITA,
+                        default=os.environ.get('CONVERSOR_XLSX_WRITER', 'write_only'),
+                        help='Modo de escrita do xlsx (padrão write_only, o mais rápido)')
+    parser.add_argument('--aproximado', action='store_true', help='Liga a busca aproximada de produtos')
+    parser.add_argument('--refazer-erros', action='store_true', help='Converte de novo os orçamentos que deram erro')
+    parser.add_argument('--do-zero', action='store_true', help='Ignora o progresso gravado e converte tudo de novo')
+    args = parser.parse_args(argv)
+
+    configurar_logs(nivel=os.environ.get('CONVERSOR_LOG_LEVEL', 'WARNING'),
+                    formato=os.environ.get('CONVERSOR_LOG_FORMAT', 'texto'))
+
+    pasta_saida = os.path.abspath(args.saida)
+    base, relativos = listar_orcamentos(args.entrada, ignorar=pasta_saida)
+    if not relativos:
+        print(f'Nenhum .xlsx encontrado em {args.entrada}', file=sys.stderr)
+        return 1
+    mapa_clientes = ler_mapa_clientes(args.clientes) if args.clientes else {}
+
+    caminho_progresso = os.path.join(pasta_saida, ARQUIVO_PROGRESSO)
+    progresso_anterior = {} if args.do_zero else ler_progresso(caminho_progresso)
+    pendentes = []
+    sem_cliente = []
+    pulados = 0
+    for relativo in relativos:
+        id_cliente = cliente_do_arquivo(relativo, mapa_clientes, args.cliente)
+        if id_cliente is None:
+            sem_cliente.append(relativo)
+            continue
+        assinatura = _assinatura(os.path.join(base, relativo))
+        if ja_convertido(progresso_anterior.get(relativo), assinatura, id_cliente, pasta_saida, args.refazer_erros):
+            pulados += 1
+            continue
+        pendentes.append((relativo, id_cliente, assinatura))
+    if sem_cliente:
+        print(f'{len(sem_cliente)} orçamentos sem cliente (use --cliente ou --clientes), ex.: {sem_cliente[0]}', file=sys.stderr)
+    print(f'{len(relativos)} orçamentos em {base}: {pulados} já convertidos, {len(pendentes)} a converter '
+          f'com {args.processos} processos', file=sys.stderr)
+    if not pendentes:
+        return 1 if sem_cliente else 0
+
+    caminhos_referencia = tuple(
+        os.path.join(args.data_dir, nome) for nome in (ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA)
+    )
+    inicio = time.perf_counter()
+    try:
+        carregar_referencias(*caminhos_referencia)
+    except Exception as e:
+        print(f'Erro ao ler os arquivos de referência em {args.data_dir}: {e}', file=sys.stderr)
+        return 2
+    print(f'Referências carregadas em {time.perf_counter() - inicio:.1f} s', file=sys.stderr)
+
+    os.makedirs(pasta_saida, exist_ok=True)
+    progresso = Progresso(len(pendentes))
+    executor = ProcessPoolExecutor(
+        max_workers=max(1, args.processos),
+        initializer=_inicializar_processo,
+        initargs=(caminhos_referencia, args.modo_escrita, True if args.aproximado else None)
+    )
+    try:
+        with open(caminho_progresso, 'w' if args.do_zero else 'a', encoding='utf-8') as arquivo_progresso:
+            futuros = {
+                executor.submit(
+                    converter_arquivo, os.path.join(base, relativo), caminho_saida(pasta_saida, relativo), id_cliente
+                ): (relativo, id_cliente, assinatura)
+                for relativo, id_cliente, assinatura in pendentes
+            }
+            for futuro in as_completed(futuros):
+                relativo, id_cliente, assinatura = futuros[futuro]
+                resultado = futuro.result()
+                arquivo_progresso.write(json.dumps(
+                    dict(resultado, arquivo=relativo, cliente_id=id_cliente, assinatura=assinatura),
+                    ensure_ascii=False
+                ) + '\n')
+                arquivo_progresso.flush()
+                progresso.registrar(resultado)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f'\nInterrompido após {progresso.concluidos} orçamentos; rode o mesmo comando para continuar.', file=sys.stderr)
+        return 130
+    executor.shutdown()
+
+    resumo = progresso.resumo()
+    print(json.dumps(resumo, ensure_ascii=False))
+    return 1 if resumo['erro'] or sem_cliente else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Correspondência aproximada entre produtos do orçamento e modelos do catálogo.
+
+Cada modelo do catálogo (normalizado sem acentos e pontuação) é quebrado em
+trigramas de caracteres, e um índice invertido trigrama -> modelos é montado uma
+única vez. Para buscar um produto, somam-se as listas dos seus trigramas e a
+nota de cada modelo candidato é o coeficiente de Dice entre os dois conjuntos de
+trigramas (1.0 = mesmos trigramas). Só os modelos que compartilham trigramas
+suficientes para alcançar os melhores candidatos têm a nota calculada, então o
+custo por busca não cresce com uma varredura linha a linha do catálogo.
+"""
+import os
+from typing import Iterable, List, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# Nota mínima para aceitar automaticamente o melhor candidato
+LIMIAR_ACEITE_PADRAO = float(os.environ.get('CONVERSOR_LIMIAR_APROXIMADO', '0.9'))
+# Candidatos abaixo dessa nota não são sugeridos
+NOTA_MINIMA_SUGESTAO = 0.3
+# Quantidade de candidatos sugeridos por produto não encontrado
+QUANTIDADE_SUGESTOES = 3
+
+TAMANHO_NGRAMA = 3
+
+
+class Candidato(NamedTuple):
+    posicao: int
+    modelo: str
+    nota: float
+
+
+def ngramas(texto: str) -> set:
+    """Trigramas do texto com um espaço de cada lado (as pontas das palavras também contam)."""
+    texto = f' {texto} '
+    return {texto[i:i + TAMANHO_NGRAMA] for i in range(len(texto) - TAMANHO_NGRAMA + 1)}
+
+
+class IndiceAproximado:
+    """
+    Índice de trigramas sobre uma lista de modelos já normalizados.
+
+    As posições devolvidas nos candidatos são as posições em `modelos`.
+    """
+
+    def __init__(self, modelos: Iterable[str]):
+        self.modelos = list(modelos)
+        postagens = {}
+        tamanhos = np.zeros(len(self.modelos), dtype=np.int32)
+        for posicao, modelo in enumerate(self.modelos):
+            if not modelo:
+                continue
+            gramas = ngramas(modelo)
+            tamanhos[posicao] = len(gramas)
+            for grama in gramas:
+                postagens.setdefault(grama, []).append(posicao)
+        self._tamanhos = tamanhos
+        self._postagens = {grama: np.array(posicoes, dtype=np.int32) for grama, posicoes in postagens.items()}
+
+    def __len__(self):
+        return len(self.modelos)
+
+    def buscar(self, texto: str, quantidade: int = QUANTIDADE_SUGESTOES, nota_minima: float = 0.0) -> List[Candidato]:
+        """
+        Melhores candidatos para o texto (normalizado com dobrar=True), da maior para a menor nota.
+
+        Em caso de empate vale a ordem do catálogo.
+        """
+        if not texto or not self.modelos:
+            return []
+        gramas = ngramas(texto)
+        listas = [self._postagens[grama] for grama in gramas if grama in self._postagens]
+        if not listas:
+            return []
+        # Quantos trigramas cada modelo do catálogo compartilha com o texto
+        contagens = np.bincount(np.concatenate(listas), minlength=len(self.modelos))
+
+        # Só os modelos com mais trigramas em comum são avaliados, começando pelos k que mais
+        # compartilham; o mínimo exigido cai até que nenhum modelo fora da avaliação possa
+        # alcançar o resultado
+        modelos_por_contagem = np.bincount(contagens)
+        modelos_por_contagem[0] = 0
+        acumulado = np.cumsum(modelos_por_contagem[::-1])[::-1]
+        contagem_minima = max(int(np.flatnonzero(acumulado >= min(quantidade, acumulado[1]))[-1]), 1)
+        while True:
+            posicoes = np.flatnonzero(contagens >= contagem_minima)
+            notas = 2.0 * contagens[posicoes] / (len(gramas) + self._tamanhos[posicoes])
+            if nota_minima > 0:
+                manter = notas >= nota_minima
+                posicoes, notas = posicoes[manter], notas[manter]
+            limiar = nota_minima
+            if len(posicoes) >= quantidade:
+                # Corta pela nota do k-ésimo melhor, mantendo os empatados com ele para desempatar pela ordem
+                limiar = max(limiar, -np.partition(-notas, quantidade - 1)[quantidade - 1])
+                manter = notas >= limiar
+                posicoes, notas = posicoes[manter], notas[manter]
+            necessaria = _contagem_necessaria(limiar, len(gramas))
+            if necessaria >= contagem_minima:
+                break
+            contagem_minima = necessaria
+
+        ordem = np.lexsort((posicoes, -notas))[:quantidade]
+        return [
+            Candidato(int(posicoes[i]), self.modelos[posicoes[i]], round(float(notas[i]), 4))
+            for i in ordem
+        ]
+
+
+def _contagem_necessaria(nota: float, quantidade_gramas: int) -> int:
+    """
+    Menor número de trigramas em comum com que um modelo ainda pode ter a nota informada.
+
+    Um modelo com c trigramas em comum tem ao menos c trigramas, então sua nota
+    é no máximo 2c / (n + c); ela só alcança a nota se c >= nota * n / (2 - nota).
+    """
+    if nota <= 0:
+        return 1
+    return max(int(np.ceil(nota * quantidade_gramas / (2.0 - nota) - 1e-9)), 1)
+
+
+def tabela_sugestoes(sugestoes: List[dict]) -> pd.DataFrame:
+    """
+    Sugestões da busca aproximada (df.attrs['sugestoes_aproximadas']) em forma de tabela,
+    uma linha por candidato; produtos sem candidato aparecem uma vez, com o candidato vazio.
+    """
+    registros = []
+    for sugestao in sugestoes:
+        candidatos = sugestao['candidatos'] or [None]
+        for ordem, candidato in enumerate(candidatos, start=1):
+            registros.append({
+                'Linha': sugestao['linha'],
+                'Produto': sugestao['produto'],
+                'Status': sugestao['status'],
+                'Candidato': ordem if candidato is not None else None,
+                'Modelo sugerido': candidato['modelo'] if candidato is not None else None,
+                'ID produto': candidato['ID produto'] if candidato is not None else None,
+                'Descrição': candidato['Descrição'] if candidato is not None else None,
+                'Nota': candidato['nota'] if candidato is not None else None,
+            })
+    return pd.DataFrame(registros, columns=[
+        'Linha', 'Produto', 'Status', 'Candidato', 'Modelo sugerido', 'ID produto', 'Descrição', 'Nota'
+    ])
@@ -0,0 +1,21 @@
+"""
+Configuração do gunicorn (usada pelo startCommand do render.yaml, a partir de src/).
+
+O app é importado uma vez no master (preload_app) e aquecido antes do fork:
+catálogo, clientes e índices são carregados uma só vez e os workers os herdam,
+compartilhando as páginas de memória. gc.freeze() tira esses objetos das
+varreduras do coletor de lixo nos workers, que senão escreveriam nas páginas
+(contagens do GC) e as copiariam em cada processo.
+"""
+import gc
+import os
+
+os.environ.setdefault('CONVERSOR_AQUECER', '1')
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', '4'))
+timeout = 120
+
+
+def when_ready(server):
+    gc.freeze()
@@ -0,0 +1,81 @@
+import bisect
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from cache_referencias import cache_referencias
+from conversor_olist import carregar_clientes
+from normalizacao import normalizar_texto
+
+
+class IndiceClientes:
+    """
+    Lista de clientes (ID, Nome) pronta para a rota /clientes, com busca por prefixo.
+
+    A busca ignora maiúsculas, acentos e pontuação e casa o início do nome ou o início de
+    qualquer palavra dele ('silva' encontra 'João da Silva'). Os resultados
+    mantêm a ordem do arquivo de clientes.
+    """
+
+    def __init__(self, df_clientes: pd.DataFrame):
+        if 'ID' not in df_clientes.columns or 'Nome' not in df_clientes.columns:
+            raise ValueError('Invalid client file structure')
+        df = df_clientes.dropna(subset=['Nome'])
+        self.clientes = [
+            {'ID': str(id_cliente), 'Nome': nome}
+            for id_cliente, nome in zip(df['ID'].tolist(), df['Nome'].tolist())
+        ]
+
+        # Cada sufixo do nome que começa em uma palavra vira uma entrada ordenada para busca binária
+        entradas = []
+        for posicao, cliente in enumerate(self.clientes):
+            nome_dobrado = normalizar_texto(cliente['Nome'], dobrar=True)
+            inicio = 0
+            while True:
+                entradas.append((nome_dobrado[inicio:], posicao))
+                espaco = nome_dobrado.find(' ', inicio)
+                if espaco < 0:
+                    break
+                inicio = espaco + 1
+        entradas.sort()
+        self._sufixos = [sufixo for sufixo, _ in entradas]
+        self._posicoes = [posicao for _, posicao in entradas]
+
+        # Corpo da resposta completa (sem filtro nem paginação), montado sob demanda
+        self.resposta_completa: Optional[bytes] = None
+        self.resposta_completa_gzip: Optional[bytes] = None
+
+    def __len__(self):
+        return len(self.clientes)
+
+    def buscar(self, consulta: str) -> List[dict]:
+        """Clientes cujo nome (ou alguma palavra dele) começa com a consulta."""
+        prefixo = normalizar_texto(consulta, dobrar=True)
+        if not prefixo:
+            return self.clientes
+        encontrados = set()
+        inicio = bisect.bisect_left(self._sufixos, prefixo)
+        for indice in range(inicio, len(self._sufixos)):
+            if not self._sufixos[indice].startswith(prefixo):
+                break
+            encontrados.add(self._posicoes[indice])
+        return [self.clientes[posicao] for posicao in sorted(encontrados)]
+
+    def pagina(self, consulta: str = '', limite: Optional[int] = None, cursor: int = 0) -> Tuple[List[dict], Optional[int], int]:
+        """
+        Returns:
+            Tupla (clientes da página, cursor da próxima página ou None, total encontrado)
+        """
+        resultados = self.buscar(consulta)
+        total = len(resultados)
+        if limite is None:
+            return resultados[cursor:], None, total
+        fim = cursor + limite
+        return resultados[cursor:fim], (fim if fim < total else None), total
+
+
+def carregar_indice_clientes(caminho_clientes: str) -> IndiceClientes:
+    """Índice de clientes do arquivo (em cache, refeito quando o arquivo muda)."""
+    return cache_referencias.obter(
+        caminho_clientes, 'indice_clientes', lambda caminho: IndiceClientes(carregar_clientes(caminho))
+    )
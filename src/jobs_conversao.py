@@ -0,0 +1,340 @@
+import contextlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows: o limite de pendentes continua valendo, mas sem serializar os workers
+    fcntl = None
+
+STATUS_PENDENTE = 'pendente'
+STATUS_EXECUTANDO = 'executando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+STATUS_FINALIZADOS = (STATUS_CONCLUIDO, STATUS_ERRO)
+STATUS_EM_ANDAMENTO = (STATUS_PENDENTE, STATUS_EXECUTANDO)
+
+logger = logging.getLogger(__name__)
+
+# Trava (flock) que serializa a contagem de pendentes e o enfileiramento entre os workers
+ARQUIVO_TRAVA = 'jobs.trava'
+
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class FilaCheiaError(Exception):
+    """Levantada quando já existem jobs demais aguardando ou em execução."""
+
+
+def _gravar_status(
+    pasta_jobs: str, job_id: str, status: str, erro: Optional[str] = None, resultado_sha256: Optional[str] = None
+) -> None:
+    dados = {'job_id': job_id, 'status': status, 'erro': erro, 'atualizado_em': time.time()}
+    if resultado_sha256 is not None:
+        dados['resultado_sha256'] = resultado_sha256
+    # Temporário por processo: o status é gravado pelo worker e pelo processo do pool
+    temporario = os.path.join(pasta_jobs, f'{job_id}.json.{os.getpid()}.tmp')
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f)
+    os.replace(temporario, os.path.join(pasta_jobs, f'{job_id}.json'))
+
+
+def executar_conversao_xlsx(
+    caminho_orcamento: str,
+    caminho_mapeamento_produtos: str,
+    caminho_clientes: str,
+    id_cliente_selecionado: str,
+    caminho_modelo_saida_olist_com_dados: str,
+    modo_escrita: str,
+    aproximar: Optional[bool] = None
+) -> bytes:
+    """
+    Converte o orçamento gravado em caminho_orcamento e devolve o xlsx de saída em bytes.
+
+    Roda dentro de um processo do pool; cada processo mantém seu próprio
+    cache de referências, então os arquivos de referência são lidos uma vez
+    por processo e reaproveitados nos jobs seguintes.
+    """
+    from conversor_olist import converter_orcamento_para_olist
+    from saida_xlsx import escrever_orcamento_convertido
+
+    df_convertido = converter_orcamento_para_olist(
+        caminho_orcamento,
+        caminho_mapeamento_produtos,
+        caminho_clientes,
+        id_cliente_selecionado,
+        caminho_modelo_saida_olist_com_dados,
+        aproximar=aproximar
+    )
+    if df_convertido.empty:
+        raise ValueError('No data processed')
+
+    output = io.BytesIO()
+    escrever_orcamento_convertido(df_convertido, output, modo=modo_escrita)
+    return output.getvalue()
+
+
+def _executar_job(pasta_jobs: str, job_id: str, caminho_orcamento: str, *args) -> bytes:
+    """Marca o job como em execução no disco (visível para todos os workers) e roda a conversão."""
+    _gravar_status(pasta_jobs, job_id, STATUS_EXECUTANDO)
+    return executar_conversao_xlsx(caminho_orcamento, *args)
+
+
+class GerenciadorJobs:
+    """
+    Fila de conversões assíncronas executadas em um pool de processos limitado.
+
+    O estado de cada job também é gravado em disco (pasta_jobs), de modo que
+    qualquer worker do gunicorn no mesmo servidor consiga informar o status e
+    entregar o resultado, não apenas o que recebeu o upload. O orçamento
+    enviado também fica em disco até o job terminar: o processo do pool o lê
+    pelo caminho, sem que o upload inteiro passe pela memória.
+
+    O limite max_pendentes conta os status pendente/executando gravados na
+    pasta, ou seja, vale para todos os workers juntos; o pool (max_workers
+    processos) é de cada worker.
+
+    Com um StorageHandler (storage.py), o xlsx de cada job concluído é guardado
+    nele pelo SHA-256, e o status aponta para o objeto; sem ele, o xlsx fica
+    na pasta como <job_id>.xlsx.
+
+    Args:
+        ttl_segundos: tempo que status e resultado de um job terminado ficam guardados
+        ttl_pendentes_segundos: tempo depois do qual um job ainda pendente ou em
+            execução é dado como perdido (ex.: o worker que o recebeu caiu) e removido
+        armazenamento: onde os resultados ficam guardados
+    """
+
+    def __init__(
+        self,
+        pasta_jobs: str,
+        max_workers: int = 2,
+        max_pendentes: int = 8,
+        ttl_segundos: int = 3600,
+        ttl_pendentes_segundos: int = 7200,
+        armazenamento=None
+    ):
+        self.pasta_jobs = pasta_jobs
+        self.max_workers = max_workers
+        self.max_pendentes = max_pendentes
+        self.ttl_segundos = ttl_segundos
+        self.ttl_pendentes_segundos = ttl_pendentes_segundos
+        self.armazenamento = armazenamento
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futuros = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.pasta_jobs, exist_ok=True)
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        # Criado sob demanda para não criar processos em workers que nunca recebem jobs
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _caminho(self, job_id: str, extensao: str) -> str:
+        return os.path.join(self.pasta_jobs, f'{job_id}.{extensao}')
+
+    def _gravar_status(
+        self, job_id: str, status: str, erro: Optional[str] = None, resultado_sha256: Optional[str] = None
+    ) -> None:
+        _gravar_status(self.pasta_jobs, job_id, status, erro, resultado_sha256)
+
+    @contextlib.contextmanager
+    def _trava(self) -> Iterator[None]:
+        """Serializa a contagem de pendentes e o enfileiramento entre threads e, com fcntl, entre workers."""
+        with self._lock:
+            with open(os.path.join(self.pasta_jobs, ARQUIVO_TRAVA), 'a+b') as trava:
+                if fcntl is not None:
+                    fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(trava.fileno(), fcntl.LOCK_UN)
+
+    def _ids_jobs(self) -> Iterator[str]:
+        try:
+            nomes = os.listdir(self.pasta_jobs)
+        except FileNotFoundError:
+            return
+        for nome in nomes:
+            job_id, _, extensao = nome.partition('.')
+            if extensao == 'json' and _JOB_ID_RE.match(job_id):
+                yield job_id
+
+    def _gravar_orcamento(self, job_id: str, orcamento: BinaryIO) -> str:
+        caminho = self._caminho(job_id, 'orcamento.xlsx')
+        temporario = self._caminho(job_id, 'orcamento.xlsx.tmp')
+        orcamento.seek(0)
+        with open(temporario, 'wb') as f:
+            shutil.copyfileobj(orcamento, f)
+        os.replace(temporario, caminho)
+        return caminho
+
+    def _remover(self, job_id: str, *extensoes: str) -> None:
+        for extensao in extensoes:
+            try:
+                os.remove(self._caminho(job_id, extensao))
+            except FileNotFoundError:
+                pass
+
+    def pendentes(self) -> int:
+        """Jobs pendentes ou em execução em todos os workers (pelos status gravados na pasta)."""
+        return sum(
+            1 for job_id in self._ids_jobs()
+            if (self._ler_status(job_id) or {}).get('status') in STATUS_EM_ANDAMENTO
+        )
+
+    def submeter(self, orcamento: BinaryIO, *args) -> str:
+        """
+        Grava o orçamento na pasta dos jobs, enfileira executar_conversao_xlsx(caminho, *args)
+        e retorna o ID do job.
+
+        Args:
+            orcamento: Arquivo do orçamento (o stream do upload), copiado para o disco em blocos
+
+        Raises:
+            FilaCheiaError: se o número de jobs pendentes já atingiu max_pendentes
+        """
+        self.limpar_expirados()
+        # Recusa antes de copiar o upload; a contagem que vale é a feita sob a trava
+        if self.pendentes() >= self.max_pendentes:
+            raise FilaCheiaError(f'Too many pending conversions (limit {self.max_pendentes})')
+        job_id = uuid.uuid4().hex
+        caminho_orcamento = self._gravar_orcamento(job_id, orcamento)
+        with self._trava():
+            if self.pendentes() >= self.max_pendentes:
+                self._remover(job_id, 'orcamento.xlsx')
+                raise FilaCheiaError(f'Too many pending conversions (limit {self.max_pendentes})')
+            self._gravar_status(job_id, STATUS_PENDENTE)
+        futuro = self._obter_executor().submit(_executar_job, self.pasta_jobs, job_id, caminho_orcamento, *args)
+        with self._lock:
+            self._futuros[job_id] = futuro
+        futuro.add_done_callback(lambda f: self._finalizar(job_id, f))
+        return job_id
+
+    def _finalizar(self, job_id: str, futuro) -> None:
+        try:
+            dados = futuro.result()
+            if self.armazenamento is not None:
+                # Sob a trava: limpar_expirados() de outro worker não apaga o objeto entre guardar e o status
+                with self._trava():
+                    sha256 = self.armazenamento.guardar(dados)
+                    self._gravar_status(job_id, STATUS_CONCLUIDO, resultado_sha256=sha256)
+            else:
+                temporario = self._caminho(job_id, 'xlsx.tmp')
+                with open(temporario, 'wb') as f:
+                    f.write(dados)
+                os.replace(temporario, self._caminho(job_id, 'xlsx'))
+                self._gravar_status(job_id, STATUS_CONCLUIDO)
+        except Exception as e:
+            self._gravar_status(job_id, STATUS_ERRO, str(e))
+        self._remover(job_id, 'orcamento.xlsx')
+        with self._lock:
+            self._futuros.pop(job_id, None)
+
+    def _ler_status(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self._caminho(job_id, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Status do job (o gravado na pasta, igual em qualquer worker), ou None se o ID for desconhecido (ou já expirado)."""
+        if not _JOB_ID_RE.match(job_id):
+            return None
+        dados = self._ler_status(job_id)
+        if dados is None:
+            return None
+        dados.pop('atualizado_em', None)
+        dados.pop('resultado_sha256', None)
+        return dados
+
+    def abrir_resultado(self, job_id: str) -> Optional[BinaryIO]:
+        """Stream do xlsx de um job concluído (do armazenamento, sem cópia se estiver na memória), ou None."""
+        if not _JOB_ID_RE.match(job_id):
+            return None
+        sha256 = (self._ler_status(job_id) or {}).get('resultado_sha256')
+        try:
+            if sha256 is not None and self.armazenamento is not None:
+                return self.armazenamento.abrir(sha256)
+            return open(self._caminho(job_id, 'xlsx'), 'rb')
+        except FileNotFoundError:
+            return None
+
+    def _remover_resultados(self, shas: Set[str]) -> None:
+        """Remove do armazenamento os resultados de jobs expirados que nenhum job restante usa (o conteúdo é compartilhado)."""
+        with self._trava():
+            em_uso = {(self._ler_status(job_id) or {}).get('resultado_sha256') for job_id in self._ids_jobs()}
+            for sha256 in shas - em_uso:
+                try:
+                    self.armazenamento.remover(sha256)
+                except Exception as e:
+                    logger.warning('Não foi possível apagar o resultado %s do armazenamento: %s', sha256, e)
+
+    def limpar_expirados(self) -> None:
+        """
+        Remove do disco (e do armazenamento) os jobs concluídos ou com erro há mais de ttl_segundos.
+
+        Jobs pendentes ou em execução só expiram depois de ttl_pendentes_segundos
+        sem mudar de status: o worker que os recebeu provavelmente caiu ou foi
+        reciclado, e o upload guardado seria esquecido. Os que ainda estão no
+        pool deste worker nunca são removidos. Arquivos sem status legível (sobras
+        de um processo que caiu no meio da gravação) são removidos quando todos
+        ficam mais velhos que ttl_segundos.
+        """
+        agora = time.time()
+        limite = agora - self.ttl_segundos
+        limite_pendentes = agora - self.ttl_pendentes_segundos
+        try:
+            nomes = os.listdir(self.pasta_jobs)
+        except FileNotFoundError:
+            return
+        arquivos_por_job = {}
+        for nome in nomes:
+            arquivos_por_job.setdefault(nome.split('.', 1)[0], []).append(nome)
+        with self._lock:
+            no_pool = {job_id for job_id, futuro in self._futuros.items() if not futuro.done()}
+        resultados_expirados = set()
+        for job_id, arquivos in arquivos_por_job.items():
+            if not _JOB_ID_RE.match(job_id) or job_id in no_pool:
+                continue
+            dados = self._ler_status(job_id)
+            if dados is not None:
+                atualizado_em = dados.get('atualizado_em', 0)
+                if dados.get('status') in STATUS_FINALIZADOS:
+                    expirado = atualizado_em < limite
+                else:
+                    expirado = atualizado_em < limite_pendentes
+            else:
+                try:
+                    expirado = all(os.path.getmtime(os.path.join(self.pasta_jobs, nome)) < limite for nome in arquivos)
+                except OSError:
+                    continue
+            if not expirado:
+                continue
+            if dados is not None and dados.get('resultado_sha256'):
+                resultados_expirados.add(dados['resultado_sha256'])
+            for nome in arquivos:
+                try:
+                    os.remove(os.path.join(self.pasta_jobs, nome))
+                except OSError:
+                    pass
+        if resultados_expirados and self.armazenamento is not None:
+            self._remover_resultados(resultados_expirados)
+
+    def encerrar(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,102 @@
+import io
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+
+def _converter_celula(celula):
+    """Mesma conversão de célula que o leitor openpyxl do pandas aplica (convert_float=True)."""
+    valor = celula.value
+    if valor is None:
+        return ""
+    # Erros de fórmula (#N/A, #DIV/0!...) viram NaN pelo tipo da célula; o texto '#N/A' digitado continua texto
+    if celula.data_type == TYPE_ERROR:
+        return np.nan
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def ler_linhas_planilha(
+    arquivo: Union[str, bytes, BinaryIO],
+    aba_preferida: Optional[str] = None,
+    limite_linhas: Optional[int] = None
+) -> Tuple[str, List[list]]:
+    """
+    Lê uma aba do xlsx em uma única passada, no modo somente leitura do openpyxl.
+
+    As células saem convertidas como o leitor do pandas faria (vazias como "",
+    números inteiros como int), sem os vazios à direita de cada linha.
+
+    Args:
+        arquivo: Caminho, bytes ou objeto binário do xlsx
+        aba_preferida: Aba a ser lida se existir; senão, a primeira
+        limite_linhas: Para de ler após essa quantidade de linhas da planilha
+
+    Returns:
+        Tupla (nome da aba lida, lista de linhas)
+    """
+    if isinstance(arquivo, bytes):
+        arquivo = io.BytesIO(arquivo)
+    wb = load_workbook(arquivo, read_only=True, data_only=True, keep_links=False)
+    try:
+        nomes_abas = [ws.title for ws in wb.worksheets]
+        if not nomes_abas:
+            raise ValueError("O arquivo Excel não contém nenhuma aba.")
+        nome_aba = aba_preferida if aba_preferida in nomes_abas else nomes_abas[0]
+        ws = wb[nome_aba]
+        ws.reset_dimensions()
+
+        linhas = []
+        for celulas in ws.iter_rows():
+            linha = [_converter_celula(celula) for celula in celulas]
+            while linha and linha[-1] == "":
+                linha.pop()
+            linhas.append(linha)
+            if limite_linhas is not None and len(linhas) >= limite_linhas:
+                break
+    finally:
+        wb.close()
+    return nome_aba, linhas
+
+
+def _completar_linhas(linhas: List[list]) -> List[list]:
+    """Remove as linhas vazias do fim e completa as demais até a largura da maior (como o pandas)."""
+    ultima_linha_com_dados = -1
+    for numero_linha, linha in enumerate(linhas):
+        if linha:
+            ultima_linha_com_dados = numero_linha
+    linhas = linhas[:ultima_linha_com_dados + 1]
+    if linhas:
+        largura = max(len(linha) for linha in linhas)
+        linhas = [linha + [""] * (largura - len(linha)) for linha in linhas]
+    return linhas
+
+
+def dataframe_de_linhas(linhas: List[list], header=0, skiprows=None, nrows=None) -> pd.DataFrame:
+    """
+    Interpreta linhas lidas por ler_linhas_planilha como o pd.read_excel faria
+    (mesma inferência de tipos, valores nulos e nomes de coluna).
+
+    Para reproduzir read_excel(nrows=N), passe apenas as primeiras linhas
+    necessárias (N + 1 com header=None), pois a largura é calculada sobre elas.
+    """
+    linhas = _completar_linhas(linhas)
+    if not linhas:
+        return pd.DataFrame()
+    try:
+        parser = TextParser(
+            linhas,
+            header=header,
+            skiprows=skiprows,
+            nrows=nrows,
+            skip_blank_lines=False,
+        )
+        return parser.read(nrows=nrows)
+    except EmptyDataError:
+        return pd.DataFrame()
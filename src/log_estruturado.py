@@ -0,0 +1,159 @@
+"""
+Logs em JSON, com ID de correlação por requisição e emissão assíncrona.
+
+configurar_logs() instala no logger raiz um QueueHandler: a thread que loga só
+coloca o registro numa fila, e um QueueListener em segundo plano formata e
+escreve no stderr. Assim uma requisição nunca espera pela escrita do log.
+
+O ID da requisição atual (definir_id_requisicao) fica num ContextVar e é
+copiado para o registro no momento do log, ainda na thread da requisição.
+
+Variáveis de ambiente:
+    CONVERSOR_LOG_LEVEL: DEBUG, INFO (padrão), WARNING ou ERROR. Os
+        diagnósticos detalhados da conversão só rodam com DEBUG.
+    CONVERSOR_LOG_FORMAT: 'json' (padrão) ou 'texto' (uma linha legível,
+        útil no desenvolvimento)
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Optional
+
+FORMATO_JSON = 'json'
+FORMATO_TEXTO = 'texto'
+
+# Atributos que todo LogRecord tem; o que não estiver aqui veio de extra=...
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'id_requisicao'}
+
+_id_requisicao: contextvars.ContextVar = contextvars.ContextVar('id_requisicao', default=None)
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler_fila: Optional[logging.handlers.QueueHandler] = None
+
+
+def definir_id_requisicao(id_requisicao: Optional[str]) -> None:
+    _id_requisicao.set(id_requisicao)
+
+
+def id_requisicao_atual() -> Optional[str]:
+    return _id_requisicao.get()
+
+
+class FiltroIdRequisicao(logging.Filter):
+    """Copia o ID da requisição atual para o registro (precisa rodar na thread que loga)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.id_requisicao = _id_requisicao.get()
+        return True
+
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por linha; campos passados em extra=... entram no objeto."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        registro = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+        }
+        id_requisicao = getattr(record, 'id_requisicao', None)
+        if id_requisicao:
+            registro['id_requisicao'] = id_requisicao
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith('_'):
+                registro[chave] = valor
+        if record.exc_info:
+            registro['excecao'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            registro['excecao'] = record.exc_text
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class _HandlerFila(logging.handlers.QueueHandler):
+    """
+    QueueHandler que mantém os campos extras e o traceback separados da mensagem.
+
+    O prepare() padrão grava a mensagem já formatada (com o traceback) em msg;
+    aqui só os argumentos são aplicados e o traceback vai para exc_text.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class _FormatadorTexto(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, 'id_requisicao'):
+            record.id_requisicao = None
+        return super().format(record)
+
+
+def _criar_formatador(formato: str) -> logging.Formatter:
+    if formato == FORMATO_TEXTO:
+        return _FormatadorTexto('%(asctime)s %(levelname)s [%(id_requisicao)s] %(name)s: %(message)s')
+    return FormatadorJSON()
+
+
+def _iniciar_listener(formatador: logging.Formatter) -> None:
+    global _listener
+    saida = logging.StreamHandler(sys.stderr)
+    saida.setFormatter(formatador)
+    _listener = logging.handlers.QueueListener(_handler_fila.queue, saida, respect_handler_level=False)
+    _listener.start()
+
+
+def _reiniciar_listener_no_filho() -> None:
+    # A thread do listener não sobrevive ao fork (ex.: workers do gunicorn com preload_app)
+    global _listener
+    if _handler_fila is not None and _listener is not None:
+        formatador = _listener.handlers[0].formatter
+        _handler_fila.queue = queue.SimpleQueue()
+        _iniciar_listener(formatador)
+
+
+def _parar_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+def configurar_logs(nivel: Optional[str] = None, formato: Optional[str] = None) -> None:
+    """
+    Configura o logger raiz (uma vez por processo; chamadas seguintes só ajustam nível e formato).
+
+    Args:
+        nivel: nível mínimo; padrão CONVERSOR_LOG_LEVEL ou INFO
+        formato: 'json' ou 'texto'; padrão CONVERSOR_LOG_FORMAT ou 'json'
+    """
+    global _handler_fila
+    nivel = (nivel or os.environ.get('CONVERSOR_LOG_LEVEL', 'INFO')).upper()
+    formato = (formato or os.environ.get('CONVERSOR_LOG_FORMAT', FORMATO_JSON)).lower()
+    raiz = logging.getLogger()
+    with _lock:
+        raiz.setLevel(nivel)
+        if _handler_fila is not None:
+            _listener.handlers[0].setFormatter(_criar_formatador(formato))
+            return
+        _handler_fila = _HandlerFila(queue.SimpleQueue())
+        _handler_fila.addFilter(FiltroIdRequisicao())
+        raiz.addHandler(_handler_fila)
+        _iniciar_listener(_criar_formatador(formato))
+        atexit.register(_parar_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_reiniciar_listener_no_filho)
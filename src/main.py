@@ -1,80 +1,501 @@
 import sys
 import os
+import re
+import uuid
+import logging
 import traceback # Para log detalhado de exceções
 import time
+_INICIO_IMPORTACAO = time.perf_counter()
+import datetime
+import threading
 import contextlib
 from pathlib import Path
 import tempfile
 # Adiciona o diretório pai de 'src' ao sys.path para permitir importações como 'from src.conversor_olist import ...'
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-# ===== INÍCIO DIAGNÓSTICO =====
-print("Diretório atual:", os.getcwd())
-# ===== FIM DIAGNÓSTICO =====
+from log_estruturado import configurar_logs, definir_id_requisicao
 
-from flask import Flask, request, jsonify, send_file, render_template
-import pandas as pd
+# Logs em JSON, emitidos em segundo plano (CONVERSOR_LOG_LEVEL / CONVERSOR_LOG_FORMAT)
+configurar_logs()
+logger = logging.getLogger(__name__)
+
+from flask import Flask, Request, request, g, jsonify, send_file, render_template
 import io # Para enviar o arquivo em memória
+import json
+import gzip
+import hashlib
+import zipfile
 from werkzeug.utils import secure_filename # Para nomes de arquivo seguros
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Só módulos leves são importados aqui. pandas, openpyxl e o conversor (conversor_olist, saida_xlsx,
+# saida_texto, versoes_referencias, banco_referencias...) são importados nas funções que os usam,
+# o que tira esse custo da partida a frio na Vercel; com o gunicorn, aquecer() os carrega no master
+from opcoes_conversao import (
+    ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA, DOBRAR_ACENTOS_PADRAO, APROXIMADO_PADRAO, MODOS_ESCRITA
+)
+from cache_referencias import cache_referencias, assinatura_arquivo
+from cache_resultados import CacheResultados, chave_resultado
+from relatorio_nao_mapeados import ContadorNaoMapeados
+from storage import criar_armazenamento
+from jobs_conversao import GerenciadorJobs, FilaCheiaError, STATUS_CONCLUIDO, STATUS_ERRO
+from upload_xlsx import (
+    UploadInvalidoError, UploadGrandeDemaisError, validar_zip,
+    abrir_somente_leitura, sha256_upload, tamanho_upload
+)
+from metricas import (
+    registro, medir_etapa, iniciar_coleta_tempos, encerrar_coleta_tempos, formatar_tempos,
+    valores_contadores, BYTES_ARQUIVOS, TIPO_CONTENT_TYPE
+)
 
-# Importa a função de conversão do outro arquivo .py
-from conversor_olist import converter_orcamento_para_olist
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 app = Flask(__name__, static_folder='static', template_folder='static')
 
 # Define o caminho base para os arquivos de dados que estão dentro de 'src'
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads') # Para uploads temporários de orçamentos
-MAPEAMENTO_PRODUTOS_FILENAME = "PLanilha mapeamento Orçamento Olist.xlsx"
-CLIENTES_FILENAME = "clientes.xlsx"
-MODELO_SAIDA_OLIST_FILENAME = "formato Olist(SAIDA).xlsx"
-
-MAPEAMENTO_PRODUTOS_PATH = os.path.join(DATA_DIR, MAPEAMENTO_PRODUTOS_FILENAME)
-CLIENTES_PATH = os.path.join(DATA_DIR, CLIENTES_FILENAME)
-MODELO_SAIDA_OLIST_PATH = os.path.join(DATA_DIR, MODELO_SAIDA_OLIST_FILENAME)
-
-# ===== INÍCIO DIAGNÓSTICO =====
-print("Caminhos dos arquivos:")
-print(f"MAPEAMENTO_PRODUTOS_PATH: {MAPEAMENTO_PRODUTOS_PATH} (Existe: {os.path.exists(MAPEAMENTO_PRODUTOS_PATH)})")
-print(f"CLIENTES_PATH: {CLIENTES_PATH} (Existe: {os.path.exists(CLIENTES_PATH)})")
-print(f"MODELO_SAIDA_OLIST_PATH: {MODELO_SAIDA_OLIST_PATH} (Existe: {os.path.exists(MODELO_SAIDA_OLIST_PATH)})")
-print(f"Arquivos em {DATA_DIR} (Existe: {os.path.exists(DATA_DIR)}):", os.listdir(DATA_DIR) if os.path.exists(DATA_DIR) else "Pasta não existe")
-# ===== FIM DIAGNÓSTICO =====
-
-# Criar diretório de uploads se não existir
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Pastas locais do armazenamento (storage.py): a de dados tem os arquivos de referência (CONVERSOR_DATA_DIR
+# permite apontar para outra, ex.: benchmarks); a de trabalho, os uploads grandes, os jobs e o cache de resultados
+DATA_DIR = os.environ.get('CONVERSOR_DATA_DIR') or os.path.join(BASE_DIR, 'data')
+UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+
+# Arquivos de referência: nome usado nas respostas, arquivo na pasta de dados e tipo no cache de referências
+ARQUIVOS_REFERENCIA = (
+    ('clientes', ARQUIVO_CLIENTES, 'clientes'),
+    ('mapeamento', ARQUIVO_CATALOGO, 'catalogo'),
+    ('modelo', ARQUIVO_MODELO_SAIDA, 'modelo_saida'),
+)
+# Depois de uma falha ao carregar as referências, /readyz só tenta de novo após esse intervalo (s)
+INTERVALO_CARGA_PRONTIDAO = 5.0
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Modo de escrita do xlsx de saída: 'openpyxl' (padrão) ou 'write_only' (streaming)
+app.config['XLSX_WRITER_MODE'] = os.environ.get('CONVERSOR_XLSX_WRITER', 'openpyxl')
+if app.config['XLSX_WRITER_MODE'] not in MODOS_ESCRITA:
+    raise ValueError(f"CONVERSOR_XLSX_WRITER inválido: {app.config['XLSX_WRITER_MODE']}. Use um de {MODOS_ESCRITA}")
+# Máximo de orçamentos convertidos em paralelo em /processar_lote
+app.config['LOTE_MAX_WORKERS'] = int(os.environ.get('CONVERSOR_LOTE_MAX_WORKERS', '4'))
+# Conversões assíncronas (/processar com assincrono=1): pool de processos por worker, limite de fila
+# somando todos os workers, validade dos jobs terminados e prazo para dar como perdido um job que não terminou
+app.config['JOBS_MAX_WORKERS'] = int(os.environ.get('CONVERSOR_JOBS_MAX_WORKERS', '2'))
+app.config['JOBS_MAX_PENDENTES'] = int(os.environ.get('CONVERSOR_JOBS_MAX_PENDENTES', '8'))
+app.config['JOBS_TTL_SEGUNDOS'] = int(os.environ.get('CONVERSOR_JOBS_TTL_SEGUNDOS', '3600'))
+app.config['JOBS_TTL_PENDENTES_SEGUNDOS'] = int(os.environ.get('CONVERSOR_JOBS_TTL_PENDENTES_SEGUNDOS', '7200'))
+# Cache de resultados de /processar: limite em MB na memória (por worker) e no disco (0 desliga cada camada)
+app.config['CACHE_RESULTADOS_MB'] = float(os.environ.get('CONVERSOR_CACHE_RESULTADOS_MB', '64'))
+app.config['CACHE_RESULTADOS_DISCO_MB'] = float(os.environ.get('CONVERSOR_CACHE_RESULTADOS_DISCO_MB', '0'))
+# Tamanho máximo de uma requisição (uploads) e do conteúdo descompactado de cada xlsx/zip enviado
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('CONVERSOR_MAX_UPLOAD_MB', '32')) * 1024 * 1024)
+app.config['MAX_DESCOMPACTADO_BYTES'] = int(float(os.environ.get('CONVERSOR_MAX_DESCOMPACTADO_MB', '200')) * 1024 * 1024)
+# Com CONVERSOR_TIMING_HEADER=1 toda resposta traz X-Conversion-Timing; sem ele, só as requisições
+# enviadas com o cabeçalho X-Conversion-Timing: 1
+app.config['TIMING_HEADER'] = os.environ.get('CONVERSOR_TIMING_HEADER', '0').lower() in ('1', 'true', 'sim')
+# Versões guardadas de cada arquivo de referência enviado (para reverter) e intervalo máximo, em segundos,
+# sem conferir no disco um arquivo de referência cuja geração não mudou
+app.config['REFERENCIAS_VERSOES_MANTIDAS'] = int(os.environ.get('CONVERSOR_REFERENCIAS_VERSOES', '5'))
+app.config['REFERENCIAS_REVALIDAR_S'] = float(os.environ.get('CONVERSOR_REFERENCIAS_REVALIDAR_S', '60'))
+# Onde as versões dos arquivos de referência enviados e os resultados dos jobs ficam guardados, por SHA-256:
+# 'local' (padrão, em CONVERSOR_ARMAZENAMENTO_PASTA ou DATA_DIR/armazenamento) ou 's3' (CONVERSOR_S3_BUCKET,
+# CONVERSOR_S3_PREFIXO e CONVERSOR_S3_ENDPOINT); e memória (por worker) do cache das leituras, em MB
+app.config['ARMAZENAMENTO'] = os.environ.get('CONVERSOR_ARMAZENAMENTO', 'local')
+app.config['ARMAZENAMENTO_CACHE_MB'] = float(os.environ.get('CONVERSOR_ARMAZENAMENTO_CACHE_MB', '16'))
+# Com CONVERSOR_AQUECER=1, as referências são carregadas e indexadas ao importar o app (ver aquecer())
+app.config['AQUECER'] = os.environ.get('CONVERSOR_AQUECER', '0').lower() in ('1', 'true', 'sim')
 ALLOWED_EXTENSIONS = {'xlsx'}
+# Tipos aceitos em file_type nos uploads e o tipo correspondente no cache de referências
+TIPOS_UPLOAD_REFERENCIA = {'clientes': 'clientes', 'produtos': 'catalogo'}
+
+# Serviços do worker (jobs, caches, armazenamento, versões e banco de referências), criados no primeiro
+# uso por uma rota ou por aquecer(): importar o app não lê nem grava arquivos, não acessa o S3 nem o
+# banco e não abre o pool de processos dos jobs (que, criado no master do gunicorn, não sobreviveria ao fork)
+_servicos = {}
+_locks_servicos = {}
+_lock_servicos = threading.Lock()
+
+def _servico(nome, criar):
+    """
+    Serviço nome deste processo, criado por criar() na primeira chamada.
+
+    Cada serviço tem seu lock: a criação demorada de um (ex.: restaurar as versões
+    do S3) não segura os demais. Se criar() falhar, a próxima chamada tenta de novo.
+    """
+    if nome in _servicos:
+        return _servicos[nome]
+    with _lock_servicos:
+        lock = _locks_servicos.setdefault(nome, threading.Lock())
+    with lock:
+        if nome not in _servicos:
+            _servicos[nome] = criar()
+    return _servicos[nome]
+
+def obter_armazenamento():
+    """
+    Camada de E/S dos arquivos de referência, dos uploads e dos resultados (storage.StorageHandler).
+
+    Criá-la não lê nem grava nada: as pastas são criadas no primeiro uso e o S3 só é acessado quando preciso.
+    """
+    return _servico('armazenamento', lambda: criar_armazenamento(
+        app.config['ARMAZENAMENTO'],
+        DATA_DIR,
+        UPLOAD_FOLDER,
+        int(app.config['ARMAZENAMENTO_CACHE_MB'] * 1024 * 1024),
+        pasta_local=os.environ.get('CONVERSOR_ARMAZENAMENTO_PASTA'),
+        bucket=os.environ.get('CONVERSOR_S3_BUCKET'),
+        prefixo=os.environ.get('CONVERSOR_S3_PREFIXO', ''),
+        endpoint_url=os.environ.get('CONVERSOR_S3_ENDPOINT')
+    ))
+
+def caminho_referencia(arquivo):
+    """Caminho de um arquivo de referência ativo, na pasta de dados do armazenamento."""
+    return obter_armazenamento().caminho_dados(arquivo)
+
+def caminhos_referencias():
+    """Caminhos do catálogo, dos clientes e do modelo de saída, nessa ordem."""
+    return tuple(caminho_referencia(arquivo) for arquivo in (ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA))
+
+def _criar_gerenciador_jobs():
+    armazenamento = obter_armazenamento()
+    return GerenciadorJobs(
+        armazenamento.caminho_trabalho('jobs'),
+        max_workers=app.config['JOBS_MAX_WORKERS'],
+        max_pendentes=app.config['JOBS_MAX_PENDENTES'],
+        ttl_segundos=app.config['JOBS_TTL_SEGUNDOS'],
+        ttl_pendentes_segundos=app.config['JOBS_TTL_PENDENTES_SEGUNDOS'],
+        armazenamento=armazenamento
+    )
+
+def obter_gerenciador_jobs():
+    """Jobs assíncronos: status e orçamentos na pasta de trabalho, resultados guardados no armazenamento."""
+    return _servico('gerenciador_jobs', _criar_gerenciador_jobs)
+
+def obter_cache_resultados():
+    return _servico('cache_resultados', lambda: CacheResultados(
+        int(app.config['CACHE_RESULTADOS_MB'] * 1024 * 1024),
+        obter_armazenamento().caminho_trabalho('cache_resultados'),
+        int(app.config['CACHE_RESULTADOS_DISCO_MB'] * 1024 * 1024)
+    ))
+
+def _criar_versoes_referencias():
+    from versoes_referencias import GerenciadorVersoes
+
+    armazenamento = obter_armazenamento()
+    pasta_dados = armazenamento.caminho_dados()
+    # Diagnóstico dos caminhos (só com CONVERSOR_LOG_LEVEL=DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Caminhos dos arquivos', extra={
+            'diretorio_atual': os.getcwd(),
+            'arquivos': {caminho: os.path.exists(caminho) for caminho in caminhos_referencias()},
+            'pasta_dados': os.listdir(pasta_dados) if os.path.exists(pasta_dados) else None,
+        })
+    os.makedirs(pasta_dados, exist_ok=True)
+    versoes_referencias = GerenciadorVersoes(
+        pasta_dados,
+        {'catalogo': ARQUIVO_CATALOGO, 'clientes': ARQUIVO_CLIENTES},
+        max_versoes=app.config['REFERENCIAS_VERSOES_MANTIDAS'],
+        armazenamento=armazenamento
+    )
+    try:
+        # Disco novo (ex.: após um deploy no Render): traz de volta os últimos arquivos enviados
+        versoes_referencias.restaurar()
+    except Exception as e:
+        logger.error('Não foi possível sincronizar as versões com o armazenamento: %s', e)
+    cache_referencias.usar_geracao(versoes_referencias.geracao, app.config['REFERENCIAS_REVALIDAR_S'])
+    return versoes_referencias
+
+def obter_versoes_referencias():
+    """
+    Versões de catálogo e clientes enviados, trocadas de forma atômica e guardadas também no armazenamento.
+
+    Na primeira chamada do processo traz do armazenamento os arquivos que faltam no
+    disco e liga o cache de referências ao contador de geração, compartilhado pelos
+    workers, que avisa quando há versão nova. Deve ser chamada antes de ler os arquivos de referência.
+    """
+    return _servico('versoes_referencias', _criar_versoes_referencias)
+
+def preparar_banco_referencias():
+    """
+    Com CONVERSOR_DATABASE_URL, importa catálogo e clientes dos xlsx se o banco ainda não os tiver.
+
+    As importações ficam guardadas em cada processo e são consultadas de novo quando a
+    geração muda, como os arquivos no cache de referências. Devolve o banco (None sem ele).
+    """
+    from banco_referencias import banco_referencias
+
+    banco = banco_referencias()
+    if banco is None:
+        return None
+    versoes_referencias = obter_versoes_referencias()
+    banco.usar_geracao(versoes_referencias.geracao, app.config['REFERENCIAS_REVALIDAR_S'])
+    try:
+        importacoes = banco.importacoes()
+        for tipo in TIPOS_UPLOAD_REFERENCIA.values():
+            caminho = versoes_referencias.caminho_ativo(tipo)
+            if tipo not in importacoes and os.path.exists(caminho):
+                banco.importar(tipo, caminho)
+    except Exception as e:
+        # O worker sobe mesmo assim; /readyz fica 503 até o banco responder
+        logger.error('Não foi possível preparar o banco de referências: %s', e)
+    return banco
+
+def obter_banco_referencias():
+    """Banco de referências, preparado na primeira chamada do processo (preparar_banco_referencias()), ou None."""
+    return _servico('banco_referencias', preparar_banco_referencias)
+
+# Contadores que os caches já mantêm, lidos a cada scrape de /metrics
+registro.coletada(
+    'conversor_cache_referencias_total', 'Consultas ao cache de arquivos de referência', 'counter', ('resultado',),
+    lambda: valores_contadores(cache_referencias.estatisticas(), {'acertos': 'acerto', 'falhas': 'falha', 'recargas': 'recarga'})
+)
+registro.coletada(
+    'conversor_cache_resultados_total', 'Consultas ao cache de resultados de /processar', 'counter', ('resultado',),
+    lambda: valores_contadores(
+        obter_cache_resultados().estatisticas(),
+        {'acertos_memoria': 'acerto_memoria', 'acertos_disco': 'acerto_disco', 'falhas': 'falha'}
+    )
+)
+registro.coletada(
+    'conversor_armazenamento_memoria_total', 'Leituras do armazenamento pelo cache em memória', 'counter', ('resultado',),
+    lambda: valores_contadores(
+        obter_armazenamento().estatisticas(), {'acertos_memoria': 'acerto', 'falhas_memoria': 'falha'}
+    )
+)
+
+# Duração (s) da importação do app e do aquecimento, em /readyz e em /metrics
+TEMPOS_INICIALIZACAO = {}
+registro.coletada(
+    'conversor_inicializacao_segundos', 'Duração da importação do app e do aquecimento das referências', 'gauge', ('etapa',),
+    lambda: [((etapa,), duracao) for etapa, duracao in TEMPOS_INICIALIZACAO.items()]
+)
+
+# Produtos que mais ficam sem mapeamento nas conversões deste worker
+contador_nao_mapeados = ContadorNaoMapeados()
+
+# Formatos do relatório de não mapeados em /processar (campo 'relatorio')
+RELATORIOS_PROCESSAR = ('', 'planilha', 'json')
+
+# Linhas por página da prévia em JSON de /processar (campo 'limit')
+PREVIA_LINHAS_PADRAO = 50
+PREVIA_LINHAS_MAX = 500
+
+class RequisicaoUpload(Request):
+    """Requisição que grava uploads grandes em arquivo temporário na pasta de trabalho do armazenamento."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return obter_armazenamento().receber_upload(total_content_length)
+
+app.request_class = RequisicaoUpload
+
+def validar_upload(stream, exigir_xlsx=True):
+    """Recusa (UploadInvalidoError) arquivos que não são xlsx/zip ou que se expandiriam demais."""
+    validar_zip(stream, exigir_xlsx=exigir_xlsx, max_bytes_descompactados=app.config['MAX_DESCOMPACTADO_BYTES'])
+
+def resposta_upload_invalido(erro):
+    status = 413 if isinstance(erro, UploadGrandeDemaisError) else 400
+    return jsonify({'error': str(erro)}), status
+
+def pico_memoria_kb():
+    """Pico de memória residente (RSS) deste processo em KB, ou None se indisponível."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico // 1024 if sys.platform == 'darwin' else pico
+
+CAMINHOS_SONDAS = ('/healthz', '/readyz', '/metrics')
+
+# IDs de correlação aceitos do cabeçalho X-Request-ID (ex.: gerados pelo proxy)
+_ID_REQUISICAO_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+@app.before_request
+def iniciar_id_requisicao():
+    """Usa o X-Request-ID recebido (se válido) ou gera um; ele aparece em todos os logs da requisição."""
+    id_requisicao = request.headers.get('X-Request-ID', '')
+    if not _ID_REQUISICAO_RE.match(id_requisicao):
+        id_requisicao = uuid.uuid4().hex
+    g.id_requisicao = id_requisicao
+    g.inicio_log_requisicao = time.perf_counter()
+    definir_id_requisicao(id_requisicao)
+
+@app.after_request
+def registrar_requisicao(response):
+    id_requisicao = g.get('id_requisicao')
+    if id_requisicao is not None:
+        response.headers['X-Request-ID'] = id_requisicao
+        # Sondas e scrapes são frequentes: só aparecem com o nível DEBUG
+        nivel = logging.DEBUG if request.path in CAMINHOS_SONDAS else logging.INFO
+        logger.log(nivel, 'Requisição atendida', extra={
+            'metodo': request.method,
+            'caminho': request.path,
+            'status': response.status_code,
+            'duracao_ms': round((time.perf_counter() - g.inicio_log_requisicao) * 1000, 2),
+        })
+    return response
+
+@app.teardown_request
+def encerrar_id_requisicao(exc=None):
+    definir_id_requisicao(None)
+
+@app.before_request
+def registrar_memoria_inicial():
+    g.pico_rss_inicial = pico_memoria_kb()
+
+@app.before_request
+def iniciar_tempos_requisicao():
+    if app.config['TIMING_HEADER'] or request.headers.get('X-Conversion-Timing', '').lower() in ('1', 'true', 'sim'):
+        g.inicio_requisicao = time.perf_counter()
+        iniciar_coleta_tempos()
+
+@app.after_request
+def informar_tempos_requisicao(response):
+    """Com a coleta ativa, informa a duração de cada etapa no cabeçalho X-Conversion-Timing (ms)."""
+    tempos = encerrar_coleta_tempos()
+    if tempos is not None:
+        tempos['requisicao'] = round((time.perf_counter() - g.inicio_requisicao) * 1000, 2)
+        response.headers['X-Conversion-Timing'] = formatar_tempos(tempos)
+    return response
+
+@app.after_request
+def informar_pico_memoria(response):
+    """Informa o pico de RSS do worker no cabeçalho X-Peak-RSS-KB e loga quando a requisição o aumentou."""
+    pico = pico_memoria_kb()
+    if pico is not None:
+        response.headers['X-Peak-RSS-KB'] = str(pico)
+        inicial = g.get('pico_rss_inicial')
+        if inicial is not None and pico > inicial:
+            logger.info('Pico de RSS aumentou', extra={'caminho': request.path, 'aumento_kb': pico - inicial, 'pico_kb': pico})
+    return response
+
+def opcao_ativada(nome, padrao=False):
+    """Lê uma opção sim/não do formulário ou da query string ('1', 'true' ou 'sim' ativam)."""
+    valor = request.form.get(nome, request.args.get(nome))
+    if valor is None or valor == '':
+        return padrao
+    return valor.lower() in ('1', 'true', 'sim')
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def is_zip_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'zip'
+
 def check_required_files():
-    """Check if all required files exist and are readable."""
-    # Certifique-se de que o diretório DATA_DIR existe
-    os.makedirs(DATA_DIR, exist_ok=True)
-    print(f"[CHECK] Verificando diretório de dados: {DATA_DIR} (Existe: {os.path.exists(DATA_DIR)})")
-    
-    required_files = {
-        'clientes': CLIENTES_PATH,
-        'mapeamento': MAPEAMENTO_PRODUTOS_PATH,
-        'modelo': MODELO_SAIDA_OLIST_PATH
-    }
-    
+    """
+    Check which required reference files are missing.
+
+    Files already loaded by this worker's reference cache count as present
+    without touching the disk; only the others are checked with os.path.exists.
+    """
+    # Disco novo: as versões enviadas são restauradas do armazenamento antes da conferência
+    obter_versoes_referencias()
     missing_files = []
-    for file_type, path in required_files.items():
+    usa_banco = obter_banco_referencias() is not None
+    for file_type, arquivo, tipo in ARQUIVOS_REFERENCIA:
+        path = caminho_referencia(arquivo)
+        if cache_referencias.carregado(path, tipo) or (usa_banco and tipo in TIPOS_UPLOAD_REFERENCIA.values()):
+            continue
         if not os.path.exists(path):
             missing_files.append(file_type)
             app.logger.error(f"Required file missing: {path}")
-            print(f"[CHECK] Arquivo ausente: {path}")
-        else:
-            print(f"[CHECK] Arquivo encontrado: {path}")
     
     return missing_files
 
+def referencias_carregadas(importacoes=None):
+    """
+    Se catálogo, clientes e modelo de saída estão carregados neste worker.
+
+    Com o banco de referências, importacoes (BancoReferencias.importacoes()) diz
+    se catálogo e clientes já foram importados; só o modelo de saída passa pelo cache.
+    """
+    return all(
+        tipo in importacoes if importacoes is not None and tipo in TIPOS_UPLOAD_REFERENCIA.values()
+        else cache_referencias.carregado(caminho_referencia(arquivo), tipo)
+        for _, arquivo, tipo in ARQUIVOS_REFERENCIA
+    )
+
+_prontidao = {'ultima_falha': None, 'erro': None}
+_lock_prontidao = threading.Lock()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: o processo responde. Não faz nenhuma leitura."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: catálogo, clientes e modelo de saída carregados neste worker, com suas versões.
+
+    Com tudo carregado a resposta sai do estado em memória do cache de referências.
+    Senão, tenta carregá-los e responde 503 enquanto não conseguir; depois de uma
+    falha, a próxima tentativa só acontece após INTERVALO_CARGA_PRONTIDAO segundos.
+    Com o banco de referências, catálogo e clientes estão prontos quando já foram
+    importados, o que é consultado no banco a cada chamada.
+    """
+    from conversor_olist import carregar_referencias
+    from snapshot_referencias import VERSAO_SNAPSHOT
+
+    versoes_referencias = obter_versoes_referencias()
+    banco = obter_banco_referencias()
+    importacoes = None
+    erro_banco = None
+    if banco is not None:
+        try:
+            importacoes = banco.importacoes()
+        except Exception as e:
+            importacoes, erro_banco = {}, str(e)
+
+    if not referencias_carregadas(importacoes) and erro_banco is None:
+        with _lock_prontidao:
+            ultima_falha = _prontidao['ultima_falha']
+            if not referencias_carregadas(importacoes) and (
+                ultima_falha is None or time.monotonic() - ultima_falha >= INTERVALO_CARGA_PRONTIDAO
+            ):
+                try:
+                    carregar_referencias(*caminhos_referencias())
+                    _prontidao['ultima_falha'] = None
+                    _prontidao['erro'] = None
+                except Exception as e:
+                    _prontidao['ultima_falha'] = time.monotonic()
+                    _prontidao['erro'] = str(e)
+
+    referencias = {}
+    for nome, arquivo, tipo in ARQUIVOS_REFERENCIA:
+        if importacoes is not None and tipo in TIPOS_UPLOAD_REFERENCIA.values():
+            importacao = importacoes.get(tipo)
+            referencias[nome] = {
+                'banco': True,
+                'carregado': importacao is not None,
+                'versao': importacao['versao'] if importacao else None,
+                'importado_em': importacao['importado_em'].isoformat() if importacao else None,
+                'linhas': importacao['linhas'] if importacao else None,
+            }
+            continue
+        assinatura = cache_referencias.assinatura_carregada(caminho_referencia(arquivo), tipo)
+        referencias[nome] = {
+            'arquivo': arquivo,
+            'carregado': assinatura is not None,
+            'modificado_em': (
+                datetime.datetime.fromtimestamp(assinatura[0] / 1e9, datetime.timezone.utc).isoformat()
+                if assinatura is not None else None
+            ),
+            'tamanho': assinatura[1] if assinatura is not None else None,
+        }
+    pronto = all(referencia['carregado'] for referencia in referencias.values())
+    corpo = {
+        'status': 'ok' if pronto else 'indisponivel',
+        'referencias': referencias,
+        'versao_snapshot': VERSAO_SNAPSHOT,
+        'geracao': versoes_referencias.geracao(),
+        'inicializacao_ms': {etapa: round(duracao * 1000, 2) for etapa, duracao in TEMPOS_INICIALIZACAO.items()},
+    }
+    if not pronto:
+        corpo['erro'] = erro_banco or _prontidao['erro']
+    return jsonify(corpo), 200 if pronto else 503
+
 @app.route('/')
 def index():
     try:
@@ -90,26 +511,122 @@ def index():
 
 @app.route('/clientes', methods=['GET'])
 def get_clientes():
+    """
+    Lista de clientes (ID, Nome).
+
+    Query params (todos opcionais; sem eles a lista completa é devolvida):
+        q: busca por prefixo do nome ou de uma palavra dele, sem diferenciar acentos
+        limit: tamanho da página
+        cursor: valor de 'proximo_cursor' da página anterior
+    Responde 304 para If-None-Match com a versão atual e comprime com gzip quando aceito.
+    Com o banco de referências, a busca e a paginação são consultas à tabela de clientes.
+    """
+    from indice_clientes import carregar_indice_clientes
+
     try:
-        if not os.path.exists(CLIENTES_PATH):
-            app.logger.error(f"Client file not found at: {CLIENTES_PATH}")
+        obter_versoes_referencias()
+        banco = obter_banco_referencias()
+        caminho_clientes = caminho_referencia(ARQUIVO_CLIENTES)
+        if banco is None and not os.path.exists(caminho_clientes):
+            app.logger.error(f"Client file not found at: {caminho_clientes}")
             return jsonify({
                 'error': 'Client file not found',
-                'details': {'path': CLIENTES_PATH}
+                'details': {'path': caminho_clientes}
             }), 404
-        
-        df_clientes = pd.read_excel(CLIENTES_PATH, sheet_name='CLIENTES')
-        if 'ID' in df_clientes.columns and 'Nome' in df_clientes.columns:
-            df_clientes = df_clientes.dropna(subset=['Nome'])
-            df_clientes['ID'] = df_clientes['ID'].astype(str)
-            clientes_list = df_clientes[['ID', 'Nome']].to_dict(orient='records')
-            return jsonify({'clientes': clientes_list})
+
+        consulta = request.args.get('q', '')
+        try:
+            limite = request.args.get('limit', type=int)
+            cursor = int(request.args.get('cursor') or 0)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if (limite is not None and limite <= 0) or cursor < 0:
+            return jsonify({'error': 'Invalid limit or cursor'}), 400
+
+        # ETag derivado da versão dos clientes (arquivo ou importação no banco) e dos parâmetros:
+        # responde 304 sem montar a lista
+        if banco is not None:
+            importacao = banco.importacoes_em_cache().get('clientes')
+            if importacao is None:
+                return jsonify({'error': 'Client data not imported', 'details': {'banco': True}}), 404
+            versao_clientes = f"banco-{importacao['versao']}-{importacao['importado_em'].isoformat()}"
+        else:
+            mtime_ns, tamanho = assinatura_arquivo(caminho_clientes)
+            versao_clientes = f'{mtime_ns}-{tamanho}'
+        etag = hashlib.sha1(f'{versao_clientes}-{consulta}-{limite}-{cursor}'.encode('utf-8')).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        indice = None
+        if banco is None:
+            try:
+                indice = carregar_indice_clientes(caminho_clientes)
+            except ValueError:
+                return jsonify({'error': 'Invalid client file structure'}), 500
+
+        usar_gzip = 'gzip' in request.accept_encodings
+        if indice is not None and not consulta and limite is None and cursor == 0:
+            # Lista completa: o corpo (e sua versão gzip) fica guardado junto com o índice
+            if indice.resposta_completa is None:
+                indice.resposta_completa = json.dumps({'clientes': indice.clientes}).encode('utf-8')
+                indice.resposta_completa_gzip = gzip.compress(indice.resposta_completa, compresslevel=6)
+            corpo = indice.resposta_completa_gzip if usar_gzip else indice.resposta_completa
+            comprimido = usar_gzip
         else:
-            return jsonify({'error': 'Invalid client file structure'}), 500
+            paginar = indice.pagina if indice is not None else banco.pagina_clientes
+            clientes, proximo_cursor, total = paginar(consulta, limite, cursor)
+            dados = {'clientes': clientes}
+            if limite is not None or consulta:
+                dados.update({'total': total, 'proximo_cursor': str(proximo_cursor) if proximo_cursor is not None else None})
+            corpo = json.dumps(dados).encode('utf-8')
+            comprimido = usar_gzip and len(corpo) > 1024
+            if comprimido:
+                corpo = gzip.compress(corpo, compresslevel=6)
+
+        response = app.response_class(corpo, mimetype='application/json')
+        if comprimido:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(etag, weak=True)
+        return response
     except Exception as e:
         app.logger.error(f"Error loading clients: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'error': str(e), 'details': traceback.format_exc()}), 500
 
+@app.route('/cache/referencias', methods=['GET'])
+def get_cache_referencias():
+    """Contadores de acerto/falha/recarga do cache de arquivos de referência deste worker."""
+    return jsonify(cache_referencias.estatisticas())
+
+@app.route('/cache/armazenamento', methods=['GET'])
+def get_cache_armazenamento():
+    """Backend e contadores (gravados/deduplicados) do armazenamento dos arquivos de referência deste worker."""
+    return jsonify(obter_armazenamento().estatisticas())
+
+@app.route('/cache/resultados', methods=['GET'])
+def get_cache_resultados():
+    """Contadores do cache de resultados de /processar deste worker."""
+    return jsonify(obter_cache_resultados().estatisticas())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas deste worker no formato de texto do Prometheus."""
+    return app.response_class(registro.exportar(), content_type=TIPO_CONTENT_TYPE)
+
+@app.route('/relatorio/nao_mapeados', methods=['GET'])
+def get_relatorio_nao_mapeados():
+    """Produtos que mais ficaram sem mapeamento nas conversões deste worker (?limit=N, padrão 20)."""
+    try:
+        limite = max(1, min(int(request.args.get('limit', 20)), 500))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit value'}), 400
+    return jsonify({
+        'produtos': contador_nao_mapeados.mais_frequentes(limite),
+        'estatisticas': contador_nao_mapeados.estatisticas()
+    })
+
 def remove_file_with_retry(file_path, max_retries=3, delay=1):
     """Remove um arquivo com tentativas múltiplas caso esteja em uso."""
     for attempt in range(max_retries):
@@ -126,8 +643,87 @@ def remove_file_with_retry(file_path, max_retries=3, delay=1):
             raise
     return False
 
+def enviar_xlsx_convertido(dados, status_cache=None, relatorio=''):
+    """
+    Resposta de download do orçamento convertido; status_cache vai no cabeçalho X-Cache.
+
+    Com relatorio='json' os dados são um zip com o xlsx e o relatorio.json.
+    """
+    if relatorio == 'json':
+        mimetype, download_name = 'application/zip', 'orcamento_convertido_olist.zip'
+    else:
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        download_name = 'orcamento_convertido_olist.xlsx'
+    response = send_file(
+        io.BytesIO(dados),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name
+    )
+    if status_cache is not None:
+        response.headers['X-Cache'] = status_cache
+    BYTES_ARQUIVOS.observar(len(dados), direcao='saida')
+    return response
+
+def enviar_texto_convertido(df, formato, comprimir=False):
+    """
+    Resposta em fluxo (chunked) do orçamento convertido em CSV, TSV ou JSON Lines.
+
+    O corpo é gerado bloco a bloco enquanto é enviado, sem montar o arquivo
+    inteiro na memória; com comprimir=True vai como .gz. As colunas são
+    preparadas antes de a resposta ser montada: um erro nelas vira um 500 com
+    corpo JSON, e não um arquivo cortado depois do 200.
+    """
+    from saida_texto import gerar_texto, comprimir_gzip, FORMATOS_TEXTO
+
+    extensao, mimetype = FORMATOS_TEXTO[formato]
+    download_name = f'orcamento_convertido_olist.{extensao}'
+    blocos = gerar_texto(df, formato)
+    if comprimir:
+        blocos = comprimir_gzip(blocos)
+        mimetype, download_name = 'application/gzip', download_name + '.gz'
+
+    def enviar():
+        total = 0
+        for bloco in blocos:
+            total += len(bloco)
+            yield bloco
+        BYTES_ARQUIVOS.observar(total, direcao='saida')
+
+    response = app.response_class(enviar(), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    return response
+
+def versao_referencias_atual():
+    """
+    Versão dos arquivos de referência para a chave do cache de resultados, sem consultar o disco.
+
+    Usa a geração das versões publicadas e a assinatura de cada arquivo como o
+    cache de referências o leu; os.stat só é feito para um arquivo que este
+    processo ainda não leu. Com o banco de referências, catálogo e clientes
+    entram pela versão da última importação, guardada no processo
+    (BancoReferencias.importacoes_em_cache()) e reconsultada quando a geração muda.
+    """
+    versoes_referencias = obter_versoes_referencias()
+    banco = obter_banco_referencias()
+    importacoes = banco.importacoes_em_cache() if banco is not None else None
+    assinaturas = []
+    for nome, arquivo, tipo in ARQUIVOS_REFERENCIA:
+        if importacoes is not None and tipo in TIPOS_UPLOAD_REFERENCIA.values():
+            importacao = importacoes.get(tipo)
+            assinaturas.append((nome, 'banco', importacao['versao'] if importacao else None))
+            continue
+        path = caminho_referencia(arquivo)
+        assinatura = cache_referencias.assinatura_carregada(path, tipo)
+        assinaturas.append((nome, assinatura if assinatura is not None else assinatura_arquivo(path)))
+    return versoes_referencias.geracao(), tuple(assinaturas)
+
 @app.route('/processar', methods=['POST'])
 def processar_arquivo():
+    from conversor_olist import converter_orcamento_com_relatorio
+    from saida_xlsx import escrever_orcamento_convertido, ABA_NAO_MAPEADOS
+    from saida_texto import FORMATO_XLSX, FORMATOS_SAIDA
+
     try:
         # Check required files first
         missing_files = check_required_files()
@@ -140,6 +736,7 @@ def processar_arquivo():
         if 'arquivo_excel' not in request.files:
             return jsonify({'error': 'No Excel file uploaded'}), 400
         
+        caminho_catalogo, caminho_clientes, caminho_modelo = caminhos_referencias()
         file = request.files['arquivo_excel']
         cliente_id_str = request.form.get('cliente_id')
 
@@ -152,56 +749,396 @@ def processar_arquivo():
         if not file or not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Use .xlsx'}), 400
 
-        # Create in-memory file
-        input_excel = io.BytesIO(file.read())
-        
         try:
-            df_convertido = converter_orcamento_para_olist(
-                input_excel,
-                MAPEAMENTO_PRODUTOS_PATH,
-                CLIENTES_PATH,
-                cliente_id_str,
-                MODELO_SAIDA_OLIST_PATH
-            )
+            validar_upload(file.stream)
+        except UploadInvalidoError as e:
+            return resposta_upload_invalido(e)
+        BYTES_ARQUIVOS.observar(tamanho_upload(file.stream), direcao='entrada')
+
+        # Busca aproximada dos produtos sem correspondência exata; sugestões vão na aba 'Sugestões'
+        aproximar = opcao_ativada('aproximado', APROXIMADO_PADRAO)
+
+        # Relatório dos produtos não mapeados: aba 'Não mapeados' ('planilha') ou
+        # zip com o xlsx e relatorio.json ('json')
+        relatorio = request.form.get('relatorio', '').strip().lower()
+        if relatorio not in RELATORIOS_PROCESSAR:
+            return jsonify({'error': 'Invalid relatorio. Use planilha or json'}), 400
+
+        # Formato do arquivo convertido: xlsx (padrão) ou csv, tsv e jsonl enviados em fluxo,
+        # com gzip=1 para comprimir
+        formato = request.form.get('formato', FORMATO_XLSX).strip().lower() or FORMATO_XLSX
+        if formato not in FORMATOS_SAIDA:
+            return jsonify({'error': 'Invalid formato. Use xlsx, csv, tsv or jsonl'}), 400
+        if formato != FORMATO_XLSX and relatorio:
+            return jsonify({'error': 'relatorio is only available with formato=xlsx'}), 400
+        # O job assíncrono só gera o xlsx: relatório e prévia são recusados em vez de ignorados
+        assincrono = opcao_ativada('assincrono')
+        previa = opcao_ativada('previa')
+        if assincrono and (relatorio or previa):
+            return jsonify({'error': 'relatorio and previa are not available with assincrono'}), 400
+        # A prévia é sempre JSON e já traz os não mapeados: formato e relatório também são recusados
+        if previa and (formato != FORMATO_XLSX or relatorio):
+            return jsonify({'error': 'formato and relatorio are not available with previa'}), 400
+
+        # Prévia (previa=1): devolve em JSON uma página das linhas convertidas, os
+        # metadados e os não mapeados, sem gerar o xlsx
+        if previa:
+            return previa_conversao(file, cliente_id_str, aproximar)
+
+        # Modo assíncrono: enfileira a conversão e devolve o ID do job imediatamente
+        if assincrono:
+            if formato != FORMATO_XLSX:
+                return jsonify({'error': 'Asynchronous conversion only produces xlsx'}), 400
+            try:
+                # O upload é copiado em blocos para a pasta dos jobs; o processo do pool o lê de lá
+                job_id = obter_gerenciador_jobs().submeter(
+                    file.stream,
+                    caminho_catalogo,
+                    caminho_clientes,
+                    cliente_id_str,
+                    caminho_modelo,
+                    app.config['XLSX_WRITER_MODE'],
+                    aproximar
+                )
+            except FilaCheiaError as e:
+                response = jsonify({'error': str(e)})
+                response.headers['Retry-After'] = '5'
+                return response, 429
+            return jsonify({
+                'job_id': job_id,
+                'status_url': f'/jobs/{job_id}',
+                'resultado_url': f'/jobs/{job_id}/resultado'
+            }), 202
+
+        # Lê o upload sem copiá-lo de novo para a memória (mmap quando foi gravado em arquivo temporário)
+        cache_resultados = obter_cache_resultados()
+        with abrir_somente_leitura(file.stream) as input_excel:
+            # Mesmo orçamento, cliente e arquivos de referência: devolve o xlsx já convertido
+            chave_cache = None
+            if cache_resultados.ativo and formato == FORMATO_XLSX:
+                with medir_etapa('hash_upload'):
+                    sha256_orcamento = sha256_upload(input_excel)
+                chave_cache = chave_resultado(
+                    sha256_orcamento,
+                    cliente_id_str,
+                    versao_referencias_atual(),
+                    app.config['XLSX_WRITER_MODE'],
+                    DOBRAR_ACENTOS_PADRAO,
+                    aproximar,
+                    relatorio
+                )
+                resultado_cache = cache_resultados.obter(chave_cache)
+                if resultado_cache is not None:
+                    return enviar_xlsx_convertido(resultado_cache, 'HIT', relatorio)
+
+            try:
+                resultado = converter_orcamento_com_relatorio(
+                    input_excel,
+                    caminho_catalogo,
+                    caminho_clientes,
+                    cliente_id_str,
+                    caminho_modelo,
+                    aproximar=aproximar
+                )
+                df_convertido = resultado.df
+
+                if df_convertido.empty:
+                    return jsonify({'error': 'No data processed'}), 500
+                contador_nao_mapeados.registrar(resultado.nao_mapeados)
+
+                if formato != FORMATO_XLSX:
+                    return enviar_texto_convertido(df_convertido, formato, opcao_ativada('gzip'))
+
+                # Create output file in memory
+                output = io.BytesIO()
+                abas_extras = {ABA_NAO_MAPEADOS: resultado.tabela_nao_mapeados()} if relatorio == 'planilha' else None
+                with medir_etapa('escrita_xlsx'):
+                    escrever_orcamento_convertido(
+                        df_convertido, output, modo=app.config['XLSX_WRITER_MODE'], abas_extras=abas_extras
+                    )
+                    dados_saida = output.getvalue()
+                if relatorio == 'json':
+                    pacote = io.BytesIO()
+                    with medir_etapa('escrita_relatorio'), zipfile.ZipFile(pacote, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                        zf.writestr('orcamento_convertido_olist.xlsx', dados_saida)
+                        zf.writestr('relatorio.json', json.dumps(resultado.relatorio(), ensure_ascii=False, indent=2))
+                    dados_saida = pacote.getvalue()
+                if chave_cache is not None:
+                    cache_resultados.guardar(chave_cache, dados_saida)
+
+                return enviar_xlsx_convertido(dados_saida, 'MISS' if chave_cache is not None else None, relatorio)
+
+            except Exception as e:
+                app.logger.error(f"Error processing file: {str(e)}\n{traceback.format_exc()}")
+                return jsonify({
+                    'error': 'Error processing file',
+                    'details': {
+                        'message': str(e),
+                        'traceback': traceback.format_exc()
+                    }
+                }), 500
+
+    except RequestEntityTooLarge:
+        raise  # respondido por request_too_large (413)
+    except Exception as e:
+        app.logger.error(f"Unexpected error: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({
+            'error': 'Unexpected error',
+            'details': {
+                'message': str(e),
+                'traceback': traceback.format_exc()
+            }
+        }), 500
+
+def previa_conversao(file, cliente_id_str, aproximar):
+    """
+    Prévia de /processar: converte sem gerar o xlsx e sem passar pelo cache de resultados.
+
+    Campos opcionais: limit (linhas por página), cursor (valor de 'proximo_cursor'
+    da página anterior) e max_itens (lê e converte só as primeiras linhas de itens).
+    """
+    try:
+        limite = int(request.values.get('limit') or PREVIA_LINHAS_PADRAO)
+        cursor = int(request.values.get('cursor') or 0)
+        max_itens = int(request.values['max_itens']) if request.values.get('max_itens') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, cursor or max_itens'}), 400
+    if limite <= 0 or cursor < 0 or (max_itens is not None and max_itens <= 0):
+        return jsonify({'error': 'Invalid limit, cursor or max_itens'}), 400
 
-            if df_convertido.empty:
-                return jsonify({'error': 'No data processed'}), 500
+    from conversor_olist import converter_orcamento_com_relatorio
 
-            # Create output file in memory
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_convertido.to_excel(writer, index=False, sheet_name='Sheet1')
+    caminho_catalogo, caminho_clientes, caminho_modelo = caminhos_referencias()
+    with abrir_somente_leitura(file.stream) as input_excel:
+        resultado = converter_orcamento_com_relatorio(
+            input_excel,
+            caminho_catalogo,
+            caminho_clientes,
+            cliente_id_str,
+            caminho_modelo,
+            aproximar=aproximar,
+            limite_itens=max_itens
+        )
+    if resultado.erro is not None:
+        return jsonify({'error': 'Error processing file', 'details': {'message': resultado.erro}}), 500
+    with medir_etapa('escrita_previa'):
+        response = jsonify(resultado.previa(min(limite, PREVIA_LINHAS_MAX), cursor))
+    return response
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    status = obter_gerenciador_jobs().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/resultado', methods=['GET'])
+def get_job_resultado(job_id):
+    status = obter_gerenciador_jobs().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status['status'] == STATUS_ERRO:
+        return jsonify({'error': 'Error processing file', 'details': {'message': status['erro']}}), 500
+    resultado = obter_gerenciador_jobs().abrir_resultado(job_id) if status['status'] == STATUS_CONCLUIDO else None
+    if resultado is None:
+        return jsonify({'error': 'Job not finished', 'details': status}), 409
+    return send_file(
+        resultado,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name='orcamento_convertido_olist.xlsx'
+    )
+
+def validar_xlsx_lote(stream):
+    """Recusa o lote só por xlsx grande demais; os demais inválidos aparecem como 'erro' no manifesto."""
+    try:
+        validar_upload(stream)
+    except UploadGrandeDemaisError:
+        raise
+    except UploadInvalidoError:
+        pass
+
+def ler_arquivos_lote(files):
+    """
+    Expande os arquivos enviados ao lote em (nome, BytesIO); arquivos .zip têm seus .xlsx extraídos.
+
+    Raises:
+        UploadInvalidoError: se um .zip for inválido ou algum arquivo passar dos limites de tamanho
+        ValueError: se algum arquivo não for .xlsx nem .zip
+    """
+    arquivos = []
+    for file in files:
+        if not file or file.filename == '':
+            continue
+        if allowed_file(file.filename):
+            validar_xlsx_lote(file.stream)
+            arquivos.append((secure_filename(file.filename) or file.filename, io.BytesIO(file.read())))
+        elif is_zip_file(file.filename):
+            validar_upload(file.stream, exigir_xlsx=False)
+            with zipfile.ZipFile(file.stream) as zf:
+                for info in zf.infolist():
+                    nome = os.path.basename(info.filename)
+                    if info.is_dir() or info.filename.startswith('__MACOSX/') or not allowed_file(nome):
+                        continue
+                    conteudo = io.BytesIO(zf.read(info))
+                    validar_xlsx_lote(conteudo)
+                    arquivos.append((nome, conteudo))
+        else:
+            raise ValueError(f'Invalid file type: {file.filename}. Use .xlsx or .zip')
+    return arquivos
+
+@app.route('/processar_lote', methods=['POST'])
+def processar_lote():
+    """
+    Converte vários orçamentos de um mesmo cliente em uma única requisição.
+
+    Form fields:
+        cliente_id: ID do cliente
+        arquivos_excel: um ou mais .xlsx e/ou .zip contendo .xlsx
+        formato_saida: 'consolidado' (padrão; um xlsx com todas as linhas e a aba
+            'Manifesto') ou 'zip' (um xlsx por orçamento e manifesto.json)
+        paralelo: número de orçamentos convertidos em paralelo (limitado por LOTE_MAX_WORKERS)
+        aproximado: busca aproximada dos produtos sem correspondência exata (no formato
+            'zip' as sugestões vão na aba 'Sugestões' de cada xlsx)
+    """
+    import pandas as pd
+    from conversor_olist import converter_lote_para_olist
+    from saida_xlsx import escrever_xlsx_abas, escrever_orcamento_convertido
+
+    try:
+        missing_files = check_required_files()
+        if missing_files:
+            return jsonify({
+                'error': 'Missing required files',
+                'details': {'missing': missing_files}
+            }), 500
+
+        cliente_id_str = request.form.get('cliente_id')
+        if not cliente_id_str:
+            return jsonify({'error': 'No client ID provided'}), 400
+
+        formato_saida = request.form.get('formato_saida', 'consolidado')
+        if formato_saida not in ('consolidado', 'zip'):
+            return jsonify({'error': 'Invalid formato_saida. Use consolidado or zip'}), 400
+
+        try:
+            paralelo = int(request.form.get('paralelo', '1'))
+        except ValueError:
+            return jsonify({'error': 'Invalid paralelo value'}), 400
+        paralelo = max(1, min(paralelo, app.config['LOTE_MAX_WORKERS']))
+
+        try:
+            arquivos = ler_arquivos_lote(request.files.getlist('arquivos_excel'))
+        except UploadInvalidoError as e:
+            return resposta_upload_invalido(e)
+        except (ValueError, zipfile.BadZipFile) as e:
+            return jsonify({'error': str(e)}), 400
+        if not arquivos:
+            return jsonify({'error': 'No Excel file uploaded'}), 400
+
+        caminho_catalogo, caminho_clientes, caminho_modelo = caminhos_referencias()
+        resultados = converter_lote_para_olist(
+            arquivos,
+            caminho_catalogo,
+            caminho_clientes,
+            cliente_id_str,
+            caminho_modelo,
+            max_workers=paralelo,
+            aproximar=opcao_ativada('aproximado', APROXIMADO_PADRAO)
+        )
+        for resultado in resultados:
+            contador_nao_mapeados.registrar(resultado['resultado'].nao_mapeados)
+        manifesto = [
+            {chave: valor for chave, valor in resultado.items() if chave not in ('df', 'resultado')}
+            for resultado in resultados
+        ]
+        convertidos = [resultado for resultado in resultados if resultado['status'] == 'ok']
+        if not convertidos:
+            return jsonify({'error': 'No data processed', 'details': {'manifesto': manifesto}}), 500
+
+        modo_escrita = app.config['XLSX_WRITER_MODE']
+        output = io.BytesIO()
+        if formato_saida == 'consolidado':
+            df_consolidado = pd.concat([resultado['df'] for resultado in convertidos], ignore_index=True)
+            with medir_etapa('escrita_xlsx'):
+                escrever_xlsx_abas(
+                    {'Sheet1': df_consolidado, 'Manifesto': pd.DataFrame(manifesto)},
+                    output,
+                    modo=modo_escrita
+                )
             output.seek(0)
-            
             return send_file(
                 output,
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                 as_attachment=True,
-                download_name='orcamento_convertido_olist.xlsx'
+                download_name='orcamentos_convertidos_olist.xlsx'
             )
 
-        except Exception as e:
-            app.logger.error(f"Error processing file: {str(e)}\n{traceback.format_exc()}")
-            return jsonify({
-                'error': 'Error processing file',
-                'details': {
-                    'message': str(e),
-                    'traceback': traceback.format_exc()
-                }
-            }), 500
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            nomes_usados = set()
+            for resultado in convertidos:
+                nome_base = resultado['arquivo'].rsplit('.', 1)[0]
+                nome_saida = f'{nome_base}_olist.xlsx'
+                contador = 1
+                while nome_saida in nomes_usados:
+                    contador += 1
+                    nome_saida = f'{nome_base}_olist_{contador}.xlsx'
+                nomes_usados.add(nome_saida)
+                xlsx = io.BytesIO()
+                with medir_etapa('escrita_xlsx'):
+                    escrever_orcamento_convertido(resultado['df'], xlsx, modo=modo_escrita)
+                zf.writestr(nome_saida, xlsx.getvalue())
+            zf.writestr('manifesto.json', json.dumps(manifesto, ensure_ascii=False, indent=2))
+        output.seek(0)
+        return send_file(
+            output,
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name='orcamentos_convertidos_olist.zip'
+        )
 
+    except RequestEntityTooLarge:
+        raise  # respondido por request_too_large (413)
     except Exception as e:
-        app.logger.error(f"Unexpected error: {str(e)}\n{traceback.format_exc()}")
+        app.logger.error(f"Error processing batch: {str(e)}\n{traceback.format_exc()}")
         return jsonify({
-            'error': 'Unexpected error',
+            'error': 'Error processing batch',
             'details': {
                 'message': str(e),
                 'traceback': traceback.format_exc()
             }
         }), 500
 
+def referencia_trocada(tipo_referencia):
+    """
+    Descarta o que este worker guardou do arquivo anterior (os demais percebem pela geração)
+    e, com o banco de referências, importa o arquivo que passou a valer.
+    """
+    versoes_referencias = obter_versoes_referencias()
+    banco = obter_banco_referencias()
+    if banco is not None:
+        banco.importar(tipo_referencia, versoes_referencias.caminho_ativo(tipo_referencia))
+        # A geração já mudou na troca do arquivo, antes da importação: muda de novo para que
+        # nenhum worker fique com as importações que consultou no intervalo
+        versoes_referencias.avancar_geracao()
+    cache_referencias.invalidar(versoes_referencias.caminho_ativo(tipo_referencia))
+    # Resultados antigos já não batem com a nova assinatura do arquivo; libera o espaço
+    obter_cache_resultados().limpar()
+    if tipo_referencia == 'catalogo':
+        # Produtos que faltavam podem ter entrado no novo mapeamento
+        contador_nao_mapeados.limpar()
+
 @app.route('/upload_mapeamento', methods=['POST'])
 def upload_mapeamento():
+    """
+    Substitui o catálogo (file_type=produtos) ou os clientes (file_type=clientes).
+
+    O arquivo é validado e pré-compilado antes de entrar em uso; a versão
+    anterior fica guardada e pode ser reativada em /upload_mapeamento/reverter.
+    """
+    from conversor_olist import compilar_snapshot_referencia
+    from versoes_referencias import ReferenciaInvalidaError
+
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
@@ -215,26 +1152,71 @@ def upload_mapeamento():
             return jsonify({'error': 'Empty filename'}), 400
 
         if file and allowed_file(file.filename):
-            if file_type == 'clientes':
-                save_path = CLIENTES_PATH
-            elif file_type == 'produtos':
-                save_path = MAPEAMENTO_PRODUTOS_PATH
-            else:
+            tipo_referencia = TIPOS_UPLOAD_REFERENCIA.get(file_type)
+            if tipo_referencia is None:
                 return jsonify({'error': 'Invalid mapping file type'}), 400
-            
+
+            try:
+                validar_upload(file.stream)
+            except UploadInvalidoError as e:
+                return resposta_upload_invalido(e)
+
             try:
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                file.save(save_path)
-                return jsonify({'message': f'File updated successfully'})
+                versao = obter_versoes_referencias().publicar(file.stream, tipo_referencia, compilar_snapshot_referencia)
+                referencia_trocada(tipo_referencia)
+            except ReferenciaInvalidaError as e:
+                return jsonify({'error': 'Invalid mapping file', 'details': {'message': str(e)}}), 400
             except Exception as e:
                 app.logger.error(f"Error saving mapping file: {str(e)}\n{traceback.format_exc()}")
                 return jsonify({'error': f'Error saving file: {str(e)}'}), 500
+            return jsonify({'message': f'File updated successfully', 'versao': versao})
         else:
             return jsonify({'error': 'Invalid file type. Use .xlsx'}), 400
+    except RequestEntityTooLarge:
+        raise  # respondido por request_too_large (413)
     except Exception as e:
         app.logger.error(f"Error in upload_mapeamento: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/upload_mapeamento/versoes', methods=['GET'])
+def get_versoes_mapeamento():
+    """Versões guardadas do catálogo e dos clientes, a ativa de cada um e a geração atual."""
+    return jsonify(obter_versoes_referencias().listar())
+
+@app.route('/upload_mapeamento/reverter', methods=['POST'])
+def reverter_mapeamento():
+    """
+    Reativa uma versão guardada.
+
+    Form ou JSON:
+        file_type: 'produtos' ou 'clientes'
+        versao: número da versão (opcional; padrão, a anterior à ativa)
+    """
+    from versoes_referencias import VersaoNaoEncontradaError
+
+    dados = request.get_json(silent=True) or request.form
+    tipo_referencia = TIPOS_UPLOAD_REFERENCIA.get(dados.get('file_type') or '')
+    if tipo_referencia is None:
+        return jsonify({'error': 'Invalid mapping file type'}), 400
+    versao = dados.get('versao')
+    if versao is not None and versao != '':
+        try:
+            versao = int(versao)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid version', 'details': {'versao': versao}}), 400
+    else:
+        versao = None
+
+    try:
+        versao_revertida = obter_versoes_referencias().reverter(tipo_referencia, versao)
+        referencia_trocada(tipo_referencia)
+    except VersaoNaoEncontradaError as e:
+        return jsonify({'error': 'Version not found', 'details': {'message': str(e)}}), 404
+    except Exception as e:
+        app.logger.error(f"Error reverting mapping file: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({'error': f'Error reverting file: {str(e)}'}), 500
+    return jsonify({'message': 'File reverted successfully', 'versao': versao_revertida})
+
 @app.errorhandler(500)
 def internal_error(error):
     app.logger.error(f"Internal server error: {str(error)}\n{traceback.format_exc()}")
@@ -246,6 +1228,13 @@ def internal_error(error):
         }
     }), 500
 
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({
+        'error': 'File too large',
+        'details': {'max_bytes': app.config['MAX_CONTENT_LENGTH']}
+    }), 413
+
 @app.errorhandler(404)
 def not_found_error(error):
     return jsonify({
@@ -253,15 +1242,49 @@ def not_found_error(error):
         'details': {'message': str(error)}
     }), 404
 
+def aquecer():
+    """
+    Carrega e indexa catálogo, clientes e modelo de saída antes da primeira requisição.
+
+    Com o preload_app do gunicorn (gunicorn.conf.py), roda uma vez no master. Os
+    workers herdam no fork o catálogo indexado, os clientes e o índice de /clientes,
+    e as páginas ficam compartilhadas (copy-on-write). Antes da leitura, prepara as
+    versões (restaurando do armazenamento o que faltar) e o banco de referências.
+    Uma falha só é registrada no log; nesse caso cada worker carrega as referências
+    no primeiro uso.
+    """
+    from conversor_olist import carregar_referencias
+    from indice_clientes import carregar_indice_clientes
+
+    inicio = time.perf_counter()
+    tempos = {}
+    try:
+        obter_versoes_referencias()
+        banco = obter_banco_referencias()
+        referencias = carregar_referencias(
+            *caminhos_referencias(), tempos=tempos
+        )
+        referencias.catalogo.preparar_indices(dobrado=DOBRAR_ACENTOS_PADRAO, aproximado=APROXIMADO_PADRAO)
+        if banco is None:
+            carregar_indice_clientes(caminho_referencia(ARQUIVO_CLIENTES))
+    except Exception as e:
+        logger.error('Falha no aquecimento das referências: %s', e)
+    TEMPOS_INICIALIZACAO['aquecimento'] = time.perf_counter() - inicio
+    logger.info('Referências aquecidas', extra={
+        'duracao_ms': round(TEMPOS_INICIALIZACAO['aquecimento'] * 1000, 2), 'etapas_ms': tempos
+    })
+
+TEMPOS_INICIALIZACAO['importacao'] = time.perf_counter() - _INICIO_IMPORTACAO
+logger.info('App importado', extra={'duracao_ms': round(TEMPOS_INICIALIZACAO['importacao'] * 1000, 2)})
+if app.config['AQUECER']:
+    aquecer()
+
 # Para desenvolvimento local
 if __name__ == '__main__':
-    import logging
-    import tempfile
-    log_file = os.path.join(tempfile.gettempdir(), 'flask_app.log')
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.DEBUG,
-        format='%(asctime)s %(levelname)s: %(message)s'
+    # Desenvolvimento local: diagnósticos ligados e linhas legíveis, salvo configuração explícita
+    configurar_logs(
+        nivel=os.environ.get('CONVERSOR_LOG_LEVEL', 'DEBUG'),
+        formato=os.environ.get('CONVERSOR_LOG_FORMAT', 'texto')
     )
     app.logger.info('Iniciando aplicação...')
     app.run(host='0.0.0.0', port=5000, debug=True)
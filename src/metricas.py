@@ -0,0 +1,240 @@
+"""
+Métricas da conversão no formato de texto do Prometheus (GET /metrics).
+
+Histogramas e contadores ficam na memória do processo: com vários workers do
+gunicorn, cada scrape vê o worker que atendeu a requisição, como nos demais
+endpoints de estatísticas (/cache/referencias, /cache/resultados).
+
+medir_etapa() é o ponto de instrumentação: registra a duração no histograma
+da etapa e, se a requisição atual estiver coletando tempos (cabeçalho
+X-Conversion-Timing), também na coleta da requisição.
+"""
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LIMITES_LINHAS = (1, 10, 50, 100, 250, 500, 1000, 5000, 10000, 50000)
+LIMITES_BYTES = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+TIPO_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes: Sequence[str], valores: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra is not None:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatar_numero(valor: float) -> str:
+    if math.isinf(valor):
+        return '+Inf' if valor > 0 else '-Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos: dict) -> tuple:
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f'{self.nome}: rótulos esperados {self.rotulos}, recebidos {tuple(rotulos)}')
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def _amostras(self) -> List[str]:
+        raise NotImplementedError
+
+    def exportar(self) -> List[str]:
+        return [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}'] + self._amostras()
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[tuple, float] = {}
+
+    def inc(self, valor: float = 1, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _amostras(self) -> List[str]:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        return [f'{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}' for chave, valor in valores]
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), limites: Sequence[float] = LIMITES_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(sorted(limites))
+        # rótulos -> [contagem por faixa (não acumulada, a última é +Inf), soma]
+        self._series: Dict[tuple, list] = {}
+
+    def observar(self, valor: float, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        faixa = len(self.limites)
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                faixa = i
+                break
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][faixa] += 1
+            serie[1] += valor
+
+    def _amostras(self) -> List[str]:
+        with self._lock:
+            series = sorted((chave, list(contagens), soma) for chave, (contagens, soma) in self._series.items())
+        linhas = []
+        for chave, contagens, soma in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (math.inf,), contagens):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, ('le', _formatar_numero(limite)))
+                linhas.append(f'{self.nome}_bucket{rotulos} {acumulado}')
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f'{self.nome}_sum{rotulos} {_formatar_numero(soma)}')
+            linhas.append(f'{self.nome}_count{rotulos} {acumulado}')
+        return linhas
+
+
+class _Coletada(_Metrica):
+    """Valores lidos na hora do scrape de uma função (ex.: contadores que o cache já mantém)."""
+
+    def __init__(self, nome: str, ajuda: str, tipo: str, rotulos: Sequence[str], funcao: Callable[[], Iterable[Tuple[tuple, float]]]):
+        super().__init__(nome, ajuda, rotulos)
+        self.tipo = tipo
+        self._funcao = funcao
+
+    def _amostras(self) -> List[str]:
+        return [
+            f'{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}'
+            for chave, valor in self._funcao()
+        ]
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            if metrica.nome in self._metricas:
+                raise ValueError(f'Métrica já registrada: {metrica.nome}')
+            self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), limites: Sequence[float] = LIMITES_SEGUNDOS) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, rotulos, limites))
+
+    def coletada(self, nome: str, ajuda: str, tipo: str, rotulos: Sequence[str], funcao: Callable[[], Iterable[Tuple[tuple, float]]]) -> None:
+        """Registra uma métrica cujos valores (rótulos, valor) vêm de funcao a cada scrape."""
+        self._registrar(_Coletada(nome, ajuda, tipo, rotulos, funcao))
+
+    def exportar(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.exportar())
+        return '\n'.join(linhas) + '\n'
+
+
+registro = RegistroMetricas()
+
+DURACAO_ETAPA = registro.histograma(
+    'conversor_etapa_duracao_segundos', 'Duração de cada etapa da conversão', ('etapa',), LIMITES_SEGUNDOS
+)
+LINHAS_CONVERTIDAS = registro.histograma(
+    'conversor_linhas_convertidas', 'Linhas de saída por orçamento convertido', (), LIMITES_LINHAS
+)
+PRODUTOS_NAO_MAPEADOS = registro.histograma(
+    'conversor_produtos_nao_mapeados', 'Itens sem mapeamento por orçamento convertido', (), LIMITES_LINHAS
+)
+BYTES_ARQUIVOS = registro.histograma(
+    'conversor_arquivo_bytes', 'Tamanho dos orçamentos recebidos (entrada) e dos arquivos devolvidos (saida)',
+    ('direcao',), LIMITES_BYTES
+)
+CONVERSOES = registro.contador(
+    'conversor_conversoes_total', 'Orçamentos convertidos, por resultado', ('status',)
+)
+
+# Tempos (ms) da requisição atual, quando ela pediu X-Conversion-Timing
+_tempos_requisicao: contextvars.ContextVar = contextvars.ContextVar('tempos_requisicao', default=None)
+
+
+def iniciar_coleta_tempos() -> Dict[str, float]:
+    """Passa a acumular, para a requisição atual, os tempos medidos por medir_etapa."""
+    tempos: Dict[str, float] = {}
+    _tempos_requisicao.set(tempos)
+    return tempos
+
+
+def encerrar_coleta_tempos() -> Optional[Dict[str, float]]:
+    tempos = _tempos_requisicao.get()
+    _tempos_requisicao.set(None)
+    return tempos
+
+
+def registrar_etapa(etapa: str, duracao: float, tempos: Optional[dict] = None) -> None:
+    """
+    Registra a duração (em segundos) de uma etapa já medida.
+
+    Args:
+        etapa: valor do rótulo 'etapa' no histograma
+        duracao: duração em segundos
+        tempos: dict opcional que recebe a duração em ms (ex.: ResultadoConversao.tempos)
+    """
+    DURACAO_ETAPA.observar(duracao, etapa=etapa)
+    duracao_ms = round(duracao * 1000, 2)
+    if tempos is not None:
+        tempos[etapa] = duracao_ms
+    coleta = _tempos_requisicao.get()
+    if coleta is not None:
+        coleta[etapa] = round(coleta.get(etapa, 0) + duracao_ms, 2)
+
+
+@contextlib.contextmanager
+def medir_etapa(etapa: str, tempos: Optional[dict] = None) -> Iterator[None]:
+    """Mede a duração do bloco e a registra com registrar_etapa."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapa(etapa, time.perf_counter() - inicio, tempos)
+
+
+def valores_contadores(estatisticas: dict, chaves: Dict[str, str]) -> List[Tuple[tuple, float]]:
+    """(rótulos, valor) de contadores guardados em um dict de estatísticas; chaves: chave do dict -> rótulo."""
+    return [((rotulo,), estatisticas[chave]) for chave, rotulo in chaves.items() if chave in estatisticas]
+
+
+def formatar_tempos(tempos: Dict[str, float]) -> str:
+    """Tempos no formato do Server-Timing (etapa;dur=ms), usado em X-Conversion-Timing."""
+    return ', '.join(f'{etapa};dur={duracao}' for etapa, duracao in tempos.items())
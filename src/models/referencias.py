@@ -0,0 +1,63 @@
+from sqlalchemy.dialects import mysql
+
+from models.user import db
+
+
+def _texto_exato(tamanho):
+    """
+    VARCHAR comparado byte a byte também no MySQL: a collation padrão (*_ci) faria
+    'peça' = 'peca' e 'A' = 'a' nas buscas por chave, o que a busca nos xlsx não faz.
+    """
+    return db.String(tamanho).with_variant(mysql.VARCHAR(tamanho, collation='utf8mb4_bin'), 'mysql')
+
+
+class ProdutoCatalogo(db.Model):
+    """Linha da aba CATÁLOGO; a busca usa a chave normalizada (e a dobrada, sem acentos e pontuação)."""
+    __tablename__ = 'catalogo_produtos'
+
+    id = db.Column(db.Integer, primary_key=True)
+    posicao = db.Column(db.Integer, nullable=False)
+    modelo = db.Column(db.String(255))
+    chave = db.Column(_texto_exato(255), nullable=False, index=True)
+    chave_dobrada = db.Column(_texto_exato(255), nullable=False, index=True)
+    id_produto = db.Column(db.String(64))
+    descricao = db.Column(db.String(255))
+
+    def __repr__(self):
+        return f'<ProdutoCatalogo {self.modelo}>'
+
+
+class Cliente(db.Model):
+    """Linha da aba CLIENTES; nome_busca é o nome normalizado com dobrar=True, usado em /clientes?q=."""
+    __tablename__ = 'clientes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    posicao = db.Column(db.Integer, nullable=False, index=True)
+    id_cliente = db.Column(_texto_exato(64), nullable=False, index=True)
+    nome = db.Column(db.String(255))
+    nome_busca = db.Column(db.String(255), nullable=False, default='')
+
+    def __repr__(self):
+        return f'<Cliente {self.id_cliente}>'
+
+
+class ImportacaoReferencia(db.Model):
+    """Última importação de cada tipo ('catalogo', 'clientes'): versão, quando e o tipo da coluna ID na planilha."""
+    __tablename__ = 'importacoes_referencia'
+
+    tipo = db.Column(db.String(32), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    importado_em = db.Column(db.DateTime, nullable=False)
+    linhas = db.Column(db.Integer, nullable=False, default=0)
+    # Tipo (dtype.kind do pandas) da coluna ID: 'i' inteiro, 'f' decimal, 'O' texto
+    tipo_id = db.Column(db.String(1), nullable=False, default='O')
+    origem_sha256 = db.Column(db.String(64))
+
+    def to_dict(self):
+        return {
+            'tipo': self.tipo,
+            'versao': self.versao,
+            'importado_em': self.importado_em.isoformat() if self.importado_em else None,
+            'linhas': self.linhas,
+            'origem_sha256': self.origem_sha256,
+        }
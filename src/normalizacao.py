@@ -0,0 +1,72 @@
+"""
+Normalização de textos usada para comparar produtos, cabeçalhos e nomes.
+
+Modo padrão: minúsculas, sem espaços nas pontas e com espaços internos
+reduzidos a um só ('  Tela  IPHONE 11 ' -> 'tela iphone 11').
+
+Modo dobrado (dobrar=True): além do padrão, remove acentos e troca pontuação
+por espaço, para que 'Orçamento' e 'Orcamento' ou 'IP-5C' e 'IP 5C' fiquem
+iguais.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Quantidade de textos distintos lembrados por normalizar_texto (produtos se repetem muito entre orçamentos)
+TAMANHO_MEMO = 65536
+
+_RE_DIACRITICOS = re.compile(r'[\u0300-\u036f]')
+_RE_PONTUACAO = re.compile(r'[^\w\s]|_')
+
+
+@lru_cache(maxsize=TAMANHO_MEMO)
+def _normalizar_str(texto: str) -> str:
+    # split() sem argumento quebra nos mesmos caracteres que \s e já descarta as pontas
+    return ' '.join(texto.lower().split())
+
+
+@lru_cache(maxsize=TAMANHO_MEMO)
+def _normalizar_str_dobrado(texto: str) -> str:
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = _RE_DIACRITICOS.sub('', texto)
+    texto = _RE_PONTUACAO.sub(' ', texto)
+    return ' '.join(texto.split())
+
+
+def normalizar_texto(texto, dobrar: bool = False) -> str:
+    """Normaliza um valor qualquer para comparação; nulos viram ""."""
+    if pd.isna(texto):
+        return ""
+    if not isinstance(texto, str):
+        texto = str(texto)
+    return _normalizar_str_dobrado(texto) if dobrar else _normalizar_str(texto)
+
+
+def normalizar_serie(serie: pd.Series, dobrar: bool = False) -> pd.Series:
+    """
+    Versão vetorizada de normalizar_texto para uma coluna inteira.
+
+    Cada texto distinto é normalizado uma única vez e o resultado é espalhado
+    pelas linhas, o que é bem mais rápido que operações .str linha a linha
+    quando os produtos se repetem.
+    """
+    nulos = serie.isna().values
+    codigos, distintos = pd.factorize(serie.astype(str).values)
+    funcao = _normalizar_str_dobrado if dobrar else _normalizar_str
+    normalizados = np.array([funcao(texto) for texto in distintos], dtype=object)
+    resultado = normalizados[codigos] if len(codigos) else np.array([], dtype=object)
+    resultado[nulos] = ''
+    return pd.Series(resultado, index=serie.index, dtype=object)
+
+
+def estatisticas_memo() -> dict:
+    """Acertos/faltas do memo de normalizar_texto nos dois modos."""
+    padrao = _normalizar_str.cache_info()
+    dobrado = _normalizar_str_dobrado.cache_info()
+    return {
+        'padrao': {'acertos': padrao.hits, 'faltas': padrao.misses, 'tamanho': padrao.currsize},
+        'dobrado': {'acertos': dobrado.hits, 'faltas': dobrado.misses, 'tamanho': dobrado.currsize},
+    }
@@ -0,0 +1,26 @@
+"""
+Nomes dos arquivos de referência, modos de escrita do xlsx e opções padrão da conversão.
+
+Só usa a biblioteca padrão: main.py lê esses valores ao ser importado sem
+carregar pandas, openpyxl e o conversor, que ficam para o primeiro uso.
+conversor_olist e saida_xlsx importam daqui e continuam expondo os mesmos nomes.
+"""
+import os
+
+# Nomes dos arquivos de referência na pasta de dados
+ARQUIVO_CATALOGO = "PLanilha mapeamento Orçamento Olist.xlsx"
+ARQUIVO_CLIENTES = "clientes.xlsx"
+ARQUIVO_MODELO_SAIDA = "formato Olist(SAIDA).xlsx"
+
+# Com CONVERSOR_DOBRAR_ACENTOS=1, produtos sem correspondência exata são procurados de novo
+# ignorando acentos e pontuação (ex.: 'Orcamento' x 'Orçamento', 'IP 5C' x 'IP-5C')
+DOBRAR_ACENTOS_PADRAO = os.environ.get('CONVERSOR_DOBRAR_ACENTOS', '0').lower() in ('1', 'true', 'sim')
+
+# Com CONVERSOR_APROXIMADO=1, produtos ainda sem correspondência são comparados por semelhança com o
+# catálogo: o melhor candidato é aceito se a nota passar do limiar e os demais viram sugestões
+APROXIMADO_PADRAO = os.environ.get('CONVERSOR_APROXIMADO', '0').lower() in ('1', 'true', 'sim')
+
+# Modos de escrita do xlsx de saída
+MODO_OPENPYXL = 'openpyxl'      # pd.ExcelWriter com o modelo de objetos completo do openpyxl
+MODO_STREAMING = 'write_only'   # Workbook(write_only=True): linhas gravadas em fluxo, sem manter as células
+MODOS_ESCRITA = (MODO_OPENPYXL, MODO_STREAMING)
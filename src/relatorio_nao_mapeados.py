@@ -0,0 +1,62 @@
+"""
+Contagem, por processo, dos produtos que mais ficam sem mapeamento.
+
+Cada conversão registra os seus produtos não mapeados (normalizados); a
+contagem acumulada mostra quais modelos faltam na planilha de mapeamento.
+Para a memória não crescer sem limite, quando passa de max_produtos a
+contagem é podada para os produtos mais frequentes.
+"""
+import threading
+from collections import Counter
+from typing import Iterable, List
+
+MAX_PRODUTOS_CONTADOS = 5000
+
+
+class ContadorNaoMapeados:
+    def __init__(self, max_produtos: int = MAX_PRODUTOS_CONTADOS):
+        self.max_produtos = max_produtos
+        self._contagem: Counter = Counter()
+        # Um exemplo de como o produto veio escrito no orçamento, para exibição
+        self._exemplos = {}
+        self._lock = threading.Lock()
+        self.conversoes = 0
+        self.ocorrencias = 0
+
+    def registrar(self, nao_mapeados: Iterable[dict]) -> None:
+        """Soma os itens de ResultadoConversao.nao_mapeados de uma conversão."""
+        itens = [item for item in nao_mapeados if item.get('produto_normalizado')]
+        with self._lock:
+            self.conversoes += 1
+            self.ocorrencias += len(itens)
+            for item in itens:
+                chave = item['produto_normalizado']
+                self._contagem[chave] += 1
+                self._exemplos.setdefault(chave, str(item['produto']).strip())
+            if len(self._contagem) > self.max_produtos:
+                # Mantém metade do limite, para não podar a cada registro
+                self._contagem = Counter(dict(self._contagem.most_common(self.max_produtos // 2)))
+                self._exemplos = {chave: self._exemplos[chave] for chave in self._contagem}
+
+    def mais_frequentes(self, quantidade: int = 20) -> List[dict]:
+        with self._lock:
+            return [
+                {'produto_normalizado': chave, 'exemplo': self._exemplos.get(chave), 'ocorrencias': total}
+                for chave, total in self._contagem.most_common(quantidade)
+            ]
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._contagem.clear()
+            self._exemplos.clear()
+            self.conversoes = 0
+            self.ocorrencias = 0
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                'conversoes': self.conversoes,
+                'ocorrencias': self.ocorrencias,
+                'produtos_distintos': len(self._contagem),
+                'max_produtos': self.max_produtos,
+            }
@@ -0,0 +1,113 @@
+import zlib
+from typing import Iterator
+
+import pandas as pd
+
+# Formatos de texto da saída (além do xlsx), gerados em blocos de linhas
+FORMATO_XLSX = 'xlsx'
+FORMATOS_TEXTO = {
+    # formato: (extensão, mimetype)
+    'csv': ('csv', 'text/csv'),
+    'tsv': ('tsv', 'text/tab-separated-values'),
+    'jsonl': ('jsonl', 'application/x-ndjson'),
+}
+FORMATOS_SAIDA = (FORMATO_XLSX,) + tuple(FORMATOS_TEXTO)
+
+# Linhas do DataFrame convertidas por bloco enviado ao cliente
+LINHAS_POR_BLOCO = 1000
+
+# Resultados de pd.api.types.infer_dtype para colunas só com números
+_TIPOS_NUMERICOS = ('floating', 'integer', 'mixed-integer-float')
+# ... e para colunas object só com datas (datetime.date, datetime.datetime ou pd.Timestamp)
+_TIPOS_DATA = ('date', 'datetime', 'datetime64')
+_LIMITE_INT64 = 2.0 ** 63
+
+
+def _preparar_colunas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ajusta os tipos para o texto sair como o valor aparece no xlsx: colunas numéricas
+    só com valores inteiros (IDs com linhas vazias, por exemplo) saem sem '.0' e
+    datas sem horário, só com a data.
+
+    Colunas de datas, datetime64 ou object com datetime.date/datetime, viram texto
+    aqui, para que CSV e JSON Lines tragam o mesmo valor (o to_json escreveria
+    00:00:00 e o to_csv não formataria as de tipo object).
+    """
+    ajustadas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if not isinstance(serie, pd.Series):  # coluna duplicada
+            continue
+        preenchidos = serie.dropna()
+        if preenchidos.empty:
+            continue
+        if pd.api.types.infer_dtype(preenchidos, skipna=False) in _TIPOS_NUMERICOS:
+            numeros = preenchidos.astype(float)
+            # Inteiros fora do int64 (ex.: 1e20) ficam como estão: o Int64 não os representa
+            if (
+                not pd.api.types.is_integer_dtype(serie) and (numeros % 1 == 0).all()
+                and numeros.abs().max() < _LIMITE_INT64
+            ):
+                ajustadas[coluna] = serie.astype(object).where(serie.notna(), None).astype('Int64')
+        elif pd.api.types.is_datetime64_dtype(serie) or (
+            serie.dtype == object and pd.api.types.infer_dtype(preenchidos, skipna=False) in _TIPOS_DATA
+        ):
+            try:
+                datas = pd.to_datetime(preenchidos)
+            except (ValueError, TypeError):  # ex.: datas com e sem fuso horário misturadas
+                continue
+            formato = '%Y-%m-%d' if (datas == datas.dt.normalize()).all() else '%Y-%m-%d %H:%M:%S'
+            ajustadas[coluna] = datas.dt.strftime(formato).reindex(serie.index)
+    return df.assign(**ajustadas) if ajustadas else df
+
+
+def _bloco_texto(df: pd.DataFrame, formato: str, cabecalho: bool) -> str:
+    if formato == 'jsonl':
+        if df.empty:
+            return ''
+        texto = df.to_json(orient='records', lines=True, date_format='iso', force_ascii=False)
+        return texto if texto.endswith('\n') else texto + '\n'
+    return df.to_csv(
+        sep='\t' if formato == 'tsv' else ',',
+        index=False,
+        header=cabecalho,
+        lineterminator='\n',
+        date_format='%Y-%m-%d',
+    )
+
+
+def gerar_texto(df: pd.DataFrame, formato: str, linhas_por_bloco: int = LINHAS_POR_BLOCO) -> Iterator[bytes]:
+    """
+    Gera o DataFrame em CSV, TSV ou JSON Lines (UTF-8), um bloco de linhas por vez.
+
+    As colunas saem na ordem do DataFrame (a do modelo de saída). No CSV e no TSV
+    a primeira linha é o cabeçalho e valores nulos ficam vazios; no JSON Lines cada
+    linha é um objeto, com null para os nulos. Datas saem como AAAA-MM-DD (com
+    horário, AAAA-MM-DD HH:MM:SS).
+
+    Os tipos das colunas são ajustados nesta chamada, antes do primeiro bloco: um
+    erro aqui é levantado antes de a resposta começar a ser enviada, e o gerador
+    devolvido só serializa.
+    """
+    if formato not in FORMATOS_TEXTO:
+        raise ValueError(f"Formato de saída inválido: {formato}")
+    return _blocos_texto(_preparar_colunas(df), formato, linhas_por_bloco)
+
+
+def _blocos_texto(df: pd.DataFrame, formato: str, linhas_por_bloco: int) -> Iterator[bytes]:
+    if df.empty and formato != 'jsonl':
+        yield _bloco_texto(df, formato, cabecalho=True).encode('utf-8')
+        return
+    for inicio in range(0, len(df), linhas_por_bloco):
+        bloco = df.iloc[inicio:inicio + linhas_por_bloco]
+        yield _bloco_texto(bloco, formato, cabecalho=inicio == 0).encode('utf-8')
+
+
+def comprimir_gzip(blocos: Iterator[bytes], nivel: int = 6) -> Iterator[bytes]:
+    """Comprime em gzip, em fluxo, os blocos de bytes gerados por gerar_texto."""
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for bloco in blocos:
+        comprimido = compressor.compress(bloco)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
@@ -0,0 +1,142 @@
+import datetime
+import math
+from typing import BinaryIO, Dict, Optional, Union
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+from correspondencia_aproximada import tabela_sugestoes
+# Modos de escrita do xlsx de saída (definidos à parte para main.py validar a configuração sem o openpyxl)
+from opcoes_conversao import MODO_OPENPYXL, MODO_STREAMING, MODOS_ESCRITA  # noqa: F401
+
+# Aba extra com as sugestões da busca aproximada de produtos
+ABA_SUGESTOES = 'Sugestões'
+# Aba extra com o relatório dos produtos não mapeados
+ABA_NAO_MAPEADOS = 'Não mapeados'
+
+# Mesmos formatos e estilo de cabeçalho usados pelo pandas ao exportar com openpyxl
+FORMATO_DATA = 'YYYY-MM-DD'
+FORMATO_DATA_HORA = 'YYYY-MM-DD HH:MM:SS'
+_LADO_FINO = Side(style='thin')
+_FONTE_CABECALHO = Font(bold=True)
+_BORDA_CABECALHO = Border(left=_LADO_FINO, right=_LADO_FINO, top=_LADO_FINO, bottom=_LADO_FINO)
+_ALINHAMENTO_CABECALHO = Alignment(horizontal='center', vertical='top')
+
+
+def _valor_celula(valor):
+    """Converte um valor do DataFrame para (valor, formato) como o pandas faria ao exportar."""
+    if pd.api.types.is_scalar(valor) and pd.isna(valor):
+        return '', None
+    if pd.api.types.is_integer(valor):
+        return int(valor), None
+    if pd.api.types.is_float(valor):
+        if math.isinf(valor):
+            return ('inf' if valor > 0 else '-inf'), None
+        return float(valor), None
+    if pd.api.types.is_bool(valor):
+        return bool(valor), None
+    if isinstance(valor, datetime.datetime):
+        if valor.tzinfo is not None:
+            raise ValueError("Excel não suporta datas com fuso horário.")
+        return valor, FORMATO_DATA_HORA
+    if isinstance(valor, datetime.date):
+        return valor, FORMATO_DATA
+    if isinstance(valor, datetime.timedelta):
+        return valor.total_seconds() / 86400, '0'
+    return str(valor), None
+
+
+def _escrever_aba_streaming(wb: Workbook, df: pd.DataFrame, sheet_name: str) -> None:
+    ws = wb.create_sheet(title=sheet_name)
+
+    cabecalho = []
+    for coluna in df.columns:
+        celula = WriteOnlyCell(ws, value=str(coluna))
+        celula.font = _FONTE_CABECALHO
+        celula.border = _BORDA_CABECALHO
+        celula.alignment = _ALINHAMENTO_CABECALHO
+        cabecalho.append(celula)
+    ws.append(cabecalho)
+
+    for linha in df.itertuples(index=False, name=None):
+        celulas = []
+        for valor in linha:
+            valor, formato = _valor_celula(valor)
+            if formato is None:
+                celulas.append(valor)
+            else:
+                celula = WriteOnlyCell(ws, value=valor)
+                celula.number_format = formato
+                celulas.append(celula)
+        ws.append(celulas)
+
+
+def escrever_xlsx_abas(
+    abas: Dict[str, pd.DataFrame],
+    destino: Union[str, BinaryIO],
+    modo: str = MODO_OPENPYXL
+) -> None:
+    """
+    Grava vários DataFrames em um xlsx, uma aba por DataFrame (na ordem do dict), sem índice.
+
+    Args:
+        abas: Dict nome da aba -> DataFrame
+        destino: Caminho ou objeto binário (ex.: BytesIO) de destino
+        modo: MODO_OPENPYXL (padrão) ou MODO_STREAMING
+    """
+    if modo == MODO_OPENPYXL:
+        with pd.ExcelWriter(destino, engine='openpyxl') as writer:
+            for sheet_name, df in abas.items():
+                df.to_excel(writer, index=False, sheet_name=sheet_name)
+    elif modo == MODO_STREAMING:
+        wb = Workbook(write_only=True)
+        for sheet_name, df in abas.items():
+            _escrever_aba_streaming(wb, df, sheet_name)
+        wb.save(destino)
+    else:
+        raise ValueError(f"Modo de escrita xlsx inválido: '{modo}'. Use um de {MODOS_ESCRITA}")
+
+
+def escrever_xlsx(
+    df: pd.DataFrame,
+    destino: Union[str, BinaryIO],
+    modo: str = MODO_OPENPYXL,
+    sheet_name: str = 'Sheet1'
+) -> None:
+    """
+    Grava o DataFrame convertido em xlsx, sem índice.
+
+    Args:
+        df: DataFrame a ser gravado
+        destino: Caminho ou objeto binário (ex.: BytesIO) de destino
+        modo: MODO_OPENPYXL (padrão) ou MODO_STREAMING, que produz o mesmo
+            conteúdo e tipos de célula com bem menos memória e tempo
+        sheet_name: Nome da aba
+    """
+    escrever_xlsx_abas({sheet_name: df}, destino, modo=modo)
+
+
+def escrever_orcamento_convertido(
+    df: pd.DataFrame,
+    destino: Union[str, BinaryIO],
+    modo: str = MODO_OPENPYXL,
+    abas_extras: Optional[Dict[str, pd.DataFrame]] = None
+) -> None:
+    """
+    Grava o orçamento convertido na aba Sheet1, como escrever_xlsx.
+
+    Se a conversão usou a busca aproximada e deixou sugestões em
+    df.attrs['sugestoes_aproximadas'], elas vão para a aba ABA_SUGESTOES.
+    Abas em abas_extras (nome -> DataFrame) são gravadas em seguida.
+    """
+    sugestoes = df.attrs.get('sugestoes_aproximadas')
+    if not sugestoes and not abas_extras:
+        escrever_xlsx(df, destino, modo=modo)
+        return
+    abas = {'Sheet1': df}
+    if sugestoes:
+        abas[ABA_SUGESTOES] = tabela_sugestoes(sugestoes)
+    abas.update(abas_extras or {})
+    escrever_xlsx_abas(abas, destino, modo=modo)
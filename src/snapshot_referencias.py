@@ -0,0 +1,147 @@
+"""
+Snapshots pré-compilados dos arquivos de referência.
+
+Ao lado de cada xlsx de referência (ex.: src/data/clientes.xlsx) fica um
+arquivo <nome>.xlsx.snapshot.pkl com o resultado já lido e normalizado
+(catálogo indexado, DataFrame de clientes, colunas do modelo de saída) e o
+SHA-256 do xlsx de origem. Carregar o snapshot leva milissegundos; se o hash
+não bater com o xlsx atual, o snapshot é considerado desatualizado e o xlsx é
+lido e recompilado.
+
+Uso pela linha de comando (a partir da raiz do projeto):
+    python src/snapshot_referencias.py              # recompila todos os snapshots
+    python src/snapshot_referencias.py --verificar  # só informa quais estão desatualizados
+"""
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import sys
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o formato dos objetos guardados mudar
+VERSAO_SNAPSHOT = 3
+SUFIXO_SNAPSHOT = '.snapshot.pkl'
+
+
+def caminho_snapshot(caminho_xlsx: str) -> str:
+    return caminho_xlsx + SUFIXO_SNAPSHOT
+
+
+def hash_arquivo(caminho: str) -> str:
+    """SHA-256 (hex) do conteúdo do arquivo."""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _cabecalho(tipo: str, sha256: str) -> dict:
+    return {
+        'versao': VERSAO_SNAPSHOT,
+        'pandas': pd.__version__,
+        'tipo': tipo,
+        'sha256': sha256,
+    }
+
+
+def compilar_snapshot(caminho_xlsx: str, tipo: str, leitor: Callable[[str], Any]) -> Any:
+    """
+    Lê o xlsx com o leitor informado e grava o snapshot correspondente.
+
+    Returns:
+        O valor lido (o mesmo que foi gravado no snapshot)
+    """
+    sha256 = hash_arquivo(caminho_xlsx)
+    valor = leitor(caminho_xlsx)
+    destino = caminho_snapshot(caminho_xlsx)
+    temporario = f'{destino}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as f:
+        pickle.dump(_cabecalho(tipo, sha256), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, destino)
+    return valor
+
+
+def _ler_cabecalho(f) -> Optional[dict]:
+    try:
+        cabecalho = pickle.load(f)
+    except Exception:
+        return None
+    return cabecalho if isinstance(cabecalho, dict) else None
+
+
+def snapshot_atualizado(caminho_xlsx: str, tipo: str, sha256: Optional[str] = None) -> bool:
+    """Indica se existe snapshot compatível e gerado a partir do conteúdo atual do xlsx."""
+    try:
+        with open(caminho_snapshot(caminho_xlsx), 'rb') as f:
+            cabecalho = _ler_cabecalho(f)
+    except FileNotFoundError:
+        return False
+    if sha256 is None:
+        sha256 = hash_arquivo(caminho_xlsx)
+    return cabecalho == _cabecalho(tipo, sha256)
+
+
+def carregar_snapshot(caminho_xlsx: str, tipo: str) -> Optional[Any]:
+    """Valor guardado no snapshot, ou None se ele não existir ou estiver desatualizado."""
+    sha256 = hash_arquivo(caminho_xlsx)
+    try:
+        with open(caminho_snapshot(caminho_xlsx), 'rb') as f:
+            if _ler_cabecalho(f) != _cabecalho(tipo, sha256):
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning('Snapshot ilegível para %s: %s', caminho_xlsx, e)
+        return None
+
+
+def carregar_com_snapshot(caminho_xlsx: str, tipo: str, leitor: Callable[[str], Any]) -> Any:
+    """Usa o snapshot se estiver atualizado; senão lê o xlsx e (re)compila o snapshot."""
+    valor = carregar_snapshot(caminho_xlsx, tipo)
+    if valor is not None:
+        return valor
+    try:
+        return compilar_snapshot(caminho_xlsx, tipo, leitor)
+    except OSError as e:
+        # Pasta somente leitura (ex.: serverless): segue sem snapshot
+        logger.warning('Não foi possível gravar snapshot de %s: %s', caminho_xlsx, e)
+        return leitor(caminho_xlsx)
+
+
+def main(argv=None) -> int:
+    from conversor_olist import LEITORES_REFERENCIA
+
+    data_dir_padrao = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    parser = argparse.ArgumentParser(description='Recompila ou verifica os snapshots dos arquivos de referência.')
+    parser.add_argument('--data-dir', default=data_dir_padrao, help='Pasta com os xlsx de referência')
+    parser.add_argument('--verificar', action='store_true', help='Apenas verifica; sai com código 1 se algum estiver desatualizado')
+    args = parser.parse_args(argv)
+
+    desatualizados = 0
+    for tipo, (nome_arquivo, leitor) in LEITORES_REFERENCIA.items():
+        caminho_xlsx = os.path.join(args.data_dir, nome_arquivo)
+        if not os.path.exists(caminho_xlsx):
+            print(f"{tipo}: {caminho_xlsx} não encontrado")
+            desatualizados += 1
+            continue
+        if args.verificar:
+            atualizado = snapshot_atualizado(caminho_xlsx, tipo)
+            desatualizados += 0 if atualizado else 1
+            print(f"{tipo}: {'atualizado' if atualizado else 'DESATUALIZADO'} ({caminho_snapshot(caminho_xlsx)})")
+        else:
+            compilar_snapshot(caminho_xlsx, tipo, leitor)
+            print(f"{tipo}: snapshot gravado em {caminho_snapshot(caminho_xlsx)}")
+    return 1 if desatualizados else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
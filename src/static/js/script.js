@@ -3,6 +3,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const usarArquivoExcelBtn = document.getElementById("usar-arquivo-excel-btn");
     const arquivoExcelInput = document.getElementById("arquivo-excel-input");
     const processarBtn = document.getElementById("processar-btn");
+    const previaBtn = document.getElementById("previa-btn");
     const previewArea = document.getElementById("preview-area");
     const uploadArea = document.getElementById("upload-area");
     const fileNameDisplay = document.getElementById("file-name-display");
@@ -166,6 +167,79 @@ document.addEventListener("DOMContentLoaded", () => {
             });
     });
 
+    // Prévia: converte no servidor sem gerar o xlsx e mostra as primeiras linhas
+    const LINHAS_PREVIA = 20;
+
+    function escaparHtml(valor) {
+        if (valor === null || valor === undefined) return "";
+        return String(valor)
+            .replace(/&/g, "&amp;")
+            .replace(/</g, "&lt;")
+            .replace(/>/g, "&gt;")
+            .replace(/"/g, "&quot;");
+    }
+
+    function mostrarPrevia(dados) {
+        const meta = dados.metadados || {};
+        const colunas = dados.colunas || [];
+        let html = "<div class='previa-resumo'>";
+        html += `<p><strong>Orçamento:</strong> ${escaparHtml(meta.numero_proposta) || "-"} &middot; <strong>Data:</strong> ${escaparHtml(meta.data) || "-"}</p>`;
+        html += `<p><strong>Aba:</strong> ${escaparHtml(meta.aba)} &middot; <strong>Cabeçalho dos itens:</strong> linha ${escaparHtml(meta.linha_cabecalho)}${meta.cabecalho_detectado ? "" : " (não detectado)"}</p>`;
+        html += `<p><strong>Linhas convertidas:</strong> ${dados.total} &middot; <strong>Não mapeadas:</strong> ${dados.contagens.nao_mapeadas}</p>`;
+        if (dados.total > dados.linhas.length) {
+            html += `<p>Mostrando as primeiras ${dados.linhas.length} linhas.</p>`;
+        }
+        html += "</div>";
+        if (dados.linhas.length > 0) {
+            html += "<div class='previa-tabela-container'><table class='previa-tabela'><thead><tr>";
+            html += colunas.map(coluna => `<th>${escaparHtml(coluna)}</th>`).join("");
+            html += "</tr></thead><tbody>";
+            dados.linhas.forEach(linha => {
+                html += "<tr>" + colunas.map(coluna => `<td>${escaparHtml(linha[coluna])}</td>`).join("") + "</tr>";
+            });
+            html += "</tbody></table></div>";
+        }
+        if (dados.nao_mapeados.length > 0) {
+            html += "<div class='previa-nao-mapeados'><p><strong>Produtos não mapeados:</strong></p><ul>";
+            dados.nao_mapeados.forEach(item => {
+                html += `<li>Linha ${item.linha}: ${escaparHtml(item.produto)}</li>`;
+            });
+            html += "</ul></div>";
+        }
+        previewArea.innerHTML = html;
+    }
+
+    previaBtn.addEventListener("click", () => {
+        const clienteId = clienteSelect.value;
+        if (!clienteId) {
+            previewArea.innerHTML = "<p style='color:red;'>Por favor, selecione um cliente.</p>";
+            return;
+        }
+        if (!arquivoSelecionado) {
+            previewArea.innerHTML = "<p style='color:red;'>Por favor, selecione um arquivo Excel de orçamento.</p>";
+            return;
+        }
+        previewArea.innerHTML = "<p>Gerando prévia...</p>";
+        const formData = new FormData();
+        formData.append("cliente_id", clienteId);
+        formData.append("arquivo_excel", arquivoSelecionado);
+        formData.append("previa", "1");
+        formData.append("limit", String(LINHAS_PREVIA));
+        fetch("/processar", { method: "POST", body: formData })
+            .then(response => response.json().then(dados => {
+                if (!response.ok || dados.error) {
+                    const detalhe = dados.details && dados.details.message ? `: ${dados.details.message}` : "";
+                    throw new Error((dados.error || "Erro no servidor ao gerar a prévia") + detalhe);
+                }
+                return dados;
+            }))
+            .then(mostrarPrevia)
+            .catch(error => {
+                console.error("Erro na prévia do orçamento:", error);
+                previewArea.innerHTML = `<p style='color:red;'>Erro na prévia do orçamento: ${escaparHtml(error.message)}</p>`;
+            });
+    });
+
     // Lógica para upload de arquivos de mapeamento
     clientesFileInput.addEventListener("change", (event) => {
         if (event.target.files.length > 0) {
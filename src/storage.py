@@ -1,37 +1,465 @@
-import os
+"""
+Camada de E/S dos arquivos do conversor: referências, uploads e resultados.
+
+O StorageHandler guarda arquivos endereçados por conteúdo: cada um é guardado
+uma vez, sob o SHA-256 do seu conteúdo (objetos/ab/abcdef...); guardar de novo
+o mesmo conteúdo não grava nada. Além dos objetos há arquivos nomeados
+pequenos (ex.: o manifesto de versões), que podem ser sobrescritos. São
+guardados assim as versões dos arquivos de referência enviados e os xlsx dos
+jobs assíncronos.
+
+Ele também define as pastas locais do servidor, onde ficam os arquivos que
+precisam de um caminho no disco:
+    pasta de dados: arquivos de referência ativos e suas versões
+    pasta de trabalho: uploads grandes (arquivos temporários), status e
+        orçamentos dos jobs e a camada em disco do cache de resultados
+
+O StorageHandler fica na frente de um backend:
+    BackendLocal: uma pasta no disco (objetos gravados e baixados por cópia,
+        nunca por hard link, para que escrever num arquivo de dados não altere
+        o objeto guardado)
+    BackendS3: um bucket S3 ou compatível (MinIO, R2...), para que os uploads
+        sobrevivam aos discos efêmeros do Render e da Vercel. Precisa do boto3,
+        que é opcional; com endpoint file:///pasta, usa ClienteS3Local, que
+        imita o S3 numa pasta local (útil para testar sem um bucket)
+
+Os bytes lidos ficam num cache em memória limitado por tamanho, e ler()
+devolve um memoryview deles, sem cópia.
+"""
+import contextlib
+import hashlib
 import io
-from pathlib import Path
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Union
+
+from upload_xlsx import criar_stream_upload
+
+PREFIXO_OBJETOS = 'objetos'
+PREFIXO_NOMES = 'nomes'
+# Pasta padrão do BackendLocal dentro da pasta de dados
+PASTA_ARMAZENAMENTO = 'armazenamento'
+
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+_TAMANHO_BLOCO = 1024 * 1024
+
+
+def _chave_objeto(sha256: str) -> str:
+    if not _SHA256_RE.match(sha256):
+        raise ValueError(f'SHA-256 inválido: {sha256!r}')
+    return f'{PREFIXO_OBJETOS}/{sha256[:2]}/{sha256}'
+
+
+def _chave_nome(nome: str) -> str:
+    partes = nome.split('/')
+    if not nome or any(parte in ('', '.', '..') for parte in partes):
+        raise ValueError(f'Nome inválido: {nome!r}')
+    return f'{PREFIXO_NOMES}/{nome}'
+
+
+def _temporario(destino: str) -> str:
+    return f'{destino}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def _gravar_atomico(destino: str, dados: Union[bytes, memoryview]) -> None:
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = _temporario(destino)
+    try:
+        with open(temporario, 'wb') as f:
+            f.write(dados)
+        os.replace(temporario, destino)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporario)
+
+
+def copiar_atomico(origem: str, destino: str) -> None:
+    """
+    Coloca uma cópia de origem em destino de forma atômica (cópia para um temporário e os.replace).
+
+    Sempre copia, nunca usa hard link: os arquivos ativos podem ser
+    sobrescritos no lugar (ex.: cp por cima de clientes.xlsx), e um link
+    faria a escrita alterar também a versão ou o objeto guardado. O destino
+    ganha mtime novo, o que muda a assinatura vista pelo cache de referências.
+    """
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = _temporario(destino)
+    try:
+        shutil.copyfile(origem, temporario)
+        os.replace(temporario, destino)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporario)
+
+
+def sha256_stream(stream: BinaryIO) -> str:
+    """SHA-256 (hex) do conteúdo do stream, lido desde o início."""
+    sha = hashlib.sha256()
+    stream.seek(0)
+    for bloco in iter(lambda: stream.read(_TAMANHO_BLOCO), b''):
+        sha.update(bloco)
+    stream.seek(0)
+    return sha.hexdigest()
+
+
+class BackendLocal:
+    """Objetos gravados como arquivos dentro de uma pasta (a chave é o caminho relativo)."""
+
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+
+    def caminho(self, chave: str) -> str:
+        return os.path.join(self.pasta, *chave.split('/'))
+
+    def existe(self, chave: str) -> bool:
+        return os.path.exists(self.caminho(chave))
+
+    def ler(self, chave: str) -> bytes:
+        with open(self.caminho(chave), 'rb') as f:
+            return f.read()
+
+    def gravar(self, chave: str, dados: Union[bytes, memoryview]) -> None:
+        _gravar_atomico(self.caminho(chave), dados)
+
+    def gravar_arquivo(self, chave: str, caminho: str) -> None:
+        copiar_atomico(caminho, self.caminho(chave))
+
+    def baixar(self, chave: str, destino: str) -> None:
+        if not self.existe(chave):
+            raise FileNotFoundError(f'Objeto não encontrado: {chave}')
+        copiar_atomico(self.caminho(chave), destino)
+
+    def remover(self, chave: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.caminho(chave))
+
+    def descricao(self) -> dict:
+        return {'tipo': 'local', 'pasta': self.pasta}
+
+
+class ErroClienteS3Local(Exception):
+    """Erro no formato do botocore.exceptions.ClientError (response['Error']['Code'])."""
+
+    def __init__(self, codigo: str, chave: str):
+        super().__init__(f'{codigo}: {chave}')
+        self.response = {'Error': {'Code': codigo, 'Key': chave}}
+
+
+class ClienteS3Local:
+    """
+    Subconjunto do cliente S3 do boto3 usado pelo BackendS3, guardando os objetos numa pasta.
+
+    Cada bucket é uma subpasta. Serve para testar o BackendS3 sem um bucket de verdade.
+    """
+
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+
+    def _caminho(self, bucket: str, chave: str) -> str:
+        return os.path.join(self.pasta, bucket, *chave.split('/'))
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        try:
+            return {'ContentLength': os.path.getsize(self._caminho(Bucket, Key))}
+        except FileNotFoundError:
+            raise ErroClienteS3Local('404', Key) from None
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        try:
+            with open(self._caminho(Bucket, Key), 'rb') as f:
+                return {'Body': io.BytesIO(f.read())}
+        except FileNotFoundError:
+            raise ErroClienteS3Local('NoSuchKey', Key) from None
+
+    def put_object(self, Bucket: str, Key: str, Body) -> dict:
+        dados = Body.read() if hasattr(Body, 'read') else Body
+        _gravar_atomico(self._caminho(Bucket, Key), dados)
+        return {}
+
+    def delete_object(self, Bucket: str, Key: str) -> dict:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._caminho(Bucket, Key))
+        return {}
+
+
+def _nao_encontrado(erro: Exception) -> bool:
+    codigo = getattr(erro, 'response', {}).get('Error', {}).get('Code')
+    return codigo in ('404', 'NoSuchKey', 'NotFound')
+
+
+class BackendS3:
+    """
+    Objetos num bucket S3 ou compatível, sob um prefixo opcional.
+
+    Args:
+        bucket: nome do bucket
+        prefixo: prefixo das chaves dentro do bucket (ex.: 'conversor/')
+        endpoint_url: endpoint de um serviço compatível; 'file:///pasta' usa o ClienteS3Local
+        cliente: cliente com a interface do boto3 (put_object, get_object, head_object,
+            delete_object); sem ele, é criado no primeiro uso de cada processo
+    """
+
+    def __init__(self, bucket: str, prefixo: str = '', endpoint_url: Optional[str] = None, cliente=None):
+        self.bucket = bucket
+        self.prefixo = prefixo.strip('/') + '/' if prefixo.strip('/') else ''
+        self.endpoint_url = endpoint_url
+        self._cliente = cliente
+        self._cliente_informado = cliente is not None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # Conexões do boto3 não devem ser compartilhadas entre processos
+            os.register_at_fork(after_in_child=self._descartar_cliente)
+
+    def _descartar_cliente(self) -> None:
+        if not self._cliente_informado:
+            self._cliente = None
+
+    def _obter_cliente(self):
+        if self._cliente is None:
+            with self._lock:
+                if self._cliente is None:
+                    if self.endpoint_url and self.endpoint_url.startswith('file://'):
+                        self._cliente = ClienteS3Local(self.endpoint_url[len('file://'):])
+                    else:
+                        try:
+                            import boto3
+                        except ImportError as e:
+                            raise RuntimeError('O armazenamento S3 precisa do boto3 (pip install boto3)') from e
+                        self._cliente = boto3.client('s3', endpoint_url=self.endpoint_url)
+        return self._cliente
+
+    def _chave(self, chave: str) -> str:
+        return self.prefixo + chave
+
+    def existe(self, chave: str) -> bool:
+        try:
+            self._obter_cliente().head_object(Bucket=self.bucket, Key=self._chave(chave))
+            return True
+        except Exception as e:
+            if _nao_encontrado(e):
+                return False
+            raise
+
+    def ler(self, chave: str) -> bytes:
+        try:
+            resposta = self._obter_cliente().get_object(Bucket=self.bucket, Key=self._chave(chave))
+        except Exception as e:
+            if _nao_encontrado(e):
+                raise FileNotFoundError(f'Objeto não encontrado: {chave}') from e
+            raise
+        return resposta['Body'].read()
+
+    def gravar(self, chave: str, dados: Union[bytes, memoryview]) -> None:
+        self._obter_cliente().put_object(Bucket=self.bucket, Key=self._chave(chave), Body=bytes(dados))
+
+    def gravar_arquivo(self, chave: str, caminho: str) -> None:
+        with open(caminho, 'rb') as f:
+            self._obter_cliente().put_object(Bucket=self.bucket, Key=self._chave(chave), Body=f)
+
+    def baixar(self, chave: str, destino: str) -> None:
+        _gravar_atomico(destino, self.ler(chave))
+
+    def remover(self, chave: str) -> None:
+        self._obter_cliente().delete_object(Bucket=self.bucket, Key=self._chave(chave))
+
+    def descricao(self) -> dict:
+        return {'tipo': 's3', 'bucket': self.bucket, 'prefixo': self.prefixo, 'endpoint_url': self.endpoint_url}
+
 
 class StorageHandler:
-    def __init__(self):
-        self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        
-    def get_file_path(self, filename):
-        """Get the full path for a file in the src directory."""
-        return os.path.join(self.base_dir, filename)
-    
-    def file_exists(self, filename):
-        """Check if a file exists in the src directory."""
-        file_path = self.get_file_path(filename)
-        return os.path.exists(file_path)
-    
-    def save_file(self, file_obj, filename):
-        """Save a file to the src directory."""
-        file_path = self.get_file_path(filename)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        file_obj.save(file_path)
-        return file_path
-    
-    def read_file(self, filename):
-        """Read a file from the src directory."""
-        file_path = self.get_file_path(filename)
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {filename}")
-        return open(file_path, 'rb')
-    
-    def get_file_stream(self, filename):
-        """Get a file as a BytesIO stream."""
-        with self.read_file(filename) as f:
-            stream = io.BytesIO(f.read())
-            stream.seek(0)
-            return stream 
\ No newline at end of file
+    """
+    Objetos endereçados por SHA-256 num backend, com cache LRU dos bytes em memória,
+    e as pastas locais de dados e de trabalho do servidor.
+
+    Args:
+        backend: BackendLocal, BackendS3 ou outro com a mesma interface
+        max_bytes_memoria: total de bytes mantidos no cache em memória (0 desliga)
+        pasta_dados: pasta dos arquivos de referência ativos e de suas versões
+        pasta_trabalho: pasta dos uploads grandes, dos jobs e do cache de resultados em disco
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_bytes_memoria: int = 16 * 1024 * 1024,
+        pasta_dados: Optional[str] = None,
+        pasta_trabalho: Optional[str] = None
+    ):
+        self.backend = backend
+        self.max_bytes_memoria = max_bytes_memoria
+        self.pasta_dados = pasta_dados
+        self.pasta_trabalho = pasta_trabalho
+        self._memoria: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._pasta_trabalho_criada = False
+        self.acertos = 0
+        self.falhas = 0
+        self.gravados = 0
+        self.deduplicados = 0
+
+    def _contar(self, nome: str) -> None:
+        with self._lock:
+            setattr(self, nome, getattr(self, nome) + 1)
+
+    def _guardar_memoria(self, sha256: str, dados: bytes) -> None:
+        if len(dados) > self.max_bytes_memoria:
+            return
+        with self._lock:
+            if sha256 in self._memoria:
+                self._memoria.move_to_end(sha256)
+                return
+            self._memoria[sha256] = dados
+            self._bytes += len(dados)
+            while self._bytes > self.max_bytes_memoria:
+                _, removido = self._memoria.popitem(last=False)
+                self._bytes -= len(removido)
+
+    def caminho_dados(self, *partes: str) -> str:
+        """Caminho na pasta de dados (ex.: caminho_dados('clientes.xlsx')); sem partes, a própria pasta."""
+        if self.pasta_dados is None:
+            raise RuntimeError('Armazenamento sem pasta de dados')
+        return os.path.join(self.pasta_dados, *partes)
+
+    def caminho_trabalho(self, *partes: str) -> str:
+        """Caminho na pasta de trabalho (ex.: caminho_trabalho('jobs')); sem partes, a própria pasta."""
+        if self.pasta_trabalho is None:
+            raise RuntimeError('Armazenamento sem pasta de trabalho')
+        return os.path.join(self.pasta_trabalho, *partes)
+
+    def receber_upload(self, total_content_length: Optional[int]) -> BinaryIO:
+        """Destino de um arquivo recebido: memória, ou arquivo temporário na pasta de trabalho para os grandes."""
+        if not self._pasta_trabalho_criada:
+            os.makedirs(self.caminho_trabalho(), exist_ok=True)
+            self._pasta_trabalho_criada = True
+        return criar_stream_upload(self.caminho_trabalho(), total_content_length)
+
+    def existe(self, sha256: str) -> bool:
+        # Só o backend vale: outro processo pode ter removido um objeto que ainda está na memória deste
+        return self.backend.existe(_chave_objeto(sha256))
+
+    def guardar(self, dados: Union[bytes, BinaryIO]) -> str:
+        """Guarda o conteúdo (bytes ou stream) e devolve seu SHA-256; conteúdo já guardado não é gravado de novo."""
+        if not isinstance(dados, bytes):
+            dados.seek(0)
+            dados = dados.read()
+        sha256 = hashlib.sha256(dados).hexdigest()
+        chave = _chave_objeto(sha256)
+        if self.backend.existe(chave):
+            self._contar('deduplicados')
+        else:
+            self.backend.gravar(chave, dados)
+            self._contar('gravados')
+        self._guardar_memoria(sha256, dados)
+        return sha256
+
+    def guardar_arquivo(self, caminho: str, sha256: Optional[str] = None) -> str:
+        """Guarda um arquivo do disco (sempre por cópia) e devolve seu SHA-256."""
+        if sha256 is None:
+            with open(caminho, 'rb') as f:
+                sha256 = sha256_stream(f)
+        chave = _chave_objeto(sha256)
+        if self.backend.existe(chave):
+            self._contar('deduplicados')
+        else:
+            self.backend.gravar_arquivo(chave, caminho)
+            self._contar('gravados')
+        return sha256
+
+    def ler(self, sha256: str) -> memoryview:
+        """
+        Conteúdo do objeto, como memoryview somente leitura dos bytes em cache (sem cópia).
+
+        Raises:
+            FileNotFoundError: se o objeto não existir
+        """
+        with self._lock:
+            dados = self._memoria.get(sha256)
+            if dados is not None:
+                self._memoria.move_to_end(sha256)
+                self.acertos += 1
+                return memoryview(dados)
+            self.falhas += 1
+        dados = self.backend.ler(_chave_objeto(sha256))
+        self._guardar_memoria(sha256, dados)
+        return memoryview(dados)
+
+    def abrir(self, sha256: str) -> io.BytesIO:
+        """Stream do objeto para quem pede um arquivo (ex.: send_file)."""
+        # O BytesIO criado a partir de bytes compartilha o buffer até ser escrito
+        return io.BytesIO(self.ler(sha256).obj)
+
+    def materializar(self, sha256: str, destino: str) -> None:
+        """
+        Coloca uma cópia do objeto em destino, de forma atômica.
+
+        Raises:
+            FileNotFoundError: se o objeto não existir
+        """
+        with self._lock:
+            dados = self._memoria.get(sha256)
+        if dados is not None:
+            _gravar_atomico(destino, dados)
+        else:
+            self.backend.baixar(_chave_objeto(sha256), destino)
+
+    def remover(self, sha256: str) -> None:
+        with self._lock:
+            dados = self._memoria.pop(sha256, None)
+            if dados is not None:
+                self._bytes -= len(dados)
+        self.backend.remover(_chave_objeto(sha256))
+
+    def gravar_nome(self, nome: str, dados: bytes) -> None:
+        """Grava (sobrescrevendo) um arquivo nomeado, fora do endereçamento por conteúdo."""
+        self.backend.gravar(_chave_nome(nome), dados)
+
+    def ler_nome(self, nome: str) -> Optional[bytes]:
+        """Conteúdo do arquivo nomeado, ou None se ele não existir."""
+        try:
+            return self.backend.ler(_chave_nome(nome))
+        except FileNotFoundError:
+            return None
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                'backend': self.backend.descricao(),
+                'pasta_dados': self.pasta_dados,
+                'pasta_trabalho': self.pasta_trabalho,
+                'acertos_memoria': self.acertos,
+                'falhas_memoria': self.falhas,
+                'gravados': self.gravados,
+                'deduplicados': self.deduplicados,
+                'entradas_memoria': len(self._memoria),
+                'bytes_memoria': self._bytes,
+                'max_bytes_memoria': self.max_bytes_memoria,
+            }
+
+
+def criar_armazenamento(
+    tipo: str,
+    pasta_dados: str,
+    pasta_trabalho: str,
+    max_bytes_memoria: int,
+    pasta_local: Optional[str] = None,
+    bucket: Optional[str] = None,
+    prefixo: str = '',
+    endpoint_url: Optional[str] = None
+) -> StorageHandler:
+    """
+    StorageHandler do tipo 'local' (objetos em pasta_local, por padrão pasta_dados/armazenamento)
+    ou 's3' (no bucket), com as pastas locais de dados e de trabalho.
+    """
+    if tipo == 'local':
+        backend = BackendLocal(pasta_local or os.path.join(pasta_dados, PASTA_ARMAZENAMENTO))
+    elif tipo == 's3':
+        if not bucket:
+            raise ValueError('O armazenamento s3 precisa do nome do bucket')
+        backend = BackendS3(bucket, prefixo, endpoint_url)
+    else:
+        raise ValueError(f"Armazenamento inválido: {tipo}. Use 'local' ou 's3'")
+    return StorageHandler(backend, max_bytes_memoria, pasta_dados, pasta_trabalho)
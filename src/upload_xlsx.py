@@ -0,0 +1,148 @@
+"""
+Recebimento de planilhas enviadas com memória limitada.
+
+Uploads acima de LIMIAR_MEMORIA_UPLOAD vão direto para um arquivo temporário
+na pasta de uploads (em vez de ficarem inteiros na memória) e são lidos depois
+por mmap. Antes de qualquer leitura, o diretório central do zip é inspecionado
+para recusar cedo arquivos que não são xlsx ou que se expandiriam demais
+(zip bomb), sem descompactar nada.
+"""
+import contextlib
+import hashlib
+import io
+import mmap
+import tempfile
+import zipfile
+from typing import BinaryIO, Iterator, Optional, Union
+
+# Uploads até esse tamanho ficam em memória; acima, vão para arquivo temporário
+LIMIAR_MEMORIA_UPLOAD = 1024 * 1024
+
+# Limites padrão para o conteúdo descompactado de um xlsx/zip enviado
+MAX_BYTES_DESCOMPACTADOS = 200 * 1024 * 1024
+MAX_RAZAO_COMPRESSAO = 200
+MAX_ENTRADAS_ZIP = 10000
+
+# Partes que todo xlsx tem
+PARTES_OBRIGATORIAS_XLSX = ('[Content_Types].xml', 'xl/workbook.xml')
+
+
+class _MapaLeitura(mmap.mmap):
+    """mmap somente leitura que o zipfile aceita como arquivo (seekable() só existe no mmap a partir do Python 3.13)."""
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+
+class UploadInvalidoError(ValueError):
+    """O arquivo enviado não é um xlsx/zip válido."""
+
+
+class UploadGrandeDemaisError(UploadInvalidoError):
+    """O conteúdo descompactado do arquivo enviado passa dos limites permitidos."""
+
+
+def criar_stream_upload(pasta: str, total_content_length: Optional[int]) -> BinaryIO:
+    """Destino de um arquivo recebido: memória para uploads pequenos, arquivo temporário em pasta para os demais."""
+    if total_content_length is not None and total_content_length <= LIMIAR_MEMORIA_UPLOAD:
+        return io.BytesIO()
+    # TemporaryFile some do disco ao ser fechado (fim da requisição), mesmo se o processo cair
+    return tempfile.TemporaryFile('w+b', dir=pasta)
+
+
+def tamanho_upload(stream: BinaryIO) -> int:
+    """Tamanho em bytes do arquivo recebido, sem alterar a posição de leitura."""
+    if isinstance(stream, io.BytesIO):
+        return stream.getbuffer().nbytes
+    posicao = stream.tell()
+    try:
+        return stream.seek(0, io.SEEK_END)
+    finally:
+        stream.seek(posicao)
+
+
+def validar_zip(
+    arquivo: BinaryIO,
+    exigir_xlsx: bool = True,
+    max_bytes_descompactados: int = MAX_BYTES_DESCOMPACTADOS,
+    max_razao_compressao: int = MAX_RAZAO_COMPRESSAO,
+    max_entradas: int = MAX_ENTRADAS_ZIP
+) -> None:
+    """
+    Confere o diretório central do zip (só os cabeçalhos, sem descompactar).
+
+    Raises:
+        UploadInvalidoError: se não for zip, estiver criptografado ou (com
+            exigir_xlsx) não tiver as partes de um xlsx
+        UploadGrandeDemaisError: se tiver entradas demais, ou se o tamanho ou
+            a taxa de compressão declarados passarem dos limites
+    """
+    posicao = arquivo.tell()
+    try:
+        try:
+            with zipfile.ZipFile(arquivo) as zf:
+                entradas = zf.infolist()
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError, ValueError):
+            raise UploadInvalidoError('Invalid file: not a valid .xlsx/.zip archive')
+    finally:
+        arquivo.seek(posicao)
+
+    if len(entradas) > max_entradas:
+        raise UploadGrandeDemaisError(f'Archive has too many entries ({len(entradas)})')
+    total = 0
+    for info in entradas:
+        if info.flag_bits & 0x1:
+            raise UploadInvalidoError('Encrypted archives are not supported')
+        total += info.file_size
+        if info.file_size > 1024 * 1024 and info.file_size > max_razao_compressao * max(info.compress_size, 1):
+            raise UploadGrandeDemaisError(f'Suspicious compression ratio in {info.filename}')
+    if total > max_bytes_descompactados:
+        raise UploadGrandeDemaisError(f'Uncompressed content too large ({total} bytes)')
+
+    if exigir_xlsx:
+        nomes = {info.filename for info in entradas}
+        if not all(parte in nomes for parte in PARTES_OBRIGATORIAS_XLSX):
+            raise UploadInvalidoError('Invalid file: not an Excel .xlsx workbook')
+
+
+@contextlib.contextmanager
+def abrir_somente_leitura(stream: BinaryIO) -> Iterator[Union[io.BytesIO, mmap.mmap, BinaryIO]]:
+    """
+    Objeto binário para ler o upload sem copiá-lo para a memória.
+
+    Uploads gravados em arquivo são mapeados com mmap (o sistema carrega só as
+    páginas que o zip realmente lê); os que estão em memória são devolvidos
+    como estão. O objeto devolvido aceita read/seek como um arquivo.
+    """
+    stream.seek(0)
+    if isinstance(stream, io.BytesIO):
+        yield stream
+        return
+    try:
+        mapa = _MapaLeitura(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, AttributeError, io.UnsupportedOperation):
+        # Arquivo vazio ou stream sem descritor: lê direto do stream
+        yield stream
+        return
+    try:
+        yield mapa
+    finally:
+        mapa.close()
+
+
+def sha256_upload(objeto) -> str:
+    """SHA-256 (hex) do objeto devolvido por abrir_somente_leitura, sem copiar o conteúdo."""
+    if isinstance(objeto, io.BytesIO):
+        with objeto.getbuffer() as buffer:
+            return hashlib.sha256(buffer).hexdigest()
+    if isinstance(objeto, mmap.mmap):
+        return hashlib.sha256(objeto).hexdigest()
+    sha = hashlib.sha256()
+    objeto.seek(0)
+    for bloco in iter(lambda: objeto.read(1024 * 1024), b''):
+        sha.update(bloco)
+    objeto.seek(0)
+    return sha.hexdigest()
@@ -0,0 +1,437 @@
+"""
+Versões dos arquivos de referência enviados por upload, trocadas de forma atômica.
+
+Cada upload de catálogo ou de clientes vira uma versão imutável em
+<pasta de dados>/versoes/<tipo>/<versão>.xlsx (com o snapshot já compilado ao
+lado). O upload é gravado num arquivo temporário, validado (aba e colunas
+obrigatórias) e pré-compilado antes de entrar na pasta de versões; só então o
+arquivo ativo (ex.: src/data/clientes.xlsx) é substituído por uma cópia da
+versão com os.replace, de modo que nenhuma conversão, em nenhum worker, lê um
+arquivo pela metade. Versões e arquivo ativo nunca compartilham o mesmo inode:
+sobrescrever o arquivo ativo à mão não altera as versões guardadas.
+
+Depois de cada troca um contador de geração é incrementado. Ele fica num
+arquivo de 8 bytes mapeado em memória por todos os workers: ler a geração
+atual não faz chamada de sistema, e o cache de referências só consulta o disco
+(os.stat) quando a geração muda. O manifesto (versoes/manifesto.json) guarda as
+versões de cada tipo e qual está ativa, o que permite voltar a uma versão
+anterior (reverter).
+
+Com um StorageHandler (storage.py), cada versão também é guardada nele pelo
+SHA-256 do conteúdo, e o manifesto é copiado para lá antes de cada troca.
+Se o disco local for perdido (discos efêmeros do Render e da Vercel),
+restaurar() traz de volta o manifesto e os arquivos ativos; as demais versões
+são baixadas quando forem reativadas.
+"""
+import contextlib
+import datetime
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional
+
+from openpyxl import load_workbook
+
+from snapshot_referencias import caminho_snapshot, hash_arquivo
+from storage import StorageHandler, copiar_atomico
+
+try:
+    import fcntl
+except ImportError:  # Windows: a troca continua atômica, mas uploads simultâneos em workers diferentes não são serializados
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PASTA_VERSOES = 'versoes'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+ARQUIVO_GERACAO = 'geracao'
+ARQUIVO_TRAVA = '.trava'
+# Cópia do manifesto no armazenamento (arquivo nomeado)
+NOME_MANIFESTO_ARMAZENAMENTO = 'versoes/manifesto.json'
+
+# Aba e colunas que cada arquivo de referência enviado precisa ter (cabeçalho na primeira linha)
+ESTRUTURA_REFERENCIAS = {
+    'catalogo': ('CATÁLOGO', ('MODELO', 'MODELO OLIST', 'ID')),
+    'clientes': ('CLIENTES', ('ID', 'Nome')),
+}
+
+_FORMATO_GERACAO = '<Q'
+
+
+class ReferenciaInvalidaError(ValueError):
+    """Arquivo de referência enviado sem a aba ou as colunas obrigatórias, ou que não pôde ser lido."""
+
+
+class VersaoNaoEncontradaError(LookupError):
+    pass
+
+
+def validar_referencia(caminho: str, tipo: str) -> None:
+    """Confere a aba e as colunas obrigatórias do tipo, lendo só a primeira linha."""
+    aba, colunas = ESTRUTURA_REFERENCIAS[tipo]
+    try:
+        wb = load_workbook(caminho, read_only=True)
+    except Exception as e:
+        raise ReferenciaInvalidaError(f'Não foi possível abrir a planilha: {e}') from e
+    try:
+        if aba not in wb.sheetnames:
+            raise ReferenciaInvalidaError(f"Aba '{aba}' não encontrada (abas: {', '.join(wb.sheetnames)})")
+        cabecalho = next(wb[aba].iter_rows(max_row=1, values_only=True), ())
+        faltando = [coluna for coluna in colunas if coluna not in cabecalho]
+        if faltando:
+            raise ReferenciaInvalidaError(f"Colunas obrigatórias ausentes na aba '{aba}': {', '.join(faltando)}")
+    finally:
+        wb.close()
+
+
+def _remover(caminho: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(caminho)
+
+
+class ContadorGeracao:
+    """
+    Contador compartilhado entre processos: um inteiro de 8 bytes num arquivo mapeado em memória.
+
+    Se o arquivo não puder ser criado (ex.: pasta somente leitura), atual()
+    devolve None e quem usa o contador volta a conferir os arquivos no disco.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._mapa: Optional[mmap.mmap] = None
+        self._indisponivel = False
+        self._lock = threading.Lock()
+
+    def _abrir(self) -> Optional[mmap.mmap]:
+        if self._mapa is None and not self._indisponivel:
+            with self._lock:
+                if self._mapa is None and not self._indisponivel:
+                    try:
+                        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+                        fd = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o644)
+                        try:
+                            if os.fstat(fd).st_size < struct.calcsize(_FORMATO_GERACAO):
+                                os.ftruncate(fd, struct.calcsize(_FORMATO_GERACAO))
+                            self._mapa = mmap.mmap(fd, struct.calcsize(_FORMATO_GERACAO))
+                        finally:
+                            os.close(fd)
+                    except OSError as e:
+                        logger.warning('Contador de geração indisponível em %s: %s', self.caminho, e)
+                        self._indisponivel = True
+        return self._mapa
+
+    def atual(self) -> Optional[int]:
+        mapa = self._abrir()
+        return struct.unpack_from(_FORMATO_GERACAO, mapa, 0)[0] if mapa is not None else None
+
+    def incrementar(self) -> Optional[int]:
+        """Incrementa e devolve a nova geração (quem chama deve estar com a trava de escrita)."""
+        mapa = self._abrir()
+        if mapa is None:
+            return None
+        geracao = struct.unpack_from(_FORMATO_GERACAO, mapa, 0)[0] + 1
+        struct.pack_into(_FORMATO_GERACAO, mapa, 0, geracao)
+        return geracao
+
+
+class GerenciadorVersoes:
+    """
+    Publica, lista e reverte versões dos arquivos de referência de uma pasta de dados.
+
+    Args:
+        pasta_dados: pasta dos arquivos ativos (DATA_DIR)
+        arquivos: tipo ('catalogo', 'clientes') -> nome do arquivo ativo na pasta
+        max_versoes: versões guardadas por tipo (a ativa nunca é apagada)
+        armazenamento: onde as versões e o manifesto ficam guardados fora do disco
+            local (opcional)
+    """
+
+    def __init__(
+        self,
+        pasta_dados: str,
+        arquivos: Dict[str, str],
+        max_versoes: int = 5,
+        armazenamento: Optional[StorageHandler] = None
+    ):
+        self.pasta_dados = pasta_dados
+        self.pasta_versoes = os.path.join(pasta_dados, PASTA_VERSOES)
+        self.arquivos = dict(arquivos)
+        self.max_versoes = max(1, max_versoes)
+        self.armazenamento = armazenamento
+        self.contador = ContadorGeracao(os.path.join(self.pasta_versoes, ARQUIVO_GERACAO))
+        self._lock = threading.Lock()
+
+    def geracao(self) -> Optional[int]:
+        return self.contador.atual()
+
+    def avancar_geracao(self) -> Optional[int]:
+        """
+        Incrementa a geração sem trocar arquivo, para que os workers voltem a conferir o que
+        guardaram (ex.: depois que a versão ativa foi importada no banco de referências).
+        """
+        with self._trava():
+            return self.contador.incrementar()
+
+    def caminho_ativo(self, tipo: str) -> str:
+        return os.path.join(self.pasta_dados, self.arquivos[tipo])
+
+    def _caminho_versao(self, tipo: str, versao: int) -> str:
+        return os.path.join(self.pasta_versoes, tipo, f'{versao:06d}.xlsx')
+
+    @contextlib.contextmanager
+    def _trava(self) -> Iterator[None]:
+        """Serializa publicações e reversões entre threads e, com fcntl, entre workers."""
+        with self._lock:
+            os.makedirs(self.pasta_versoes, exist_ok=True)
+            with open(os.path.join(self.pasta_versoes, ARQUIVO_TRAVA), 'a+b') as trava:
+                if fcntl is not None:
+                    fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(trava.fileno(), fcntl.LOCK_UN)
+
+    def _ler_manifesto(self) -> dict:
+        try:
+            with open(os.path.join(self.pasta_versoes, ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _gravar_manifesto(self, manifesto: dict) -> None:
+        destino = os.path.join(self.pasta_versoes, ARQUIVO_MANIFESTO)
+        temporario = f'{destino}.{os.getpid()}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, destino)
+
+    def _copiar_manifesto_armazenamento(self, manifesto: dict) -> None:
+        if self.armazenamento is not None:
+            self.armazenamento.gravar_nome(
+                NOME_MANIFESTO_ARMAZENAMENTO, json.dumps(manifesto, ensure_ascii=False, indent=2).encode('utf-8')
+            )
+
+    def _registrar_versao(self, manifesto: dict, tipo: str, caminho_origem: str, origem: str) -> dict:
+        """Move (ou copia, para o arquivo ativo original) caminho_origem e seu snapshot para uma nova versão."""
+        entrada = manifesto.setdefault(tipo, {'ativa': None, 'versoes': []})
+        versao = max((v['versao'] for v in entrada['versoes']), default=0) + 1
+        destino = self._caminho_versao(tipo, versao)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        sha256 = hash_arquivo(caminho_origem)
+        if origem == 'inicial':
+            copiar_atomico(caminho_origem, destino)
+            if os.path.exists(caminho_snapshot(caminho_origem)):
+                copiar_atomico(caminho_snapshot(caminho_origem), caminho_snapshot(destino))
+        else:
+            os.replace(caminho_origem, destino)
+            if os.path.exists(caminho_snapshot(caminho_origem)):
+                os.replace(caminho_snapshot(caminho_origem), caminho_snapshot(destino))
+        if self.armazenamento is not None:
+            self.armazenamento.guardar_arquivo(destino, sha256)
+        registro = {
+            'versao': versao,
+            'sha256': sha256,
+            'tamanho': os.path.getsize(destino),
+            'criada_em': datetime.datetime.now().isoformat(timespec='seconds'),
+            'origem': origem,
+        }
+        entrada['versoes'].append(registro)
+        return registro
+
+    def _ativar(self, manifesto: dict, tipo: str, versao: int) -> Optional[int]:
+        """Troca o arquivo ativo pela versão, atualiza o manifesto e incrementa a geração."""
+        origem = self._caminho_versao(tipo, versao)
+        ativo = self.caminho_ativo(tipo)
+        manifesto[tipo]['ativa'] = versao
+        podadas = self._podar(manifesto, tipo)
+        # A cópia do manifesto vai antes da troca: se o armazenamento falhar, nada muda no disco
+        self._copiar_manifesto_armazenamento(manifesto)
+        # Cópia, não hard link: o arquivo ativo pode ser sobrescrito à mão sem alterar a versão guardada
+        # xlsx antes do snapshot: no intervalo, quem ler vê o snapshot antigo com hash diferente e lê o xlsx novo
+        copiar_atomico(origem, ativo)
+        if os.path.exists(caminho_snapshot(origem)):
+            copiar_atomico(caminho_snapshot(origem), caminho_snapshot(ativo))
+        else:
+            _remover(caminho_snapshot(ativo))
+        self._gravar_manifesto(manifesto)
+        self._apagar_versoes(manifesto, tipo, podadas)
+        # Só depois da troca: um worker que veja a nova geração já encontra o arquivo novo
+        return self.contador.incrementar()
+
+    def _podar(self, manifesto: dict, tipo: str) -> list:
+        """Tira do manifesto as versões excedentes mais antigas (exceto a ativa) e as devolve."""
+        entrada = manifesto[tipo]
+        versoes = sorted(entrada['versoes'], key=lambda v: v['versao'])
+        excedentes = len(versoes) - self.max_versoes
+        mantidas = []
+        podadas = []
+        for registro in versoes:
+            if excedentes > 0 and registro['versao'] != entrada['ativa']:
+                excedentes -= 1
+                podadas.append(registro)
+            else:
+                mantidas.append(registro)
+        entrada['versoes'] = mantidas
+        return podadas
+
+    def _apagar_versoes(self, manifesto: dict, tipo: str, registros: list) -> None:
+        """Apaga os arquivos das versões podadas (no armazenamento, só o conteúdo que nenhuma versão mantida usa)."""
+        em_uso = {v.get('sha256') for entrada in manifesto.values() for v in entrada['versoes']}
+        for registro in registros:
+            caminho = self._caminho_versao(tipo, registro['versao'])
+            _remover(caminho)
+            _remover(caminho_snapshot(caminho))
+            if self.armazenamento is not None and registro.get('sha256') and registro['sha256'] not in em_uso:
+                try:
+                    self.armazenamento.remover(registro['sha256'])
+                except Exception as e:
+                    logger.warning('Não foi possível apagar a versão %s de %s do armazenamento: %s', registro['versao'], tipo, e)
+
+    def _garantir_local(self, tipo: str, registro: dict) -> bool:
+        """Se o arquivo da versão não está no disco, baixa do armazenamento; False se não houver como."""
+        caminho = self._caminho_versao(tipo, registro['versao'])
+        if os.path.exists(caminho):
+            return True
+        if self.armazenamento is None or not registro.get('sha256'):
+            return False
+        try:
+            self.armazenamento.materializar(registro['sha256'], caminho)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def publicar(self, stream: BinaryIO, tipo: str, compilar: Callable[[str, str], Any]) -> dict:
+        """
+        Grava o upload como nova versão e a torna ativa.
+
+        Args:
+            stream: conteúdo do xlsx enviado (lido desde o início)
+            tipo: 'catalogo' ou 'clientes'
+            compilar: função (caminho, tipo) que lê o arquivo e grava seu snapshot
+
+        Returns:
+            Registro da versão publicada, com a nova 'geracao'
+
+        Raises:
+            ReferenciaInvalidaError: se faltar a aba ou alguma coluna obrigatória, ou se a leitura falhar
+        """
+        pasta_tipo = os.path.join(self.pasta_versoes, tipo)
+        os.makedirs(pasta_tipo, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(suffix='.xlsx', prefix='upload_', dir=pasta_tipo)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                stream.seek(0)
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+            validar_referencia(temporario, tipo)
+            try:
+                compilar(temporario, tipo)
+            except OSError as e:
+                # Sem snapshot o arquivo só será lido do Excel na primeira conversão
+                logger.warning('Não foi possível compilar o snapshot de %s: %s', temporario, e)
+            except Exception as e:
+                raise ReferenciaInvalidaError(f'Erro ao ler a planilha: {e}') from e
+
+            with self._trava():
+                manifesto = self._ler_manifesto()
+                ativo = self.caminho_ativo(tipo)
+                if tipo not in manifesto and os.path.exists(ativo):
+                    # Primeiro upload: o arquivo em uso vira a versão 1, para poder voltar a ele
+                    registro_inicial = self._registrar_versao(manifesto, tipo, ativo, 'inicial')
+                    manifesto[tipo]['ativa'] = registro_inicial['versao']
+                registro = self._registrar_versao(manifesto, tipo, temporario, 'upload')
+                geracao = self._ativar(manifesto, tipo, registro['versao'])
+        finally:
+            _remover(temporario)
+            _remover(caminho_snapshot(temporario))
+        logger.info('Versão de referência publicada', extra={'tipo': tipo, 'versao': registro['versao'], 'geracao': geracao})
+        return dict(registro, geracao=geracao)
+
+    def reverter(self, tipo: str, versao: Optional[int] = None) -> dict:
+        """
+        Reativa uma versão guardada: a informada ou, sem ela, a anterior à ativa.
+
+        Raises:
+            VersaoNaoEncontradaError: se não houver versão guardada correspondente
+        """
+        with self._trava():
+            manifesto = self._ler_manifesto()
+            entrada = manifesto.get(tipo)
+            if not entrada or not entrada['versoes']:
+                raise VersaoNaoEncontradaError(f'Nenhuma versão guardada para {tipo}')
+            if versao is None:
+                anteriores = [v['versao'] for v in entrada['versoes'] if entrada['ativa'] is None or v['versao'] < entrada['ativa']]
+                if not anteriores:
+                    raise VersaoNaoEncontradaError(f'Não há versão anterior à {entrada["ativa"]} para {tipo}')
+                versao = max(anteriores)
+            registro = next((v for v in entrada['versoes'] if v['versao'] == versao), None)
+            if registro is None or not self._garantir_local(tipo, registro):
+                raise VersaoNaoEncontradaError(f'Versão {versao} de {tipo} não encontrada')
+            geracao = self._ativar(manifesto, tipo, versao)
+        logger.info('Versão de referência reativada', extra={'tipo': tipo, 'versao': versao, 'geracao': geracao})
+        return dict(registro, geracao=geracao)
+
+    def restaurar(self) -> list:
+        """
+        Sincroniza a pasta de versões com o armazenamento, ao iniciar o app.
+
+        Sem manifesto no disco (disco novo ou apagado), traz do armazenamento o
+        manifesto e o arquivo de cada versão ativa, e os coloca como arquivos
+        ativos. Com manifesto no disco, envia ao armazenamento as versões que
+        ainda não estão lá (ex.: publicadas antes de ele ser configurado).
+
+        Returns:
+            Tipos cujos arquivos ativos foram restaurados
+        """
+        if self.armazenamento is None:
+            return []
+        restaurados = []
+        with self._trava():
+            manifesto = self._ler_manifesto()
+            if manifesto:
+                for tipo, entrada in manifesto.items():
+                    for registro in entrada['versoes']:
+                        caminho = self._caminho_versao(tipo, registro['versao'])
+                        if os.path.exists(caminho) and not self.armazenamento.existe(registro['sha256']):
+                            self.armazenamento.guardar_arquivo(caminho, registro['sha256'])
+                if self.armazenamento.ler_nome(NOME_MANIFESTO_ARMAZENAMENTO) is None:
+                    self._copiar_manifesto_armazenamento(manifesto)
+                return []
+
+            dados = self.armazenamento.ler_nome(NOME_MANIFESTO_ARMAZENAMENTO)
+            if dados is None:
+                return []
+            manifesto = json.loads(dados.decode('utf-8'))
+            for tipo, entrada in manifesto.items():
+                registro = next((v for v in entrada['versoes'] if v['versao'] == entrada['ativa']), None)
+                if tipo not in self.arquivos or registro is None:
+                    continue
+                if not self._garantir_local(tipo, registro):
+                    logger.warning('Versão ativa %s de %s não encontrada no armazenamento', registro['versao'], tipo)
+                    continue
+                ativo = self.caminho_ativo(tipo)
+                copiar_atomico(self._caminho_versao(tipo, registro['versao']), ativo)
+                _remover(caminho_snapshot(ativo))
+                restaurados.append(tipo)
+            self._gravar_manifesto(manifesto)
+            if restaurados:
+                self.contador.incrementar()
+        logger.info('Referências restauradas do armazenamento', extra={'tipos': restaurados})
+        return restaurados
+
+    def listar(self) -> dict:
+        """Versões guardadas e a ativa de cada tipo, com a geração atual."""
+        manifesto = self._ler_manifesto()
+        return {
+            'geracao': self.geracao(),
+            'referencias': {
+                tipo: manifesto.get(tipo, {'ativa': None, 'versoes': []})
+                for tipo in self.arquivos
+            },
+        }
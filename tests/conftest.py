@@ -0,0 +1,123 @@
+"""
+Configuração comum dos testes: coloca src/ no sys.path (os módulos do app usam
+imports simples, como quando rodam de dentro de src/) e monta arquivos de
+referência pequenos numa pasta temporária.
+"""
+import datetime
+import io
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from conversor_olist import ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA  # noqa: E402
+
+CABECALHO_ITENS = ['Produto', 'Cor', 'Qualidade', 'Valor Unitário', 'Quantidade', 'Subtotal']
+COLUNAS_MODELO_SAIDA = [
+    'ID', 'Número da proposta', 'Data', 'ID contato', 'Nome do contato', 'Lista de Preço',
+    'ID produto', 'Descrição', 'Quantidade', 'Valor unitário', 'Observações',
+]
+ID_CLIENTE = 753300001
+
+# Linhas da aba CATÁLOGO: 'SM-A10' aparece duas vezes (vale a primeira) e
+# 'IP 11  PRO' só casa depois da normalização de caixa e espaços
+LINHAS_CATALOGO = [
+    ['SKU', 'MODELO OLIST', 'MODELO', 'ID'],
+    ['1', 'Tela iPhone 11 Pro', 'IP 11  PRO', 918000001.0],
+    ['2', 'Tela Galaxy A10', 'SM-A10', 918000002.0],
+    ['3', 'Tela Galaxy A10 (duplicada)', 'sm-a10 ', 918000099.0],
+    ['4', 'Tela Moto G8', 'MT-G8', 918000003.0],
+    ['5', 'Peça 12345', 12345, 918000004.0],
+]
+
+# Itens com produtos mapeados (inclusive por caixa e espaços e pela chave duplicada),
+# não mapeados, numéricos, linhas em branco e linhas só com quantidade ou valor
+ITENS = [
+    ['IP 11 PRO', 'PRETO', 'ORI', 120.5, 2, 241.0],
+    ['  sm-a10 ', 'AZUL', '-', 80, 1, 80],
+    [],
+    ['SEM CADASTRO', 'BRANCO', 'OLED', 99.9, 3, 299.7],
+    ['MT-G8', None, None, None, None, None],
+    [12345, 'PRETO', 'ORI', 15, 4, 60],
+    [None, None, None, 10, None, None],
+    [None, 'PRETO', None, None, None, None],
+    ['Tela  sem  cadastro', 'PRETO', None, 45.25, 10, 452.5],
+    ['SM-A10', 'PRETO', 'INCELL', 70, 2, 140],
+]
+
+
+def planilha_em_bytes(abas: dict) -> bytes:
+    """xlsx com uma aba por item de abas (nome -> lista de linhas)."""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for nome, linhas in abas.items():
+        ws = wb.create_sheet(nome)
+        for linha in linhas:
+            ws.append(linha)
+    saida = io.BytesIO()
+    wb.save(saida)
+    return saida.getvalue()
+
+
+def gravar_planilha(caminho: str, abas: dict) -> str:
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(planilha_em_bytes(abas))
+    return caminho
+
+
+def montar_orcamento(itens: list, linha_cabecalho: int, data=datetime.datetime(2024, 3, 15), cabecalho=None) -> bytes:
+    """
+    Orçamento na aba 'Orçamento' com o cabeçalho dos itens na linha linha_cabecalho
+    (a partir de 0); com 2 ou mais, as duas primeiras linhas trazem 'Orçamento #' e 'Data'.
+    """
+    linhas = []
+    if linha_cabecalho >= 2:
+        linhas.append(['Orçamento #', 4321])
+        linhas.append(['Data', data])
+    while len(linhas) < linha_cabecalho:
+        linhas.append([])
+    linhas.append(cabecalho or CABECALHO_ITENS)
+    linhas.extend(itens)
+    return planilha_em_bytes({'Orçamento': linhas})
+
+
+def gravar_referencias(pasta):
+    """Grava catálogo, clientes e modelo de saída sintéticos na pasta, com os nomes padrão."""
+    gravar_planilha(str(pasta / ARQUIVO_CATALOGO), {'CATÁLOGO': LINHAS_CATALOGO})
+    gravar_planilha(str(pasta / ARQUIVO_CLIENTES), {'CLIENTES': [
+        ['Código', 'ID', 'Nome'],
+        ['CL0000', 753300000, 'Cliente 0'],
+        ['CL0001', ID_CLIENTE, 'Cliente 1'],
+    ]})
+    gravar_planilha(str(pasta / ARQUIVO_MODELO_SAIDA), {'Sheet1': [COLUNAS_MODELO_SAIDA]})
+    return pasta
+
+
+@pytest.fixture
+def pasta_referencias(tmp_path):
+    """Pasta com catálogo, clientes e modelo de saída sintéticos, com os nomes padrão."""
+    return gravar_referencias(tmp_path)
+
+
+@pytest.fixture
+def caminhos_referencias(pasta_referencias):
+    """(catálogo, clientes, modelo de saída) na ordem dos argumentos de converter_orcamento_para_olist."""
+    return tuple(str(pasta_referencias / nome) for nome in (ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA))
+
+
+@pytest.fixture(scope='session')
+def cliente_app(tmp_path_factory):
+    """
+    Cliente de teste do app Flask com as referências sintéticas.
+
+    main só é importado uma vez por processo (as métricas são registradas na
+    importação), então a pasta de dados vale para a sessão inteira.
+    """
+    pasta = gravar_referencias(tmp_path_factory.mktemp('dados'))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('CONVERSOR_DATA_DIR', str(pasta))
+        import main
+        yield main.app.test_client()
@@ -0,0 +1,91 @@
+"""
+Banco de referências: as buscas por chave e por ID devem casar só valores
+idênticos, como nos xlsx, mesmo numa tabela com collation que ignora caixa e
+acentos (a padrão do MySQL); e as importações ficam guardadas no processo
+até a geração mudar.
+"""
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from sqlalchemy import event
+
+from banco_referencias_sql import BancoReferencias
+from conftest import gravar_planilha
+from normalizacao import normalizar_texto
+
+
+def _comparar_sem_caixa_e_acento(a, b):
+    a, b = normalizar_texto(a, dobrar=True), normalizar_texto(b, dobrar=True)
+    return (a > b) - (a < b)
+
+
+def _banco_com_collation_ci(tmp_path) -> BancoReferencias:
+    """Banco SQLite cujas colunas de busca comparam como utf8mb4_general_ci (tabela antiga no MySQL)."""
+    banco = BancoReferencias(f"sqlite:///{tmp_path / 'referencias.db'}")
+    event.listen(
+        banco.engine, 'connect',
+        lambda conexao, _registro: conexao.create_collation('ci_ai', _comparar_sem_caixa_e_acento)
+    )
+    banco.criar_tabelas()
+    with banco.engine.begin() as conexao:
+        for tabela, colunas in (('catalogo_produtos', ('chave', 'chave_dobrada')), ('clientes', ('id_cliente',))):
+            ddl = conexao.exec_driver_sql(f"SELECT sql FROM sqlite_master WHERE type = 'table' AND name = '{tabela}'").scalar()
+            for coluna in colunas:
+                tamanho = 64 if coluna == 'id_cliente' else 255
+                ddl = ddl.replace(f'{coluna} VARCHAR({tamanho}) NOT NULL', f'{coluna} VARCHAR({tamanho}) NOT NULL COLLATE ci_ai')
+            assert 'ci_ai' in ddl
+            conexao.exec_driver_sql(f'DROP TABLE {tabela}')
+            conexao.exec_driver_sql(ddl)
+    return banco
+
+
+def test_buscas_casam_so_valores_identicos(tmp_path):
+    banco = _banco_com_collation_ci(tmp_path)
+    catalogo = gravar_planilha(str(tmp_path / 'catalogo.xlsx'), {'CATÁLOGO': [
+        ['SKU', 'MODELO OLIST', 'MODELO', 'ID'],
+        ['1', 'Tela aço', 'Tela Aço', 918000001],
+        ['2', 'Tela aco', 'TELA ACO', 918000002],
+    ]})
+    clientes = gravar_planilha(str(tmp_path / 'clientes.xlsx'), {'CLIENTES': [
+        ['ID', 'Nome'],
+        ['ab1', 'Minúsculo'],
+        ['AB1', 'Maiúsculo'],
+    ]})
+    banco.importar('catalogo', catalogo)
+    banco.importar('clientes', clientes)
+
+    assert banco.buscar_produtos(['tela aco']) == {'tela aco': (918000002, 'Tela aco')}
+    assert banco.buscar_produtos(['tela aço', 'tela ácido']) == {'tela aço': (918000001, 'Tela aço')}
+    assert banco.buscar_cliente('AB1') == ('AB1', 'Maiúsculo')
+    assert banco.buscar_cliente('ab1') == ('ab1', 'Minúsculo')
+    assert banco.buscar_cliente('Ab1') is None
+
+
+def test_importacoes_guardadas_ate_a_geracao_mudar(tmp_path, monkeypatch):
+    banco = BancoReferencias(f"sqlite:///{tmp_path / 'referencias.db'}")
+    banco.criar_tabelas()
+    clientes = gravar_planilha(str(tmp_path / 'clientes.xlsx'), {'CLIENTES': [['ID', 'Nome'], [1, 'Cliente 1']]})
+    banco.importar('clientes', clientes)
+    geracao = [1]
+    banco.usar_geracao(lambda: geracao[0], intervalo_revalidacao=60)
+
+    consultas = []
+    importacoes = banco.importacoes
+    monkeypatch.setattr(banco, 'importacoes', lambda: consultas.append(1) or importacoes())
+
+    assert banco.buscar_cliente(1) == (1, 'Cliente 1')
+    assert banco.importacoes_em_cache()['clientes']['versao'] == 1
+    banco.pagina_clientes()
+    assert len(consultas) == 1
+
+    # Importação pela linha de comando em outro processo: só é vista quando a geração muda
+    BancoReferencias(banco.url).importar('clientes', clientes)
+    assert banco.importacoes_em_cache()['clientes']['versao'] == 1
+    geracao[0] += 1
+    assert banco.importacoes_em_cache()['clientes']['versao'] == 2
+    assert len(consultas) == 2
+
+    # Importação neste processo descarta o que estava guardado
+    banco.importar('clientes', clientes)
+    assert banco.importacoes_em_cache()['clientes']['versao'] == 3
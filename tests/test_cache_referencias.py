@@ -0,0 +1,65 @@
+"""
+A carga de um arquivo de referência não deve travar o cache inteiro: outra
+chave é carregada (ou servida) em paralelo, e pedidos simultâneos da mesma
+chave disparam uma única carga.
+"""
+import threading
+
+from cache_referencias import CacheReferencias
+
+
+def _arquivo(tmp_path, nome):
+    caminho = tmp_path / nome
+    caminho.write_bytes(b'x')
+    return str(caminho)
+
+
+def test_carga_lenta_nao_bloqueia_outra_chave(tmp_path):
+    cache = CacheReferencias()
+    lento, rapido = _arquivo(tmp_path, 'lento.xlsx'), _arquivo(tmp_path, 'rapido.xlsx')
+    cache.obter(rapido, 'clientes', lambda caminho: 'clientes')
+    iniciou, liberar = threading.Event(), threading.Event()
+
+    def carregar_lento(caminho):
+        iniciou.set()
+        assert liberar.wait(5)
+        return 'catalogo'
+
+    thread = threading.Thread(target=cache.obter, args=(lento, 'catalogo', carregar_lento))
+    thread.start()
+    try:
+        assert iniciou.wait(5)
+        # Com a carga do catálogo em andamento, o acerto e a carga de outra chave não esperam
+        assert cache.obter(rapido, 'clientes', lambda caminho: 'recarregado') == 'clientes'
+        assert cache.obter(rapido, 'modelo_saida', lambda caminho: 'modelo') == 'modelo'
+    finally:
+        liberar.set()
+        thread.join(5)
+    assert cache.obter(lento, 'catalogo', lambda caminho: 'recarregado') == 'catalogo'
+
+
+def test_pedidos_simultaneos_carregam_uma_vez(tmp_path):
+    cache = CacheReferencias()
+    caminho = _arquivo(tmp_path, 'catalogo.xlsx')
+    cargas = []
+    barreira = threading.Barrier(8)
+
+    def carregar(caminho_arquivo):
+        cargas.append(caminho_arquivo)
+        return object()
+
+    resultados = []
+
+    def pedir():
+        barreira.wait(5)
+        resultados.append(cache.obter(caminho, 'catalogo', carregar))
+
+    threads = [threading.Thread(target=pedir) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(cargas) == 1
+    assert len(resultados) == 8 and all(resultado is resultados[0] for resultado in resultados)
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['falhas'], estatisticas['acertos']) == (1, 7)
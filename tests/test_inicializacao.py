@@ -0,0 +1,57 @@
+"""
+Importar o app deve ser leve: sem pandas, openpyxl e conversor, e sem ler ou
+gravar arquivos. Jobs, caches, armazenamento e versões são criados no primeiro
+uso por uma rota.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import gravar_referencias
+from opcoes_conversao import ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA
+
+PASTA_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# Roda num processo à parte: main só pode ser importado uma vez por processo (métricas)
+_SCRIPT = '''
+import json, os, sys
+import main
+carregados = [modulo for modulo in ('pandas', 'openpyxl', 'conversor_olist', 'versoes_referencias') if modulo in sys.modules]
+servicos = sorted(main._servicos)
+arquivos = sorted(os.listdir(main.DATA_DIR))
+cliente = main.app.test_client()
+saude = cliente.get('/healthz').status_code
+pronto = cliente.get('/readyz').status_code
+print(json.dumps({'carregados': carregados, 'servicos': servicos, 'arquivos': arquivos, 'saude': saude,
+                  'pronto': pronto, 'servicos_depois': sorted(main._servicos)}))
+'''
+
+
+@pytest.fixture
+def importacao(tmp_path):
+    pasta = tmp_path / 'dados'
+    pasta.mkdir()
+    gravar_referencias(pasta)
+    ambiente = dict(os.environ, CONVERSOR_DATA_DIR=str(pasta), CONVERSOR_LOG_LEVEL='WARNING', CONVERSOR_AQUECER='0')
+    ambiente.pop('CONVERSOR_DATABASE_URL', None)
+    saida = subprocess.run(
+        [sys.executable, '-c', _SCRIPT], cwd=PASTA_SRC, env=ambiente, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def test_importar_app_nao_carrega_conversor_nem_servicos(importacao):
+    assert importacao['carregados'] == []
+    assert importacao['servicos'] == []
+    # Nem versoes/ nem armazenamento/ nem snapshots: a importação não grava na pasta de dados
+    assert importacao['arquivos'] == sorted([ARQUIVO_CATALOGO, ARQUIVO_CLIENTES, ARQUIVO_MODELO_SAIDA])
+    assert importacao['saude'] == 200
+
+
+def test_servicos_criados_no_primeiro_uso(importacao):
+    assert importacao['pronto'] == 200
+    assert {'versoes_referencias', 'armazenamento', 'banco_referencias'} <= set(importacao['servicos_depois'])
+    assert 'gerenciador_jobs' not in importacao['servicos_depois']
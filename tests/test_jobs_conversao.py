@@ -0,0 +1,116 @@
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import jobs_conversao
+from jobs_conversao import (
+    STATUS_CONCLUIDO, STATUS_ERRO, STATUS_EXECUTANDO, STATUS_PENDENTE, FilaCheiaError, GerenciadorJobs
+)
+from storage import BackendLocal, StorageHandler
+
+
+def _gravar_job(pasta, job_id, status, atualizado_em, *extensoes):
+    with open(os.path.join(pasta, f'{job_id}.json'), 'w', encoding='utf-8') as f:
+        json.dump({'job_id': job_id, 'status': status, 'erro': None, 'atualizado_em': atualizado_em}, f)
+    for extensao in ('json',) + extensoes:
+        caminho = os.path.join(pasta, f'{job_id}.{extensao}')
+        if not os.path.exists(caminho):
+            open(caminho, 'wb').close()
+        os.utime(caminho, (atualizado_em, atualizado_em))
+
+
+def test_limpar_expirados(tmp_path):
+    pasta = str(tmp_path)
+    gerenciador = GerenciadorJobs(pasta, ttl_segundos=60, ttl_pendentes_segundos=7200)
+    velho = time.time() - 3600
+    _gravar_job(pasta, 'a' * 32, STATUS_PENDENTE, velho, 'orcamento.xlsx')
+    _gravar_job(pasta, 'b' * 32, STATUS_CONCLUIDO, velho, 'xlsx')
+    _gravar_job(pasta, 'c' * 32, STATUS_CONCLUIDO, time.time(), 'xlsx')
+    _gravar_job(pasta, 'd' * 32, STATUS_ERRO, velho)
+    # Pendente e em execução esquecidos por um worker que caiu, além do prazo dos não terminados
+    _gravar_job(pasta, 'f' * 32, STATUS_PENDENTE, time.time() - 8000, 'orcamento.xlsx')
+    _gravar_job(pasta, '0' * 32, STATUS_EXECUTANDO, time.time() - 8000, 'orcamento.xlsx')
+    # Sobra sem status de um processo que caiu
+    sobra = os.path.join(pasta, 'e' * 32 + '.xlsx.tmp')
+    open(sobra, 'wb').close()
+    os.utime(sobra, (velho, velho))
+
+    gerenciador.limpar_expirados()
+
+    assert sorted(os.listdir(pasta)) == [
+        'a' * 32 + '.json', 'a' * 32 + '.orcamento.xlsx', 'c' * 32 + '.json', 'c' * 32 + '.xlsx',
+    ]
+    assert gerenciador.status('a' * 32)['status'] == STATUS_PENDENTE
+
+
+def test_limite_de_pendentes_vale_para_todos_os_workers(tmp_path):
+    pasta = str(tmp_path)
+    # Dois workers do gunicorn: cada um com seu gerenciador, mesma pasta
+    worker_1 = GerenciadorJobs(pasta, max_pendentes=2)
+    worker_2 = GerenciadorJobs(pasta, max_pendentes=2)
+    _gravar_job(pasta, 'a' * 32, STATUS_PENDENTE, time.time(), 'orcamento.xlsx')
+    _gravar_job(pasta, 'b' * 32, STATUS_EXECUTANDO, time.time(), 'orcamento.xlsx')
+    _gravar_job(pasta, 'c' * 32, STATUS_CONCLUIDO, time.time(), 'xlsx')
+    assert worker_1.pendentes() == worker_2.pendentes() == 2
+    with pytest.raises(FilaCheiaError):
+        worker_2.submeter(io.BytesIO(b'orcamento'), 'catalogo.xlsx', 'clientes.xlsx', '1', 'modelo.xlsx', 'openpyxl')
+    # O upload recusado não fica na pasta
+    assert not [nome for nome in os.listdir(pasta) if nome.endswith('.orcamento.xlsx') and nome[0] not in 'ab']
+
+
+def test_status_executando_gravado_no_disco(tmp_path, monkeypatch):
+    pasta = str(tmp_path)
+    job_id = 'a' * 32
+    _gravar_job(pasta, job_id, STATUS_PENDENTE, time.time(), 'orcamento.xlsx')
+    outro_worker = GerenciadorJobs(pasta)
+    vistos = []
+
+    def converter(caminho_orcamento, *args):
+        vistos.append(outro_worker.status(job_id)['status'])
+        return b'xlsx'
+
+    monkeypatch.setattr(jobs_conversao, 'executar_conversao_xlsx', converter)
+    assert jobs_conversao._executar_job(pasta, job_id, os.path.join(pasta, f'{job_id}.orcamento.xlsx')) == b'xlsx'
+    assert vistos == [STATUS_EXECUTANDO]
+
+
+def _envelhecer(pasta, job_id):
+    caminho = os.path.join(pasta, f'{job_id}.json')
+    with open(caminho, encoding='utf-8') as f:
+        dados = json.load(f)
+    dados['atualizado_em'] -= 3600
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(dados, f)
+
+
+def _concluir(gerenciador, job_id, dados):
+    _gravar_job(gerenciador.pasta_jobs, job_id, STATUS_EXECUTANDO, time.time(), 'orcamento.xlsx')
+    futuro = Future()
+    futuro.set_result(dados)
+    gerenciador._finalizar(job_id, futuro)
+
+
+def test_resultados_guardados_no_armazenamento(tmp_path):
+    pasta = str(tmp_path / 'jobs')
+    armazenamento = StorageHandler(BackendLocal(str(tmp_path / 'armazenamento')))
+    gerenciador = GerenciadorJobs(pasta, ttl_segundos=60, armazenamento=armazenamento)
+    _concluir(gerenciador, 'a' * 32, b'xlsx')
+    _concluir(gerenciador, 'b' * 32, b'xlsx')
+
+    assert sorted(os.listdir(pasta)) == ['a' * 32 + '.json', 'b' * 32 + '.json', 'jobs.trava']
+    assert gerenciador.status('a' * 32) == {'job_id': 'a' * 32, 'status': STATUS_CONCLUIDO, 'erro': None}
+    assert gerenciador.abrir_resultado('b' * 32).read() == b'xlsx'
+    assert armazenamento.estatisticas()['acertos_memoria'] == 1
+    sha256 = hashlib.sha256(b'xlsx').hexdigest()
+
+    # O conteúdo é o mesmo: só sai do armazenamento quando o último job que o usa expira
+    for job_id in ('a' * 32, 'b' * 32):
+        _envelhecer(pasta, job_id)
+        gerenciador.limpar_expirados()
+        assert armazenamento.existe(sha256) == (job_id == 'a' * 32)
+    assert gerenciador.abrir_resultado('a' * 32) is None
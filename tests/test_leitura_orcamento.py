@@ -0,0 +1,105 @@
+"""
+ler_linhas_planilha + dataframe_de_linhas devem dar o mesmo DataFrame que
+pd.read_excel com o engine openpyxl, para as mesmas opções de cabeçalho.
+"""
+import datetime
+import io
+import random
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from conftest import ITENS, montar_orcamento
+from leitura_orcamento import dataframe_de_linhas, ler_linhas_planilha
+
+OPCOES_LEITURA = [
+    {'header': None, 'nrows': 10},
+    {'header': 0},
+    {'header': 2},
+    {'header': 5},
+    {'header': 12},
+    {'skiprows': 2},
+]
+
+VALORES = [
+    None, 'NA', 'N/A', '', ' ', '12', 12, 12.0, 12.5, -0.0, True, False, 'abc', 'Produto', 'nan', '1e3',
+    datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 2, 10, 30), datetime.date(2024, 1, 3),
+]
+
+
+def _ler_com_pandas(dados: bytes, opcoes: dict):
+    try:
+        return pd.read_excel(io.BytesIO(dados), engine='openpyxl', **opcoes), None
+    except Exception as e:
+        return None, type(e)
+
+
+def _ler_com_leitor(dados: bytes, opcoes: dict):
+    _, linhas = ler_linhas_planilha(dados)
+    if opcoes.get('nrows') is not None:
+        linhas = linhas[:opcoes['nrows'] + 1]
+    try:
+        return dataframe_de_linhas(linhas, **opcoes), None
+    except Exception as e:
+        return None, type(e)
+
+
+def _assert_mesma_leitura(dados: bytes):
+    for opcoes in OPCOES_LEITURA:
+        esperado, erro_esperado = _ler_com_pandas(dados, opcoes)
+        obtido, erro_obtido = _ler_com_leitor(dados, opcoes)
+        assert erro_obtido == erro_esperado, opcoes
+        if esperado is None:
+            continue
+        pd.testing.assert_frame_equal(obtido, esperado)
+        for coluna in range(esperado.shape[1]):
+            for valor_obtido, valor_esperado in zip(obtido.iloc[:, coluna].tolist(), esperado.iloc[:, coluna].tolist()):
+                assert type(valor_obtido) is type(valor_esperado), (opcoes, valor_obtido, valor_esperado)
+
+
+def _planilha_com_celulas(preencher) -> bytes:
+    wb = Workbook()
+    preencher(wb.active)
+    saida = io.BytesIO()
+    wb.save(saida)
+    return saida.getvalue()
+
+
+@pytest.mark.parametrize('linha_cabecalho', [0, 5, 9, 12])
+def test_orcamentos_de_exemplo(linha_cabecalho):
+    _assert_mesma_leitura(montar_orcamento(ITENS, linha_cabecalho))
+
+
+@pytest.mark.parametrize('semente', range(40))
+def test_planilhas_aleatorias(semente):
+    rng = random.Random(semente)
+
+    def preencher(ws):
+        primeira = rng.randint(1, 4)
+        colunas = rng.randint(1, 8)
+        for linha in range(primeira, primeira + rng.randint(0, 30)):
+            for coluna in range(1, rng.randint(0, colunas) + 1):
+                valor = rng.choice(VALORES)
+                if valor is not None:
+                    ws.cell(linha, coluna, valor)
+
+    _assert_mesma_leitura(_planilha_com_celulas(preencher))
+
+
+def test_erro_de_formula_e_texto_parecido_com_erro():
+    def preencher(ws):
+        ws.append(['Produto', 'Valor'])
+        ws.append(['erro', '#DIV/0!'])    # o openpyxl grava como célula de erro
+        ws.append(['texto', '#DIV/0!'])
+        ws['B3'].data_type = 's'          # mesmo texto, mas como string
+        ws.append(['erro', '#N/A'])
+        ws.append(['texto', '#N/A'])      # string, mas está nos na_values padrão do pandas
+        ws['B5'].data_type = 's'
+
+    dados = _planilha_com_celulas(preencher)
+    _assert_mesma_leitura(dados)
+    valores = dataframe_de_linhas(ler_linhas_planilha(dados)[1])['Valor'].tolist()
+    assert pd.isna(valores[0])
+    assert valores[1] == '#DIV/0!'
+    assert pd.isna(valores[2]) and pd.isna(valores[3])
@@ -0,0 +1,159 @@
+"""
+A montagem vetorizada da saída (montar_saida_olist) deve produzir o mesmo
+DataFrame, célula a célula e com os mesmos tipos, que o laço com iterrows()
+da versão original do conversor, mantido aqui como referência.
+"""
+import datetime
+import io
+import re
+
+import pandas as pd
+import pytest
+
+from conftest import CABECALHO_ITENS, ID_CLIENTE, ITENS, montar_orcamento
+from conversor_olist import converter_orcamento_com_relatorio
+
+
+def _normalizar_referencia(texto):
+    if pd.isna(texto):
+        return ""
+    texto_str = str(texto).lower().strip()
+    return re.sub(r'\s+', ' ', texto_str)
+
+
+def _cabecalho_referencia(df_preview, palavras_chave_cabecalho):
+    palavras_chave_normalizadas = [_normalizar_referencia(pc) for pc in palavras_chave_cabecalho]
+    for i, row in df_preview.iterrows():
+        valores_linha = [_normalizar_referencia(x) for x in row.tolist()]
+        if all(palavra_chave in valores_linha for palavra_chave in palavras_chave_normalizadas):
+            return i
+    return None
+
+
+def converter_referencia(dados_orcamento, caminho_mapeamento_produtos, caminho_clientes, id_cliente_selecionado, caminho_modelo_saida):
+    """Conversão original, linha a linha com iterrows() e lendo tudo com pd.read_excel."""
+    with pd.ExcelFile(caminho_mapeamento_produtos) as xls_map:
+        df_mapeamento = pd.read_excel(xls_map, sheet_name='CATÁLOGO')
+    df_mapeamento['MODELO_NORMALIZADO_BUSCA'] = df_mapeamento['MODELO'].apply(_normalizar_referencia)
+    with pd.ExcelFile(caminho_clientes) as xls_cli:
+        df_clientes = pd.read_excel(xls_cli, sheet_name='CLIENTES')
+    with pd.ExcelFile(caminho_modelo_saida) as xls_modelo:
+        colunas_modelo_olist = pd.read_excel(xls_modelo, sheet_name=0).columns.tolist()
+
+    xls_orc = pd.ExcelFile(io.BytesIO(dados_orcamento))
+    sheet_name_orcamento = 'Orçamento' if 'Orçamento' in xls_orc.sheet_names else xls_orc.sheet_names[0]
+    df_orc_preview_meta = pd.read_excel(xls_orc, sheet_name=sheet_name_orcamento, nrows=10, header=None)
+    num_proposta_orc = None
+    data_proposta_orc = None
+    if len(df_orc_preview_meta) > 0 and len(df_orc_preview_meta.columns) > 1:
+        for i in range(len(df_orc_preview_meta)):
+            if _normalizar_referencia(df_orc_preview_meta.iloc[i, 0]) == "orçamento #":
+                num_proposta_orc = df_orc_preview_meta.iloc[i, 1]
+            if _normalizar_referencia(df_orc_preview_meta.iloc[i, 0]) == "data":
+                data_proposta_orc = df_orc_preview_meta.iloc[i, 1]
+                if isinstance(data_proposta_orc, pd.Timestamp):
+                    data_proposta_orc = data_proposta_orc.date()
+                elif isinstance(data_proposta_orc, str):
+                    try:
+                        data_proposta_orc = pd.to_datetime(data_proposta_orc, dayfirst=True).date()
+                    except ValueError:
+                        try:
+                            data_proposta_orc = pd.to_datetime(data_proposta_orc).date()
+                        except ValueError:
+                            pass
+
+    linha_cabecalho = _cabecalho_referencia(df_orc_preview_meta, CABECALHO_ITENS)
+    if linha_cabecalho is not None:
+        df_orcamento_itens = pd.read_excel(xls_orc, sheet_name=sheet_name_orcamento, header=linha_cabecalho)
+    else:
+        df_orcamento_itens = pd.read_excel(xls_orc, sheet_name=sheet_name_orcamento, skiprows=2)
+    df_orcamento_itens.columns = [_normalizar_referencia(col) for col in df_orcamento_itens.columns]
+
+    id_convertido = int(id_cliente_selecionado) if pd.api.types.is_numeric_dtype(df_clientes['ID']) else str(id_cliente_selecionado)
+    info_cliente = df_clientes[df_clientes['ID'] == id_convertido].iloc[0]
+
+    linhas_saida = []
+    produtos_nao_mapeados_log = []
+    for index, linha_item in df_orcamento_itens.iterrows():
+        produto_orcamento_original = linha_item.get('produto')
+        qtde = linha_item.get('quantidade')
+        valor_unit = linha_item.get('valor unitário')
+        if pd.isna(produto_orcamento_original) and pd.isna(qtde) and pd.isna(valor_unit):
+            continue
+        produto_normalizado = _normalizar_referencia(produto_orcamento_original)
+        id_produto_olist = pd.NA
+        descricao_produto_olist = pd.NA
+        if produto_normalizado:
+            produto_mapeado_df = df_mapeamento[df_mapeamento['MODELO_NORMALIZADO_BUSCA'] == produto_normalizado]
+            if not produto_mapeado_df.empty:
+                produto_mapeado = produto_mapeado_df.iloc[0]
+                id_produto_olist = produto_mapeado.get('ID', pd.NA)
+                descricao_produto_olist = produto_mapeado.get('MODELO OLIST', pd.NA)
+            else:
+                produtos_nao_mapeados_log.append(f"'{produto_normalizado}' (Original: '{produto_orcamento_original}')")
+        linha_convertida = {
+            'Número da proposta': num_proposta_orc if num_proposta_orc is not None else pd.NA,
+            'Data': data_proposta_orc if data_proposta_orc is not None else pd.NA,
+            'ID contato': info_cliente['ID'],
+            'Nome do contato': info_cliente['Nome'],
+            'ID produto': id_produto_olist,
+            'Descrição': descricao_produto_olist,
+            'Quantidade': qtde if pd.notna(qtde) else pd.NA,
+            'Valor unitário': valor_unit if pd.notna(valor_unit) else pd.NA,
+        }
+        linhas_saida.append({col: linha_convertida.get(col, pd.NA) for col in colunas_modelo_olist})
+    return pd.DataFrame(linhas_saida), produtos_nao_mapeados_log
+
+
+def _casos():
+    casos = {}
+    for linha_cabecalho in (0, 5, 9):
+        casos[f'cabecalho_linha_{linha_cabecalho}'] = montar_orcamento(ITENS, linha_cabecalho)
+    # Cabeçalho fora das 10 primeiras linhas: não é encontrado e a leitura cai no skiprows=2
+    casos['cabecalho_linha_12'] = montar_orcamento(ITENS, 12)
+    # Cabeçalho na linha 2 sem 'Subtotal': não é reconhecido, mas o skiprows=2 o usa
+    casos['cabecalho_incompleto'] = montar_orcamento([item[:5] for item in ITENS], 2, cabecalho=CABECALHO_ITENS[:5])
+    casos['data_texto'] = montar_orcamento(ITENS, 4, data='15/03/2024')
+    casos['data_texto_invalida'] = montar_orcamento(ITENS, 4, data='amanhã')
+    casos['data_timestamp_com_hora'] = montar_orcamento(ITENS, 4, data=datetime.datetime(2024, 3, 15, 10, 30))
+    casos['sem_itens'] = montar_orcamento([], 5)
+    casos['so_linhas_em_branco'] = montar_orcamento([[], [None, None], []], 5)
+    return casos
+
+
+CASOS = _casos()
+
+
+def _assert_tipos_iguais(obtido: pd.DataFrame, esperado: pd.DataFrame):
+    for coluna in esperado.columns:
+        for posicao, (valor_obtido, valor_esperado) in enumerate(zip(obtido[coluna].tolist(), esperado[coluna].tolist())):
+            assert type(valor_obtido) is type(valor_esperado), (coluna, posicao, valor_obtido, valor_esperado)
+
+
+@pytest.mark.parametrize('caso', sorted(CASOS))
+def test_saida_igual_a_referencia(caso, caminhos_referencias):
+    dados = CASOS[caso]
+    caminho_catalogo, caminho_clientes, caminho_modelo = caminhos_referencias
+    esperado, log_esperado = converter_referencia(dados, caminho_catalogo, caminho_clientes, ID_CLIENTE, caminho_modelo)
+
+    resultado = converter_orcamento_com_relatorio(
+        io.BytesIO(dados), caminho_catalogo, caminho_clientes, ID_CLIENTE, caminho_modelo,
+        dobrar_acentos=False, aproximar=False
+    )
+
+    assert resultado.erro is None
+    pd.testing.assert_frame_equal(resultado.df, esperado)
+    _assert_tipos_iguais(resultado.df, esperado)
+    assert [
+        f"'{item['produto_normalizado']}' (Original: '{item['produto']}')" for item in resultado.nao_mapeados
+    ] == log_esperado
+
+
+def test_casos_cobrem_mapeados_e_nao_mapeados(caminhos_referencias):
+    caminho_catalogo, caminho_clientes, caminho_modelo = caminhos_referencias
+    df, log = converter_referencia(CASOS['cabecalho_linha_5'], caminho_catalogo, caminho_clientes, ID_CLIENTE, caminho_modelo)
+    # A chave duplicada no catálogo resolve para a primeira ocorrência
+    ids = df['ID produto'].dropna().tolist()
+    assert ids.count(918000002) == 2
+    assert 918000099 not in ids
+    assert len(log) == 2
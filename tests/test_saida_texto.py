@@ -0,0 +1,86 @@
+"""
+CSV e JSON Lines devem trazer o mesmo valor em cada célula, inclusive nas
+colunas de datas (datetime64 ou object com datetime.date/datetime).
+"""
+import csv
+import datetime
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ID_CLIENTE, ITENS, montar_orcamento
+from conversor_olist import converter_orcamento_com_relatorio
+from saida_texto import gerar_texto
+
+
+def _texto(df: pd.DataFrame, formato: str, linhas_por_bloco: int) -> str:
+    return b''.join(gerar_texto(df, formato, linhas_por_bloco)).decode('utf-8')
+
+
+def _assert_mesmos_valores(df: pd.DataFrame, linhas_por_bloco: int = 2) -> list:
+    """Compara célula a célula o CSV com o JSON Lines (nulo no JSON = vazio no CSV) e devolve as linhas do CSV."""
+    linhas_csv = list(csv.reader(io.StringIO(_texto(df, 'csv', linhas_por_bloco))))
+    assert linhas_csv[0] == [str(coluna) for coluna in df.columns]
+    registros = [json.loads(linha) for linha in _texto(df, 'jsonl', linhas_por_bloco).splitlines()]
+    assert len(registros) == len(linhas_csv) - 1 == len(df)
+    for numero, (linha_csv, registro) in enumerate(zip(linhas_csv[1:], registros), start=1):
+        assert list(registro) == linhas_csv[0]
+        valores_json = ['' if valor is None else str(valor) for valor in registro.values()]
+        assert valores_json == linha_csv, numero
+    return linhas_csv
+
+
+def test_colunas_de_datas():
+    df = pd.DataFrame({
+        'data': pd.Series([datetime.date(2024, 3, 15), None, pd.NA, datetime.date(2020, 1, 2)], dtype=object),
+        'data_meia_noite': pd.Series([datetime.datetime(2024, 3, 15), None, datetime.datetime(2021, 1, 1), None], dtype=object),
+        'timestamp_objeto': pd.Series([pd.Timestamp('2024-03-15'), pd.NaT, None, pd.Timestamp('2020-01-02')], dtype=object),
+        'data_e_timestamp': pd.Series([datetime.date(2024, 3, 15), pd.Timestamp('2020-01-02'), None, None], dtype=object),
+        'com_horario': pd.Series([datetime.datetime(2024, 3, 15, 10, 30), datetime.date(2020, 1, 2), None, None], dtype=object),
+        'datetime64': pd.to_datetime(['2024-03-15', None, '2020-01-02', '2021-01-01']),
+        'datetime64_horario': pd.to_datetime(['2024-03-15 10:30:05', None, '2020-01-02', '2021-01-01']),
+        'ID': [918000001, np.nan, 918000002, np.nan],
+        'texto': ['a', None, 'ç', '2024-03-15'],
+    })
+    linhas = _assert_mesmos_valores(df)
+    assert [linha[:7] for linha in linhas[1:3]] == [
+        ['2024-03-15', '2024-03-15', '2024-03-15', '2024-03-15', '2024-03-15 10:30:00', '2024-03-15', '2024-03-15 10:30:05'],
+        ['', '', '', '2020-01-02', '2020-01-02 00:00:00', '', ''],
+    ]
+
+
+@pytest.mark.parametrize('data', [datetime.datetime(2024, 3, 15), datetime.date(2024, 3, 15), '15/03/2024'])
+def test_orcamento_convertido(data, caminhos_referencias):
+    caminho_catalogo, caminho_clientes, caminho_modelo = caminhos_referencias
+    df = converter_orcamento_com_relatorio(
+        io.BytesIO(montar_orcamento(ITENS, 5, data=data)), caminho_catalogo, caminho_clientes, ID_CLIENTE, caminho_modelo
+    ).df
+    assert not df.empty
+    _assert_mesmos_valores(df)
+
+
+def _falhar_ao_preparar(df):
+    raise ValueError('coluna com tipo inesperado')
+
+
+def test_erro_ao_preparar_colunas_na_chamada(monkeypatch):
+    import saida_texto
+    monkeypatch.setattr(saida_texto, '_preparar_colunas', _falhar_ao_preparar)
+    with pytest.raises(ValueError):
+        gerar_texto(pd.DataFrame({'a': [1, 2]}), 'csv')
+
+
+def test_processar_falha_antes_de_enviar(cliente_app, monkeypatch):
+    import saida_texto
+    monkeypatch.setattr(saida_texto, '_preparar_colunas', _falhar_ao_preparar)
+    resposta = cliente_app.post('/processar', data={
+        'cliente_id': str(ID_CLIENTE),
+        'formato': 'csv',
+        'arquivo_excel': (io.BytesIO(montar_orcamento(ITENS, 5)), 'orcamento.xlsx'),
+    })
+    # Sem isso o 200 e os cabeçalhos já teriam saído, e o CSV terminaria cortado
+    assert resposta.status_code == 500
+    assert resposta.is_json and resposta.get_json()['details']['message'] == 'coluna com tipo inesperado'
@@ -0,0 +1,88 @@
+"""
+O modo de escrita em fluxo (MODO_STREAMING) deve gravar as mesmas células que
+o pd.ExcelWriter com openpyxl: valores, tipos, formatos de número e o estilo
+do cabeçalho.
+"""
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from conftest import ID_CLIENTE, ITENS, montar_orcamento
+from conversor_olist import converter_orcamento_com_relatorio
+from saida_xlsx import MODO_OPENPYXL, MODO_STREAMING, escrever_orcamento_convertido
+
+
+def _celulas(dados: bytes) -> dict:
+    """Aba -> linhas de (valor, tipo, formato, negrito, borda, alinhamento) de cada célula."""
+    wb = load_workbook(io.BytesIO(dados))
+    return {
+        ws.title: [
+            [
+                (celula.value, celula.data_type, celula.number_format, celula.font.b,
+                 celula.border.left.style, celula.alignment.horizontal, celula.alignment.vertical)
+                for celula in linha
+            ]
+            for linha in ws.iter_rows()
+        ]
+        for ws in wb.worksheets
+    }
+
+
+def _gravar(df: pd.DataFrame, modo: str, abas_extras=None) -> bytes:
+    destino = io.BytesIO()
+    escrever_orcamento_convertido(df, destino, modo=modo, abas_extras=abas_extras)
+    return destino.getvalue()
+
+
+def _assert_mesmas_celulas(df: pd.DataFrame, abas_extras=None):
+    esperado = _celulas(_gravar(df, MODO_OPENPYXL, abas_extras))
+    obtido = _celulas(_gravar(df, MODO_STREAMING, abas_extras))
+    assert list(obtido) == list(esperado)
+    for aba, linhas in esperado.items():
+        assert len(obtido[aba]) == len(linhas), aba
+        for numero, (linha_obtida, linha_esperada) in enumerate(zip(obtido[aba], linhas), start=1):
+            assert linha_obtida == linha_esperada, (aba, numero)
+
+
+@pytest.mark.parametrize('data', [datetime.datetime(2024, 3, 15), '15/03/2024', 'amanhã'])
+def test_orcamento_convertido(data, caminhos_referencias):
+    caminho_catalogo, caminho_clientes, caminho_modelo = caminhos_referencias
+    resultado = converter_orcamento_com_relatorio(
+        io.BytesIO(montar_orcamento(ITENS, 5, data=data)), caminho_catalogo, caminho_clientes, ID_CLIENTE, caminho_modelo
+    )
+    assert not resultado.df.empty
+    _assert_mesmas_celulas(resultado.df, abas_extras={'Não mapeados': pd.DataFrame(resultado.nao_mapeados)})
+
+
+def test_tipos_de_celula():
+    df = pd.DataFrame({
+        'inteiro': [1, -2, 0, 2 ** 40],
+        'decimal': [1.5, np.nan, np.inf, -np.inf],
+        'texto': ['a', '', None, 'ç'],
+        'booleano': [True, False, None, True],
+        'data_hora': [pd.Timestamp('2024-01-02 03:04:05'), pd.NaT, datetime.datetime(2020, 1, 1), pd.Timestamp('2021-01-01')],
+        'data': [datetime.date(2020, 1, 2), None, pd.NA, datetime.date(2024, 12, 31)],
+        'nulavel': pd.array([1, None, 3, 4], dtype='Int64'),
+        'misto': [1, 'x', 2.5, datetime.date(2020, 1, 1)],
+        'duracao': [datetime.timedelta(hours=6), pd.NaT, datetime.timedelta(days=1), datetime.timedelta(0)],
+    })
+    _assert_mesmas_celulas(df)
+
+
+def test_sugestoes_aproximadas():
+    df = pd.DataFrame({'ID produto': [918000001, pd.NA], 'Descrição': ['Tela', pd.NA]})
+    df.attrs['sugestoes_aproximadas'] = [
+        {'linha': 7, 'produto': 'IP 11 PROO', 'status': 'sugerido', 'candidatos': [
+            {'modelo': 'ip 11 pro', 'ID produto': 918000001.0, 'Descrição': 'Tela iPhone 11 Pro', 'nota': 0.875},
+        ]},
+        {'linha': 8, 'produto': 'XYZ', 'status': 'sem_sugestao', 'candidatos': []},
+    ]
+    _assert_mesmas_celulas(df)
+
+
+def test_dataframe_vazio():
+    _assert_mesmas_celulas(pd.DataFrame(columns=['ID', 'Descrição']))
@@ -0,0 +1,76 @@
+"""
+StorageHandler: objetos por SHA-256 com cache LRU limitado em memória
+(memoryview sem cópia), pastas locais e backends local e S3 (simulado numa pasta).
+"""
+import hashlib
+import io
+import os
+
+from storage import BackendLocal, BackendS3, StorageHandler, criar_armazenamento
+from upload_xlsx import LIMIAR_MEMORIA_UPLOAD
+
+
+def test_cache_em_memoria_limitado_e_sem_copia(tmp_path):
+    armazenamento = StorageHandler(BackendLocal(str(tmp_path)), max_bytes_memoria=10)
+    a = armazenamento.guardar(b'aaaa')
+    b = armazenamento.guardar(b'bbbb')
+
+    vista = armazenamento.ler(a)
+    assert isinstance(vista, memoryview) and vista.readonly
+    assert armazenamento.ler(a).obj is vista.obj
+    assert armazenamento.abrir(a).read() == b'aaaa'
+
+    # 'a' foi lido por último: o terceiro objeto tira 'b' da memória
+    armazenamento.guardar(b'cccc')
+    assert armazenamento.ler(b) == b'bbbb'
+    estatisticas = armazenamento.estatisticas()
+    assert (estatisticas['acertos_memoria'], estatisticas['falhas_memoria']) == (3, 1)
+    assert estatisticas['bytes_memoria'] <= 10
+
+    # Maior que o limite: lido do backend, sem entrar na memória
+    grande = armazenamento.guardar(b'x' * 11)
+    assert armazenamento.ler(grande) == b'x' * 11
+    assert armazenamento.estatisticas()['entradas_memoria'] == 2
+
+
+def test_objeto_apagado_por_outro_processo_e_gravado_de_novo(tmp_path):
+    backend = BackendLocal(str(tmp_path))
+    armazenamento = StorageHandler(backend)
+    sha256 = armazenamento.guardar(b'resultado')
+    os.remove(backend.caminho(f'objetos/{sha256[:2]}/{sha256}'))
+
+    # A cópia na memória deste processo não conta como guardada
+    assert not armazenamento.existe(sha256)
+    assert armazenamento.guardar(b'resultado') == sha256
+    assert armazenamento.existe(sha256)
+    assert armazenamento.estatisticas()['deduplicados'] == 0
+
+
+def test_backend_s3_simulado_guarda_copias(tmp_path):
+    armazenamento = StorageHandler(BackendS3('conversor', 'app', f"file://{tmp_path / 's3'}"), max_bytes_memoria=0)
+    origem = tmp_path / 'clientes.xlsx'
+    origem.write_bytes(b'planilha')
+
+    sha256 = armazenamento.guardar_arquivo(str(origem))
+    assert sha256 == hashlib.sha256(b'planilha').hexdigest()
+    assert armazenamento.guardar(io.BytesIO(b'planilha')) == sha256
+    assert armazenamento.estatisticas()['deduplicados'] == 1
+
+    destino = tmp_path / 'restaurado.xlsx'
+    armazenamento.materializar(sha256, str(destino))
+    origem.write_bytes(b'trocado a mao')
+    assert destino.read_bytes() == b'planilha'
+    assert bytes(armazenamento.ler(sha256)) == b'planilha'
+
+
+def test_pastas_locais_e_uploads(tmp_path):
+    armazenamento = criar_armazenamento('local', str(tmp_path / 'dados'), str(tmp_path / 'uploads'), 1024)
+    assert armazenamento.caminho_dados('clientes.xlsx') == str(tmp_path / 'dados' / 'clientes.xlsx')
+    assert armazenamento.backend.pasta == str(tmp_path / 'dados' / 'armazenamento')
+    # Criar o armazenamento e montar caminhos não grava nada
+    assert not os.path.exists(tmp_path / 'dados') and not os.path.exists(tmp_path / 'uploads')
+
+    assert isinstance(armazenamento.receber_upload(100), io.BytesIO)
+    with armazenamento.receber_upload(LIMIAR_MEMORIA_UPLOAD + 1) as temporario:
+        assert not isinstance(temporario, io.BytesIO)
+        assert os.path.isdir(armazenamento.caminho_trabalho())